@@ -39,6 +39,7 @@ INSTALLED_APPS = [
     'django.contrib.humanize',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'Avendro',
 
     #Apps
@@ -121,6 +122,20 @@ else:
         }
     }
 
+# Cache (shared by all web workers; create with `manage.py createcachetable`)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'avendro_cache',
+        'OPTIONS': {
+            # Each version bump strands the company's old dashboard entry
+            # until it expires; room for those beside every company's
+            # version key (the default is 300 entries)
+            'MAX_ENTRIES': 20000,
+        },
+    }
+}
+
 # Email Configuration (add these if not already present)
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
 EMAIL_HOST = 'smtp.gmail.com'  # or your email provider
@@ -176,5 +191,9 @@ STATICFILES_DIRS = [
     os.path.join(BASE_DIR, 'theme/static'),
 ]
 
+# Generated report files (CompanyApp.ReportJob); the report worker and the
+# web process must share this directory
+REPORTS_ROOT = os.getenv('REPORTS_ROOT', os.path.join(BASE_DIR, 'reports'))
+
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
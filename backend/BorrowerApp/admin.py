@@ -75,6 +75,7 @@ class BorrowerAdmin(admin.ModelAdmin):
                 'rejected': '#ef4444',
                 'review': '#3b82f6',
                 'delinquent': '#dc2626',
+                'defaulted': '#7f1d1d',
                 'completed': '#059669',
             }
             color = colors.get(status, '#6b7280')
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.7 on 2026-10-17 22:20
+
+from django.db import migrations
+from django.db.models import F
+from django.db.models.functions import Lower, Trim
+
+
+def normalize_emails(apps, schema_editor):
+    """
+    Lowercase stored emails. A row whose normalized email is already taken by
+    another borrower of the same company (unique email/company) is left as is.
+    """
+    Borrower = apps.get_model('BorrowerApp', 'Borrower')
+
+    candidates = (
+        Borrower.objects.filter(email__isnull=False)
+        .annotate(normalized=Lower(Trim('email')))
+        .exclude(email=F('normalized'))
+        .values_list('id', 'company_id', 'normalized')
+        .order_by('id')
+    )
+    for borrower_id, company_id, normalized in candidates.iterator(chunk_size=2000):
+        taken = Borrower.objects.filter(company_id=company_id, email=normalized).exclude(id=borrower_id).exists()
+        if not taken:
+            Borrower.objects.filter(id=borrower_id).update(email=normalized)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('BorrowerApp', '0004_remove_borrower_application_status_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(normalize_emails, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.7 on 2026-10-17 22:24
+
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+# PostgreSQL-only search objects; other backends fall back to icontains
+CREATE_SEARCH_SQL = [
+    "CREATE INDEX IF NOT EXISTS borrower_search_vector_idx ON borrower USING gin (search_vector)",
+    "CREATE INDEX IF NOT EXISTS borrower_email_trgm_idx ON borrower USING gin (email gin_trgm_ops)",
+    """
+    CREATE TRIGGER borrower_search_vector_update
+    BEFORE INSERT OR UPDATE OF first_name, last_name, email, search_vector ON borrower
+    FOR EACH ROW EXECUTE FUNCTION
+    tsvector_update_trigger(search_vector, 'pg_catalog.simple', first_name, last_name, email)
+    """,
+    """
+    UPDATE borrower SET search_vector = to_tsvector(
+        'pg_catalog.simple',
+        coalesce(first_name, '') || ' ' || coalesce(last_name, '') || ' ' || coalesce(email, '')
+    )
+    """,
+]
+
+DROP_SEARCH_SQL = [
+    "DROP TRIGGER IF EXISTS borrower_search_vector_update ON borrower",
+    "DROP INDEX IF EXISTS borrower_email_trgm_idx",
+    "DROP INDEX IF EXISTS borrower_search_vector_idx",
+]
+
+
+def _run(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != 'postgresql':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('BorrowerApp', '0005_normalize_borrower_emails'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='borrower',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(_run(CREATE_SEARCH_SQL), _run(DROP_SEARCH_SQL)),
+    ]
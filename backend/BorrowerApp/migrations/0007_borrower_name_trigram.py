@@ -0,0 +1,35 @@
+# Generated by Django 5.2.7 on 2026-10-17 23:40
+
+from django.db import migrations
+
+# PostgreSQL-only: serve name substring search, which compiles to
+# UPPER(name::text) LIKE UPPER(term), from trigram indexes
+CREATE_INDEX_SQL = [
+    "CREATE INDEX IF NOT EXISTS borrower_first_name_trgm_idx ON borrower USING gin (UPPER(first_name::text) gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS borrower_last_name_trgm_idx ON borrower USING gin (UPPER(last_name::text) gin_trgm_ops)",
+]
+
+DROP_INDEX_SQL = [
+    "DROP INDEX IF EXISTS borrower_last_name_trgm_idx",
+    "DROP INDEX IF EXISTS borrower_first_name_trgm_idx",
+]
+
+
+def _run(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != 'postgresql':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('BorrowerApp', '0006_borrower_search'),
+    ]
+
+    operations = [
+        migrations.RunPython(_run(CREATE_INDEX_SQL), _run(DROP_INDEX_SQL)),
+    ]
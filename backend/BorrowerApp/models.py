@@ -1,7 +1,14 @@
 from django.db import models
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import RegexValidator, MinValueValidator
 from decimal import Decimal
 
+
+def normalize_email(email):
+    """Canonical form borrower emails are stored and looked up in"""
+    return (email or '').strip().lower()
+
+
 class Borrower(models.Model):
     """
     Borrower model - Each application to a company creates a new borrower record
@@ -88,6 +95,10 @@ class Borrower(models.Model):
     # Duplicate detection fields
     duplicate_check_hash = models.CharField(max_length=64, db_index=True, blank=True)
     
+    # Full-text search over name and email. On PostgreSQL a trigger keeps it
+    # current and GIN indexes back it (see migration 0006_borrower_search)
+    search_vector = SearchVectorField(null=True, editable=False)
+    
     class Meta:
         db_table = 'borrower'
         ordering = ['-created_at']
@@ -147,6 +158,10 @@ class Borrower(models.Model):
             self.permanent_state = self.current_state
             self.permanent_postal_code = self.current_postal_code
         
+        # Store emails lowercased so lookups are exact matches on the email index
+        if self.email:
+            self.email = normalize_email(self.email)
+        
         # Generate duplicate check hash
         import hashlib
         check_string = f"{self.first_name}{self.last_name}{self.email}".lower()
@@ -1,3 +1,67 @@
+from unittest import skipUnless
+
+from django.db import connection
 from django.test import TestCase
 
-# Create your tests here.
+from BorrowerApp.models import Borrower, normalize_email
+from CompanyApp import exposure
+from CompanyApp.models import BorrowerExposure
+from CompanyApp.search import search_q
+from CompanyApp.tests import make_company, make_loan
+
+
+class BorrowerEmailTests(TestCase):
+    def setUp(self):
+        self.company = make_company()
+        self.loan = make_loan(self.company, 1, email='  Juan.Dela.Cruz@Example.COM ')
+
+    def test_save_stores_email_lowercased(self):
+        self.assertEqual(self.loan.borrower.email, 'juan.dela.cruz@example.com')
+        self.assertEqual(
+            Borrower.objects.values_list('email', flat=True).get(pk=self.loan.borrower_id),
+            'juan.dela.cruz@example.com',
+        )
+
+    def test_mixed_case_lookups_match(self):
+        self.assertTrue(Borrower.objects.filter(email=normalize_email('JUAN.DELA.CRUZ@example.com')).exists())
+        rows = exposure.lookup('Juan.Dela.Cruz@EXAMPLE.com', self.company.id)
+        self.assertEqual([row['company_id'] for row in rows], [self.company.id])
+
+
+@skipUnless(connection.vendor == 'postgresql', 'EXPLAIN output is PostgreSQL-specific')
+class BorrowerEmailIndexTests(TestCase):
+    def setUp(self):
+        company = make_company()
+        for number in range(20):
+            make_loan(company, number)
+
+    def assertUsesEmailIndex(self, queryset):
+        # The tables are tiny; rule out sequential scans so the plan shows
+        # whether an index led by email can serve the lookup
+        table = queryset.model._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            constraints = connection.introspection.get_constraints(cursor, table)
+        email_indexes = [
+            name for name, info in constraints.items()
+            if (info['index'] or info['unique']) and info['columns'][:1] == ['email']
+        ]
+
+        plan = queryset.explain()
+        self.assertNotIn('Seq Scan', plan)
+        self.assertTrue(any(f'using {name} ' in plan for name in email_indexes), plan)
+
+    def test_exact_email_lookup_uses_index(self):
+        self.assertUsesEmailIndex(Borrower.objects.filter(email=normalize_email('Juan7@Example.com')))
+
+    def test_exposure_lookup_uses_index(self):
+        self.assertUsesEmailIndex(BorrowerExposure.objects.filter(email=normalize_email('Juan7@Example.com')))
+
+    def test_name_substring_search_uses_trigram_indexes(self):
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+        plan = Borrower.objects.filter(search_q('uan7')).explain()
+
+        self.assertNotIn('Seq Scan', plan)
+        self.assertIn('borrower_first_name_trgm_idx', plan)
+        self.assertIn('borrower_last_name_trgm_idx', plan)
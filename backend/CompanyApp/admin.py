@@ -1,7 +1,7 @@
 from django.contrib import admin
 from django.utils.html import format_html
 from django.db.models import Count
-from .models import Company, LoanApplication, Payment, Notification
+from .models import Company, CompanyDailyStats, LateFee, LoanApplication, LoanStatusHistory, Payment, PaymentIdempotencyKey, Notification, ReportJob, StatementImport, StatementLine
 
 
 @admin.register(Company)
@@ -110,4 +110,70 @@ class NotificationAdmin(admin.ModelAdmin):
             'fields': ('created_at',),
             'classes': ('collapse',)
         }),
-    )
\ No newline at end of file
+    )
+
+
+@admin.register(CompanyDailyStats)
+class CompanyDailyStatsAdmin(admin.ModelAdmin):
+    list_display = ['company', 'business_date', 'product_type', 'status', 'application_count', 'amount_total']
+    list_filter = ['status', 'product_type', 'company']
+    date_hierarchy = 'business_date'
+    readonly_fields = ['company', 'business_date', 'product_type', 'status', 'application_count', 'amount_total',
+                       'processed_count', 'processing_time_total', 'rated_count', 'rating_total']
+
+
+@admin.register(ReportJob)
+class ReportJobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'company', 'kind', 'status', 'row_count', 'created_at', 'finished_at']
+    list_filter = ['kind', 'status', 'company']
+    date_hierarchy = 'created_at'
+    readonly_fields = ['company', 'kind', 'params', 'fingerprint', 'status', 'file', 'row_count', 'error',
+                       'created_at', 'started_at', 'finished_at']
+
+
+@admin.register(LoanStatusHistory)
+class LoanStatusHistoryAdmin(admin.ModelAdmin):
+    list_display = ['loan_application', 'company', 'from_status', 'to_status', 'days_past_due', 'source', 'changed_at']
+    list_filter = ['to_status', 'source', 'company']
+    date_hierarchy = 'changed_at'
+    readonly_fields = ['loan_application', 'company', 'from_status', 'to_status', 'days_past_due', 'source',
+                       'changed_at']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(LateFee)
+class LateFeeAdmin(admin.ModelAdmin):
+    list_display = ['payment', 'loan_application', 'company', 'amount', 'assessed_on', 'paid_date']
+    list_filter = ['company']
+    date_hierarchy = 'assessed_on'
+    readonly_fields = ['payment', 'loan_application', 'company', 'amount', 'assessed_on', 'paid_date', 'created_at']
+
+
+@admin.register(StatementImport)
+class StatementImportAdmin(admin.ModelAdmin):
+    list_display = ['filename', 'company', 'line_count', 'posted_count', 'review_count', 'created_at']
+    list_filter = ['company']
+    date_hierarchy = 'created_at'
+    readonly_fields = ['company', 'filename', 'line_count', 'posted_count', 'review_count', 'created_at']
+
+
+@admin.register(StatementLine)
+class StatementLineAdmin(admin.ModelAdmin):
+    list_display = ['statement', 'line_number', 'transaction_date', 'amount', 'reference', 'payer', 'status', 'reason']
+    list_filter = ['status', 'reason', 'company']
+    search_fields = ['reference', 'payer']
+    readonly_fields = ['statement', 'company', 'line_number', 'transaction_date', 'amount', 'reference', 'payer',
+                       'payment', 'candidates', 'resolved_at']
+
+
+@admin.register(PaymentIdempotencyKey)
+class PaymentIdempotencyKeyAdmin(admin.ModelAdmin):
+    list_display = ['key', 'company', 'payment', 'status_code', 'created_at']
+    list_filter = ['company']
+    search_fields = ['key']
+    readonly_fields = ['company', 'key', 'payment', 'status_code', 'response', 'created_at']
@@ -0,0 +1,121 @@
+"""
+Portfolio aging: open loans bucketed by days past due (DPD).
+
+A loan's DPD counts from its oldest unpaid installment. One GROUP BY query
+computes the buckets: a correlated subquery per loan takes MIN(due_date)
+from the (loan_application, status, due_date) index on Payment and
+classifies it with a CASE over fixed cut-off dates. Outstanding amounts are
+the loans' stored balances.
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db.models import Case, CharField, Count, Min, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from CompanyApp.models import LoanApplication, Payment
+
+UNPAID_STATUSES = ['pending', 'overdue', 'failed']
+
+# (key, label, highest DPD in the bucket); the last bucket is open-ended
+AGING_BUCKETS = [
+    ('current', 'Current', 0),
+    ('1-30', '1-30 DPD', 30),
+    ('31-60', '31-60 DPD', 60),
+    ('61-90', '61-90 DPD', 90),
+    ('90+', '90+ DPD', None),
+]
+
+
+def _percent(part, whole):
+    return round(float(part) / float(whole) * 100, 2) if whole else 0
+
+
+def aging_groups(loans, today):
+    """Loan count and balance sum per DPD bucket of a LoanApplication queryset"""
+    # The oldest unpaid due date against each bucket's cut-off; the CASE sits
+    # inside the correlated subquery so each loan's installments are read once
+    whens = [
+        When(oldest__gte=today - timedelta(days=max_days), then=Value(key))
+        for key, _, max_days in AGING_BUCKETS[:-1]
+    ]
+    bucket = Subquery(
+        Payment.objects.filter(loan_application=OuterRef('pk'), status__in=UNPAID_STATUSES)
+        .order_by()
+        .values('loan_application')
+        .annotate(oldest=Min('due_date'))
+        .annotate(bucket=Case(*whens, default=Value(AGING_BUCKETS[-1][0]), output_field=CharField()))
+        .values('bucket')
+    )
+
+    # Loans with nothing unpaid are current
+    return list(
+        loans.values(bucket=Coalesce(bucket, Value(AGING_BUCKETS[0][0]), output_field=CharField()))
+        .annotate(count=Count('id'), outstanding=Sum('balance'))
+        .order_by()
+    )
+
+
+class PortfolioAging:
+    """DPD buckets of one company's open loans, with PAR ratios"""
+
+    def __init__(self, groups, today):
+        self.today = today
+        totals = {group['bucket']: group for group in groups}
+        self.total_count = sum(group['count'] for group in groups)
+        self.total_outstanding = sum((group['outstanding'] or Decimal('0') for group in groups), Decimal('0'))
+
+        self.buckets = []
+        for key, label, _ in AGING_BUCKETS:
+            group = totals.get(key, {})
+            outstanding = group.get('outstanding') or Decimal('0')
+            self.buckets.append({
+                'key': key,
+                'label': label,
+                'count': group.get('count', 0),
+                'outstanding': outstanding,
+                'count_percent': _percent(group.get('count', 0), self.total_count),
+                'outstanding_percent': _percent(outstanding, self.total_outstanding),
+            })
+
+    @classmethod
+    def for_company(cls, company, today=None):
+        today = today or timezone.localdate()
+        loans = LoanApplication.objects.filter(company=company, status__in=LoanApplication.OPEN_STATUSES)
+        return cls(aging_groups(loans, today), today)
+
+    def _at_risk(self, min_days):
+        """Balance of loans more than `min_days` past due"""
+        keys = {key for key, _, max_days in AGING_BUCKETS if max_days is None or max_days > min_days}
+        return sum((bucket['outstanding'] for bucket in self.buckets if bucket['key'] in keys), Decimal('0'))
+
+    def par(self, days):
+        """Portfolio at risk: share of the outstanding balance more than `days` past due"""
+        return _percent(self._at_risk(days), self.total_outstanding)
+
+    @property
+    def par30(self):
+        return self.par(30)
+
+    @property
+    def par60(self):
+        return self.par(60)
+
+    @property
+    def par90(self):
+        return self.par(90)
+
+    def payload(self):
+        return {
+            'as_of': self.today.isoformat(),
+            'total_count': self.total_count,
+            'total_outstanding': str(self.total_outstanding),
+            'par30': self.par30,
+            'par60': self.par60,
+            'par90': self.par90,
+            'buckets': [
+                {**bucket, 'outstanding': str(bucket['outstanding'])}
+                for bucket in self.buckets
+            ],
+        }
@@ -0,0 +1,104 @@
+"""
+Vectorized annuity amortization for batches of loans.
+
+Works on arrays of (amount, annual rate %, term in months) and keeps every
+money value in integer cents: each period's interest is rounded to the cent,
+the level payment is rounded once, and the final period pays off whatever
+balance is left, so installments always sum exactly to the loan's total.
+"""
+from decimal import Decimal
+
+import numpy as np
+
+
+def _inputs(amounts, rates, terms):
+    principal = np.rint(np.asarray(amounts, dtype=np.float64) * 100).astype(np.int64)
+    monthly_rate = np.asarray(rates, dtype=np.float64) / 100 / 12
+    terms = np.asarray(terms, dtype=np.int64)
+    return np.broadcast_arrays(principal, monthly_rate, terms)
+
+
+def _level_payment(principal, monthly_rate, terms):
+    """Level monthly payment in cents, before the final-period adjustment"""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        growth = np.power(1 + monthly_rate, terms)
+        annuity = principal * monthly_rate * growth / (growth - 1)
+    flat = principal / np.maximum(terms, 1)
+    return np.rint(np.where(monthly_rate > 0, annuity, flat)).astype(np.int64)
+
+
+def _periods(principal, monthly_rate, terms, payment):
+    """Yield (period, active, interest, principal_paid, balance) arrays in cents"""
+    balance = principal.copy()
+    for period in range(1, int(terms.max(initial=0)) + 1):
+        active = period <= terms
+        interest = np.where(active, np.rint(balance * monthly_rate).astype(np.int64), 0)
+        scheduled = np.minimum(payment - interest, balance)
+        paid = np.where(period == terms, balance, np.where(active, scheduled, 0))
+        balance = balance - paid
+        yield period, active, interest, paid, balance
+
+
+def amortize(amounts, rates, terms):
+    """
+    Monthly payment, total payment and total interest (int64 cents) of every
+    loan. Totals include the final-period cent adjustment.
+    """
+    principal, monthly_rate, terms = _inputs(amounts, rates, terms)
+    payment = _level_payment(principal, monthly_rate, terms)
+
+    total_interest = np.zeros_like(principal)
+    for _, _, interest, _, _ in _periods(principal, monthly_rate, terms, payment):
+        total_interest += interest
+
+    return {
+        'monthly_payment': payment,
+        'total_payment': principal + total_interest,
+        'total_interest': total_interest,
+    }
+
+
+def schedules(amounts, rates, terms):
+    """
+    Full per-period schedules (int64 cents) as (loans, max term) arrays of
+    payment, principal, interest and remaining balance. Periods beyond a
+    loan's term are zero.
+    """
+    principal, monthly_rate, terms = _inputs(amounts, rates, terms)
+    payment = _level_payment(principal, monthly_rate, terms)
+
+    shape = (principal.size, int(terms.max(initial=0)))
+    result = {name: np.zeros(shape, dtype=np.int64) for name in ('payment', 'principal', 'interest', 'balance')}
+    for period, active, interest, paid, balance in _periods(principal, monthly_rate, terms, payment):
+        column = period - 1
+        result['interest'][:, column] = interest
+        result['principal'][:, column] = paid
+        result['payment'][:, column] = interest + paid
+        result['balance'][:, column] = np.where(active, balance, 0)
+    return result
+
+
+def to_decimal(cents):
+    return Decimal(int(cents)).scaleb(-2)
+
+
+def loan_terms(amount, rate, term):
+    """Payment, totals and per-period schedule of a single loan as Decimals"""
+    schedule = {name: values[0] for name, values in schedules([amount], [rate], [term]).items()}
+    total_payment = int(schedule['payment'].sum())
+    total_interest = int(schedule['interest'].sum())
+    return {
+        'monthly_payment': to_decimal(schedule['payment'][0]),
+        'total_payment': to_decimal(total_payment),
+        'total_interest': to_decimal(total_interest),
+        'schedule': [
+            {
+                'period': period,
+                'payment': to_decimal(schedule['payment'][period - 1]),
+                'principal': to_decimal(schedule['principal'][period - 1]),
+                'interest': to_decimal(schedule['interest'][period - 1]),
+                'balance': to_decimal(schedule['balance'][period - 1]),
+            }
+            for period in range(1, int(term) + 1)
+        ],
+    }
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class CompanyappConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'CompanyApp'
+
+    def ready(self):
+        from CompanyApp import signals  # noqa: F401
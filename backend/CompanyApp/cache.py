@@ -0,0 +1,132 @@
+"""
+Per-company cache of the dashboard context.
+
+Cached entries are keyed by a per-company version number. Any committed
+LoanApplication or Payment write bumps the version (see CompanyApp.signals),
+so readers never see a context older than the last write while repeated page
+loads between writes are served from the cache.
+"""
+import threading
+import time
+from collections import Counter
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+
+from CompanyApp.models import CacheCounter
+
+# Upper bound for time-relative sections (e.g. "new in the last 24 hours")
+DASHBOARD_CACHE_TIMEOUT = 300
+
+# Public company directory; borrower counts may lag by up to this long
+DIRECTORY_CACHE_KEY = 'company-directory'
+DIRECTORY_CACHE_TIMEOUT = 600
+
+# Hit/miss counts are buffered per process and added to CacheCounter rows
+# every STATS_FLUSH_EVERY lookups
+STATS_FLUSH_EVERY = 20
+STATS_COUNTERS = {'hits': 'dashboard-cache:hits', 'misses': 'dashboard-cache:misses'}
+
+_pending_stats = Counter()
+_stats_lock = threading.Lock()
+
+
+def _version_key(company_id):
+    return f'company:{company_id}:version'
+
+
+def _new_version():
+    # Versions come from the clock rather than an increment so concurrent
+    # bumps never collapse into one and an evicted key never reuses a version
+    return time.time_ns()
+
+
+def get_company_version(company_id):
+    version = cache.get(_version_key(company_id))
+    if version is None:
+        cache.add(_version_key(company_id), _new_version(), timeout=None)
+        version = cache.get(_version_key(company_id))
+    return version
+
+
+def bump_company_version(company_id):
+    """Invalidate a company's cached entries once the current transaction commits"""
+    if company_id is None:
+        return
+    transaction.on_commit(
+        lambda: cache.set(_version_key(company_id), _new_version(), timeout=None)
+    )
+
+
+def _record(outcome):
+    with _stats_lock:
+        _pending_stats[outcome] += 1
+        if sum(_pending_stats.values()) < STATS_FLUSH_EVERY:
+            return
+        pending = dict(_pending_stats)
+        _pending_stats.clear()
+    flush_cache_stats(pending)
+
+
+def flush_cache_stats(pending=None):
+    """Add buffered hit/miss counts to the shared counters"""
+    if pending is None:
+        with _stats_lock:
+            pending = dict(_pending_stats)
+            _pending_stats.clear()
+    if not pending:
+        return
+
+    # Counters live in the database rather than the cache: the database cache
+    # backend's incr() is a get() then set(), and culling could evict them.
+    # The UPDATE adds in place, so workers flushing together never lose counts
+    for name, counter in STATS_COUNTERS.items():
+        if pending.get(name):
+            CacheCounter.objects.get_or_create(name=counter)
+            CacheCounter.objects.filter(name=counter).update(value=F('value') + pending[name])
+
+
+def get_dashboard_context(company, build):
+    """Return the cached dashboard context of `company`, calling `build(company)` on a miss"""
+    key = f'company:{company.id}:dashboard:v{get_company_version(company.id)}'
+
+    context = cache.get(key)
+    if context is not None:
+        _record('hits')
+        return context
+
+    _record('misses')
+    context = build(company)
+    cache.set(key, context, DASHBOARD_CACHE_TIMEOUT)
+    return context
+
+
+def get_company_directory(build):
+    """Return the cached list of approved companies, calling `build()` on a miss"""
+    directory = cache.get(DIRECTORY_CACHE_KEY)
+    if directory is None:
+        directory = build()
+        cache.set(DIRECTORY_CACHE_KEY, directory, DIRECTORY_CACHE_TIMEOUT)
+    return directory
+
+
+def invalidate_company_directory():
+    transaction.on_commit(lambda: cache.delete(DIRECTORY_CACHE_KEY))
+
+
+def cache_stats():
+    flush_cache_stats()
+    counts = dict(CacheCounter.objects.filter(name__in=STATS_COUNTERS.values()).values_list('name', 'value'))
+    hits = counts.get(STATS_COUNTERS['hits'], 0)
+    misses = counts.get(STATS_COUNTERS['misses'], 0)
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': round(hits / total * 100, 2) if total else 0,
+    }
+
+
+def reset_cache_stats():
+    CacheCounter.objects.filter(name__in=STATS_COUNTERS.values()).delete()
@@ -0,0 +1,39 @@
+from datetime import datetime, time, timedelta
+
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+
+def daily_counts(queryset, days, date_field='created_at', end_date=None):
+    """Return row counts per day for the last `days` days, oldest first.
+
+    All days are fetched with a single GROUP BY query; days without rows are
+    filled with zero.
+    """
+    end_date = end_date or timezone.localdate()
+    start_date = end_date - timedelta(days=days - 1)
+    start = timezone.make_aware(datetime.combine(start_date, time.min))
+    end = timezone.make_aware(datetime.combine(end_date + timedelta(days=1), time.min))
+
+    rows = (
+        queryset.filter(**{f'{date_field}__gte': start, f'{date_field}__lt': end})
+        .annotate(day=TruncDate(date_field))
+        .values('day')
+        .annotate(count=Count('id'))
+        .order_by()
+    )
+    counts = {row['day']: row['count'] for row in rows}
+
+    return [counts.get(start_date + timedelta(days=i), 0) for i in range(days)]
+
+
+def chart_series(queryset, windows=(7, 30, 90), date_field='created_at', end_date=None):
+    """Return {'7': [...], '30': [...], '90': [...]} per-day series.
+
+    The longest window is queried once and the shorter windows are sliced
+    from its tail.
+    """
+    longest = max(windows)
+    series = daily_counts(queryset, longest, date_field=date_field, end_date=end_date)
+    return {str(window): series[longest - window:] for window in windows}
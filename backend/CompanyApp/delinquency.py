@@ -0,0 +1,127 @@
+"""
+Nightly delinquency state machine for open loans.
+
+A loan's state follows the days past due (DPD) of its oldest unpaid
+installment: current loans are 'approved', loans with DPD of at least one are
+'delinquent', and from DEFAULT_AFTER_DAYS on they are 'defaulted'. A loan whose
+arrears are paid moves back to the matching state.
+
+Open loans are read in keyset chunks over the primary key, with the oldest
+unpaid due date taken from the (loan_application, status, due_date) index on
+Payment. Only loans whose state changes are touched: they are locked, moved
+with one UPDATE per (from, to) pair, logged to LoanStatusHistory, and their
+rollup, exposure and cache entries are refreshed in the same transaction,
+since bulk updates bypass the LoanApplication save() signals.
+"""
+from django.db import transaction
+from django.db.models import Min, OuterRef, Subquery
+from django.utils import timezone
+
+from CompanyApp import cache, exposure, rollups
+from CompanyApp.aging import UNPAID_STATUSES
+from CompanyApp.models import LoanApplication, LoanStatusHistory, Payment
+
+DEFAULT_AFTER_DAYS = 90
+HISTORY_SOURCE = 'update_delinquency'
+
+
+def target_status(days_past_due):
+    if days_past_due >= DEFAULT_AFTER_DAYS:
+        return 'defaulted'
+    if days_past_due > 0:
+        return 'delinquent'
+    return 'approved'
+
+
+def _oldest_unpaid(today):
+    """Due date of each loan's oldest unpaid installment that is already past due"""
+    return Subquery(
+        Payment.objects.filter(loan_application=OuterRef('pk'), status__in=UNPAID_STATUSES, due_date__lt=today)
+        .order_by()
+        .values('loan_application')
+        .annotate(oldest=Min('due_date'))
+        .values('oldest')
+    )
+
+
+def apply_transitions(moves, source=HISTORY_SOURCE):
+    """
+    Move loans to their new status with bulk UPDATEs, logging each move to
+    LoanStatusHistory. `moves` maps loan id to (from_status, to_status,
+    days_past_due); loans whose status changed since they were read are left
+    alone. Returns the history entries.
+    """
+    with transaction.atomic():
+        locked = (
+            LoanApplication.objects.select_for_update()
+            .filter(id__in=list(moves))
+            .order_by('id')
+            .values('id', *rollups.ROLLUP_FIELDS)
+        )
+
+        pairs = {}
+        changes = []
+        history = []
+        for row in locked:
+            from_status, to_status, days_past_due = moves[row['id']]
+            if row['status'] != from_status:
+                continue
+            pairs.setdefault((from_status, to_status), []).append(row['id'])
+            changes.append((row, {**row, 'status': to_status}))
+            history.append(LoanStatusHistory(
+                loan_application_id=row['id'],
+                company_id=row['company_id'],
+                from_status=from_status,
+                to_status=to_status,
+                days_past_due=days_past_due,
+                source=source,
+            ))
+
+        for (from_status, to_status), ids in pairs.items():
+            LoanApplication.objects.filter(id__in=ids, status=from_status).update(status=to_status)
+
+        LoanStatusHistory.objects.bulk_create(history)
+        rollups.record_application_changes(changes)
+        exposure.refresh_balances([entry.loan_application_id for entry in history])
+        for company_id in {entry.company_id for entry in history}:
+            cache.bump_company_version(company_id)
+
+    return history
+
+
+def update_delinquency(today=None, chunk_size=5000, company_id=None, dry_run=False):
+    """
+    Bring every open loan's status in line with its days past due.
+    Returns a {(from_status, to_status): count} dict of the transitions.
+    """
+    today = today or timezone.localdate()
+    loans = LoanApplication.objects.filter(status__in=LoanApplication.OPEN_STATUSES)
+    if company_id:
+        loans = loans.filter(company_id=company_id)
+    loans = loans.annotate(oldest_unpaid=_oldest_unpaid(today)).order_by('id')
+
+    transitions = {}
+    last_id = 0
+    while True:
+        rows = list(loans.filter(id__gt=last_id).values_list('id', 'status', 'oldest_unpaid')[:chunk_size])
+        if not rows:
+            break
+        last_id = rows[-1][0]
+
+        moves = {}
+        for loan_id, status, oldest_unpaid in rows:
+            days_past_due = (today - oldest_unpaid).days if oldest_unpaid else 0
+            to_status = target_status(days_past_due)
+            if to_status != status:
+                moves[loan_id] = (status, to_status, days_past_due)
+        if not moves:
+            continue
+
+        if dry_run:
+            applied = [(from_status, to_status) for from_status, to_status, _ in moves.values()]
+        else:
+            applied = [(entry.from_status, entry.to_status) for entry in apply_transitions(moves)]
+        for pair in applied:
+            transitions[pair] = transitions.get(pair, 0) + 1
+
+    return transitions
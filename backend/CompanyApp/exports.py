@@ -0,0 +1,220 @@
+"""
+CSV and XLSX exports of the loan book and payment ledger.
+
+Rows are read with values_list().iterator(chunk_size=...), which uses a
+server-side cursor on PostgreSQL. CSV rows are written through csv.writer
+into a StreamingHttpResponse, so memory use is bounded by one chunk no matter
+how many rows a company has, and the header row goes out before the first
+fetch. Workbooks use openpyxl's write-only mode, which serializes each row to
+a temporary file as it is appended; the report worker (CompanyApp.reports)
+writes the finished .xlsx to report storage.
+"""
+import csv
+import re
+from datetime import datetime
+
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.utils import get_column_letter
+
+from CompanyApp.models import Payment
+
+EXPORT_CHUNK_SIZE = 2000
+
+# (header, lookup) pairs of each export
+APPLICATION_COLUMNS = (
+    ('Application ID', 'id'),
+    ('First Name', 'borrower__first_name'),
+    ('Middle Name', 'borrower__middle_name'),
+    ('Last Name', 'borrower__last_name'),
+    ('Email', 'borrower__email'),
+    ('Product Type', 'product_type'),
+    ('Amount', 'amount'),
+    ('Term (Months)', 'term'),
+    ('Interest Rate', 'interest_rate'),
+    ('Monthly Payment', 'monthly_payment'),
+    ('Total Payment', 'total_payment'),
+    ('Status', 'status'),
+    ('Applied At', 'created_at'),
+)
+
+BORROWER_COLUMNS = (
+    ('Borrower ID', 'id'),
+    ('First Name', 'first_name'),
+    ('Middle Name', 'middle_name'),
+    ('Last Name', 'last_name'),
+    ('Email', 'email'),
+    ('Mobile Number', 'mobile_number'),
+    ('Outstanding Amount', 'outstanding_amount'),
+    ('Registered At', 'created_at'),
+)
+
+PAYMENT_COLUMNS = (
+    ('Payment ID', 'id'),
+    ('Loan ID', 'loan_application_id'),
+    ('Borrower Email', 'loan_application__borrower__email'),
+    ('Amount', 'amount'),
+    ('Method', 'method'),
+    ('Status', 'status'),
+    ('Due Date', 'due_date'),
+    ('Paid Date', 'paid_date'),
+    ('Reference Number', 'reference_number'),
+    ('Created At', 'created_at'),
+)
+
+# Leading characters a spreadsheet would evaluate as a formula
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+# Signed numbers and phone numbers (+63 917 ...) are safe to leave as they are
+NUMERIC = re.compile(r'^[+-]?[\d\s().-]+$')
+
+
+class Echo:
+    """File-like object whose write() hands the line back to csv.writer's caller"""
+
+    def write(self, value):
+        return value
+
+
+def _cell(value):
+    if value is None:
+        return ''
+    if isinstance(value, datetime):
+        return timezone.localtime(value).strftime('%Y-%m-%d %H:%M:%S')
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES) and not NUMERIC.match(value):
+        return f"'{value}"
+    return value
+
+
+def export_rows(queryset, columns, chunk_size=EXPORT_CHUNK_SIZE):
+    """Stream `columns` of every row of `queryset`, one chunk at a time"""
+    return queryset.values_list(*(column[1] for column in columns)).iterator(chunk_size=chunk_size)
+
+
+def _csv_lines(writer, columns, rows):
+    yield writer.writerow([column[0] for column in columns])
+    for row in rows:
+        yield writer.writerow([_cell(value) for value in row])
+
+
+def write_csv(fileobj, columns, rows):
+    """Write a header row, then `rows`, as CSV into a text file. Returns the row count"""
+    lines = _csv_lines(csv.writer(fileobj), columns, rows)
+    next(lines)
+    return sum(1 for _ in lines)
+
+
+def stream_csv(filename, columns, rows):
+    """StreamingHttpResponse writing a header row, then `rows`, as CSV"""
+    response = StreamingHttpResponse(_csv_lines(csv.writer(Echo()), columns, rows), content_type='text/csv')
+    stamp = timezone.localdate().isoformat()
+    response['Content-Disposition'] = f'attachment; filename="{filename}-{stamp}.csv"'
+    response['Cache-Control'] = 'no-store'
+    return response
+
+
+def export_csv(filename, queryset, columns):
+    return stream_csv(filename, columns, export_rows(queryset, columns))
+
+
+# (header, lookup, kind) triples of each workbook sheet
+LOAN_SHEET = (
+    ('Loan ID', 'id', 'int'),
+    ('First Name', 'borrower__first_name', 'text'),
+    ('Last Name', 'borrower__last_name', 'text'),
+    ('Email', 'borrower__email', 'email'),
+    ('Product Type', 'product_type', 'text'),
+    ('Amount', 'amount', 'money'),
+    ('Term (Months)', 'term', 'int'),
+    ('Interest Rate (%)', 'interest_rate', 'rate'),
+    ('Monthly Payment', 'monthly_payment', 'money'),
+    ('Total Payment', 'total_payment', 'money'),
+    ('Amount Paid', 'amount_paid', 'money'),
+    ('Balance', 'balance', 'money'),
+    ('Status', 'status', 'text'),
+    ('Approved At', 'approved_date', 'datetime'),
+)
+
+SCHEDULE_SHEET = (
+    ('Loan ID', 'loan_application_id', 'int'),
+    ('Installment ID', 'id', 'int'),
+    ('Due Date', 'due_date', 'date'),
+    ('Amount Due', 'amount', 'money'),
+    ('Status', 'status', 'text'),
+)
+
+PAYMENT_SHEET = (
+    ('Payment ID', 'id', 'int'),
+    ('Loan ID', 'loan_application_id', 'int'),
+    ('Amount', 'amount', 'money'),
+    ('Method', 'method', 'text'),
+    ('Due Date', 'due_date', 'date'),
+    ('Paid Date', 'paid_date', 'date'),
+    ('Reference Number', 'reference_number', 'text'),
+)
+
+# Column width and number format of each kind of cell
+CELL_KINDS = {
+    'int': (12, None),
+    'text': (18, None),
+    'email': (30, None),
+    'money': (16, '#,##0.00'),
+    'rate': (16, '0.00'),
+    'date': (12, 'yyyy-mm-dd'),
+    'datetime': (20, 'yyyy-mm-dd hh:mm'),
+}
+
+
+def _xlsx_cell(sheet, value, number_format):
+    # Excel has no time zones; write local wall-clock time
+    if isinstance(value, datetime) and timezone.is_aware(value):
+        value = timezone.make_naive(value)
+    if isinstance(value, str) and value.startswith('='):
+        # openpyxl would store this as a formula; keep it a literal string
+        cell = WriteOnlyCell(sheet, value=value)
+        cell.data_type = 's'
+        return cell
+    if number_format and value is not None:
+        cell = WriteOnlyCell(sheet, value=value)
+        cell.number_format = number_format
+        return cell
+    return value
+
+
+def _write_sheet(workbook, title, columns, rows):
+    sheet = workbook.create_sheet(title)
+    # Write-only sheets take column widths before the first row only
+    for index, (_, _, kind) in enumerate(columns, start=1):
+        sheet.column_dimensions[get_column_letter(index)].width = CELL_KINDS[kind][0]
+    sheet.freeze_panes = 'A2'
+    sheet.append([header for header, _, _ in columns])
+
+    formats = [CELL_KINDS[kind][1] for _, _, kind in columns]
+    written = 0
+    for row in rows:
+        sheet.append([_xlsx_cell(sheet, value, number_format) for value, number_format in zip(row, formats)])
+        written += 1
+    return written
+
+
+def write_workbook(fileobj, sheets):
+    """
+    Write `sheets`, (title, columns, rows) triples, as an .xlsx into
+    `fileobj`. Returns the number of data rows written.
+    """
+    workbook = Workbook(write_only=True)
+    written = sum(_write_sheet(workbook, title, columns, rows) for title, columns, rows in sheets)
+    workbook.save(fileobj)
+    return written
+
+
+def loan_book_sheets(loans, chunk_size=EXPORT_CHUNK_SIZE):
+    """Loans, Schedule and Payments sheets of a LoanApplication queryset"""
+    payments = Payment.objects.filter(loan_application__in=loans.order_by().values('id'))
+    return [
+        ('Loans', LOAN_SHEET, export_rows(loans, LOAN_SHEET, chunk_size)),
+        ('Schedule', SCHEDULE_SHEET, export_rows(payments.order_by('loan_application_id', 'due_date'), SCHEDULE_SHEET, chunk_size)),
+        ('Payments', PAYMENT_SHEET, export_rows(payments.filter(status='paid').order_by('paid_date', 'id'), PAYMENT_SHEET, chunk_size)),
+    ]
+
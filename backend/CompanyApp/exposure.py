@@ -0,0 +1,78 @@
+"""
+Maintenance and lookup of the BorrowerExposure index.
+
+Applications write their row whenever they are saved; payment posting and
+other bulk balance updates refresh the money columns with one set-based
+UPDATE, since they bypass LoanApplication.save().
+"""
+from decimal import Decimal
+
+from django.db.models import OuterRef, Q, Subquery
+
+from BorrowerApp.models import normalize_email
+from CompanyApp.models import BorrowerExposure, LoanApplication
+
+OPEN_STATUSES = LoanApplication.OPEN_STATUSES
+SYNCED_FIELDS = ['status', 'total_payment', 'amount_paid', 'balance']
+
+
+def sync_application(application):
+    """
+    Create, update or drop the exposure row of one saved application. Values
+    are read back from the database: saves never write amount_paid/balance,
+    so the instance's copies may be stale or deferred.
+    """
+    stored = (
+        LoanApplication.objects.filter(pk=application.pk)
+        .values('company_id', 'borrower__email', *SYNCED_FIELDS)
+        .first()
+    )
+    email = normalize_email(stored['borrower__email']) if stored else ''
+    if not email or stored['company_id'] is None:
+        BorrowerExposure.objects.filter(application_id=application.pk).delete()
+        return
+
+    BorrowerExposure.objects.update_or_create(
+        application_id=application.pk,
+        defaults={
+            'email': email,
+            'company_id': stored['company_id'],
+            'status': stored['status'],
+            'total_payment': stored['total_payment'] or Decimal('0'),
+            'amount_paid': stored['amount_paid'] or Decimal('0'),
+            'balance': stored['balance'] or Decimal('0'),
+        },
+    )
+
+
+def refresh_balances(application_ids):
+    """Copy status and money columns from LoanApplication in one UPDATE"""
+    source = LoanApplication.objects.filter(pk=OuterRef('application_id'))
+    return BorrowerExposure.objects.filter(application_id__in=application_ids).update(**{
+        field: Subquery(source.values(field)[:1]) for field in SYNCED_FIELDS
+    })
+
+
+def rename_borrower(borrower):
+    """Re-key a borrower's exposure rows after their email changed"""
+    BorrowerExposure.objects.filter(application__borrower=borrower).update(email=normalize_email(borrower.email))
+
+
+def lookup(email, company_id):
+    """
+    Exposure rows relevant to a new application: open or settled loans with
+    any lender, plus pending/rejected applications with this company.
+    """
+    return list(
+        BorrowerExposure.objects
+        .filter(email=normalize_email(email))
+        .filter(
+            Q(status__in=OPEN_STATUSES + ['completed'])
+            | Q(company_id=company_id, status__in=['pending', 'rejected'])
+        )
+        .values(
+            'company_id', 'company__company_name', 'status',
+            'total_payment', 'amount_paid', 'balance',
+        )
+        .order_by('-balance', 'id')
+    )
@@ -0,0 +1,101 @@
+"""
+List filters shared by the company views and the background report worker.
+
+Each function takes the company and a mapping of the view's query
+parameters (request.GET, or the params stored on a ReportJob) and returns
+the filtered, unordered queryset.
+"""
+from datetime import date, timedelta
+
+from django.utils import timezone
+
+from CompanyApp.models import LoanApplication, Payment
+from CompanyApp.search import search_q
+
+ACTIVE_LOAN_PARAMS = ('search', 'loanType', 'paymentStatus', 'amountRange', 'dateRange')
+PAYMENT_PARAMS = ('status', 'loan', 'from', 'to')
+
+
+def active_loans(company, params):
+    search = params.get('search', '').strip()
+    loan_type = params.get('loanType', '')
+    payment_status = params.get('paymentStatus', '')
+    amount_range = params.get('amountRange', '')
+    date_range = params.get('dateRange', '')
+
+    # Base queryset - disbursed loans that are still open
+    loans_qs = LoanApplication.objects.filter(company=company, status__in=LoanApplication.OPEN_STATUSES)
+
+    # Search by borrower name, loan ID, or amount
+    if search:
+        loans_qs = loans_qs.filter(
+            search_q(search, borrower_path='borrower__', id_field='id', amount_field='amount')
+        )
+
+    # Filter by loan type
+    if loan_type:
+        loans_qs = loans_qs.filter(product_type=loan_type)
+
+    # Filter by payment status (maps to your status field)
+    if payment_status:
+        status_map = {
+            'current': 'approved',
+            'late': 'delinquent',
+            'overdue': 'defaulted',
+            'grace': 'review',
+        }
+        mapped_status = status_map.get(payment_status)
+        if mapped_status:
+            loans_qs = loans_qs.filter(status=mapped_status)
+
+    # Filter by amount range
+    if amount_range:
+        if amount_range == '0-25000':
+            loans_qs = loans_qs.filter(amount__gte=0, amount__lte=25000)
+        elif amount_range == '25000-100000':
+            loans_qs = loans_qs.filter(amount__gt=25000, amount__lte=100000)
+        elif amount_range == '100000-500000':
+            loans_qs = loans_qs.filter(amount__gt=100000, amount__lte=500000)
+        elif amount_range == '500000+':
+            loans_qs = loans_qs.filter(amount__gt=500000)
+
+    # Filter by date range
+    if date_range:
+        today = timezone.now().date()
+        if date_range == 'last-30':
+            start_date = today - timedelta(days=30)
+            loans_qs = loans_qs.filter(created_at__gte=start_date)
+        elif date_range == 'last-90':
+            start_date = today - timedelta(days=90)
+            loans_qs = loans_qs.filter(created_at__gte=start_date)
+        elif date_range == 'last-year':
+            start_date = today - timedelta(days=365)
+            loans_qs = loans_qs.filter(created_at__gte=start_date)
+
+    return loans_qs
+
+
+def payments(company, params):
+    status = params.get('status', '')
+    loan_id = params.get('loan', '')
+    date_from = params.get('from', '')
+    date_to = params.get('to', '')
+
+    payments_qs = Payment.objects.filter(loan_application__company=company)
+
+    if status:
+        payments_qs = payments_qs.filter(status=status)
+
+    if loan_id.isdigit():
+        payments_qs = payments_qs.filter(loan_application_id=int(loan_id))
+
+    # Due date range (YYYY-MM-DD); malformed dates are ignored
+    try:
+        if date_from:
+            payments_qs = payments_qs.filter(due_date__gte=date.fromisoformat(date_from))
+        if date_to:
+            payments_qs = payments_qs.filter(due_date__lte=date.fromisoformat(date_to))
+    except ValueError:
+        pass
+
+    return payments_qs
@@ -0,0 +1,109 @@
+"""
+Daily accrual of late fees on overdue installments.
+
+Every overdue installment of a company with a late_payment_fee is charged
+that fee once, as a row in the LateFee ledger. Fees are written with
+set-based INSERT ... SELECT statements over keyset chunks of the partial
+index on overdue installments, each chunk in its own transaction, so one
+pass covers every company with bounded memory. Installments that already
+carry a fee are skipped and the unique constraint on payment absorbs a
+concurrent run, so the job can be re-run at any time, including after a
+crash part-way through.
+
+A fee is owed until it is collected: whatever a payment brings in above its
+installment's scheduled amount settles the loan's owed fees, oldest first,
+and a loan is not completed while it still owes any.
+"""
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from CompanyApp.models import Company, LateFee, LoanApplication, Payment
+
+
+def _insert_sql():
+    fee = LateFee._meta.db_table
+    payment = Payment._meta.db_table
+    loan = LoanApplication._meta.db_table
+    company = Company._meta.db_table
+    return f'''
+        INSERT INTO "{fee}" (payment_id, loan_application_id, company_id, amount, assessed_on, created_at)
+        SELECT p.id, p.loan_application_id, l.company_id, c.late_payment_fee, %s, %s
+        FROM "{payment}" p
+        JOIN "{loan}" l ON l.id = p.loan_application_id
+        JOIN "{company}" c ON c.id = l.company_id
+        WHERE p.status = 'overdue' AND p.due_date < %s AND p.id > %s AND p.id <= %s
+          AND c.late_payment_fee > 0
+          AND NOT EXISTS (SELECT 1 FROM "{fee}" f WHERE f.payment_id = p.id)
+        ON CONFLICT DO NOTHING
+    '''
+
+
+def accrue_late_fees(today=None, chunk_size=5000):
+    """
+    Assess the company late fee on every overdue installment not yet charged.
+    Returns the number of fees written.
+    """
+    today = today or timezone.localdate()
+    sql = _insert_sql()
+    overdue = Payment.objects.filter(status='overdue', due_date__lt=today).order_by('id')
+
+    assessed = 0
+    last_id = 0
+    while True:
+        ids = list(overdue.filter(id__gt=last_id).values_list('id', flat=True)[:chunk_size])
+        if not ids:
+            break
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(sql, [today, timezone.now(), today, last_id, ids[-1]])
+            assessed += max(cursor.rowcount, 0)
+        last_id = ids[-1]
+
+    return assessed
+
+
+def fees_by_payment(loan):
+    """{payment id: (fee amount, paid date or None while owed)} of one loan"""
+    return {
+        payment_id: (amount, paid_date)
+        for payment_id, amount, paid_date
+        in LateFee.objects.filter(loan_application=loan).values_list('payment_id', 'amount', 'paid_date')
+    }
+
+
+def collect_fees(postings):
+    """
+    Settle owed fees out of posted installments. `postings` are (loan id,
+    payment id, amount paid above the installment's scheduled amount, paid
+    date) tuples; each settles its loan's owed fees oldest first, whole fees
+    only. Call inside the posting transaction. Returns ({payment id: fees
+    collected from it}, {loan id: fees still owed}).
+    """
+    owed = {}
+    fees = (
+        LateFee.objects.select_for_update()
+        .filter(loan_application_id__in={posting[0] for posting in postings}, paid_date__isnull=True)
+        .order_by('assessed_on', 'id')
+        .only('id', 'loan_application_id', 'amount')
+    )
+    for fee in fees:
+        owed.setdefault(fee.loan_application_id, []).append(fee)
+
+    collected = {}
+    settled = {}
+    for loan_id, payment_id, excess, paid_date in postings:
+        loan_fees = owed.get(loan_id, [])
+        while loan_fees and loan_fees[0].amount <= excess:
+            fee = loan_fees.pop(0)
+            excess -= fee.amount
+            collected[payment_id] = collected.get(payment_id, Decimal('0')) + fee.amount
+            settled.setdefault(paid_date, []).append(fee.id)
+    for paid_date, ids in settled.items():
+        LateFee.objects.filter(id__in=ids).update(paid_date=paid_date)
+
+    return collected, {
+        loan_id: sum(fee.amount for fee in loan_fees)
+        for loan_id, loan_fees in owed.items() if loan_fees
+    }
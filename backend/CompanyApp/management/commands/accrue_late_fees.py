@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from CompanyApp.late_fees import accrue_late_fees
+
+
+class Command(BaseCommand):
+    help = "Charge each company's late payment fee on overdue installments (run daily)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=5000,
+            help='Installments assessed per transaction (default: 5000)'
+        )
+
+    def handle(self, *args, **options):
+        assessed = accrue_late_fees(chunk_size=options['chunk_size'])
+        self.stdout.write(
+            self.style.SUCCESS(f'Assessed {assessed} late fee(s)')
+        )
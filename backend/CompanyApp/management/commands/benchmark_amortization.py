@@ -0,0 +1,56 @@
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from CompanyApp.amortization import amortize, schedules
+
+
+class Command(BaseCommand):
+    help = 'Measure amortization throughput on a synthetic loan book (no database access)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--loans',
+            type=int,
+            default=1_000_000,
+            help='Number of synthetic loans (default: 1,000,000)'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=100_000,
+            help='Loans per vectorized call (default: 100,000)'
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=0,
+        )
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(options['seed'])
+        count, chunk_size = options['loans'], options['chunk_size']
+        amounts = np.round(rng.uniform(5_000, 2_000_000, count), 2)
+        rates = np.round(rng.uniform(1, 36, count), 2)
+        terms = rng.choice([6, 12, 18, 24, 36, 48, 60], count)
+
+        started = time.perf_counter()
+        for start in range(0, count, chunk_size):
+            end = start + chunk_size
+            amortize(amounts[start:end], rates[start:end], terms[start:end])
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Totals:    {count:,} loans in {elapsed:.2f}s ({count / elapsed:,.0f} loans/s)'
+        ))
+
+        sample = min(count, chunk_size)
+        started = time.perf_counter()
+        table = schedules(amounts[:sample], rates[:sample], terms[:sample])
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Schedules: {sample:,} loans in {elapsed:.2f}s ({sample / elapsed:,.0f} loans/s)'
+        ))
+
+        drift = np.abs(table['balance'][np.arange(sample), terms[:sample] - 1]).max()
+        self.stdout.write(f'Largest final balance: {drift} cent(s)')
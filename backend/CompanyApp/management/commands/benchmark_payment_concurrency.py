@@ -0,0 +1,199 @@
+import queue
+import random
+import threading
+import time
+import uuid
+from datetime import date
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from BorrowerApp.models import Borrower
+from CompanyApp.models import Company, LoanApplication, Payment
+from CompanyApp.payments import reconcile_balances, record_payment
+from CompanyApp.schedules import generate_payment_schedule
+
+
+def _company(username):
+    user = User.objects.create_user(username, password=None)
+    return Company.objects.create(
+        user=user, company_name='Payment Concurrency Benchmark', registration_number='-', tax_id='-',
+        street_address='-', city='-', state='-', postal_code='-', contact_person='-', contact_title='-',
+        company_phone='-', business_email='benchmark@example.com', loan_products=['personal_loans'],
+        min_loan_amount=Decimal('1000'), max_loan_amount=Decimal('1000000'),
+        min_interest_rate=Decimal('1'), max_interest_rate=Decimal('36'),
+        min_loan_term=1, max_loan_term=60, lending_policies='-',
+    )
+
+
+def _loans(company, count, term):
+    loans = []
+    for number in range(count):
+        borrower = Borrower.objects.create(
+            company=company, first_name=f'Bench{number}', last_name='Borrower', date_of_birth=date(1990, 1, 1),
+            gender='male', marital_status='single', mobile_number='+639170000000',
+            current_street_address='-', current_city='-', current_state='-', current_postal_code='-',
+            employment_status='employed', monthly_income=Decimal('50000'), income_source='-',
+            bank_name='-', account_number='-',
+        )
+        loan = LoanApplication(
+            borrower=borrower, company=company, product_type='personal_loans', amount=Decimal('12000'),
+            term=term, interest_rate=Decimal('12'), status='approved', approved_date=timezone.now(),
+        )
+        loan.calculate_loan_payment()
+        loan.save()
+        generate_payment_schedule(loan)
+        loans.append(loan)
+    return loans
+
+
+class Command(BaseCommand):
+    help = (
+        'Hammer record_payment() from many threads with cashiers racing for the same installments '
+        'and retried requests, then check nothing was posted twice (PostgreSQL only)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            default='1,2,4,8,16',
+            help='Comma-separated thread counts, one round each (default: 1,2,4,8,16)'
+        )
+        parser.add_argument(
+            '--loans',
+            type=int,
+            default=100,
+            help='Loans per round (default: 100)'
+        )
+        parser.add_argument(
+            '--term',
+            type=int,
+            default=12,
+            help='Installments per loan (default: 12)'
+        )
+        parser.add_argument(
+            '--cashiers',
+            type=int,
+            default=3,
+            help='Concurrent posts of each installment, each with its own key (default: 3)'
+        )
+        parser.add_argument(
+            '--retries',
+            type=int,
+            default=1,
+            help='Repeats of the first post of each installment with the same key (default: 1)'
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=0,
+        )
+
+    def _requests(self, loans, cashiers, retries, rng):
+        """Posts of every installment, adjacent in the queue so that they race"""
+        installments = list(
+            Payment.objects.filter(loan_application__in=loans).values_list('id', 'loan_application_id', 'amount')
+        )
+        groups = []
+        for payment_id, loan_id, amount in installments:
+            posting = {
+                'loan_id': loan_id,
+                'payment_id': payment_id,
+                'amount': amount,
+                'paid_date': timezone.localdate(),
+                'method': 'cash',
+                'reference_number': '',
+            }
+            keys = [uuid.uuid4().hex for _ in range(cashiers)]
+            group = [(posting, key) for key in keys] + [(posting, keys[0])] * retries
+            rng.shuffle(group)
+            groups.append(group)
+        rng.shuffle(groups)
+        return len(installments), [request for group in groups for request in group]
+
+    def _run(self, company, requests, workers):
+        pending = queue.Queue()
+        for index, request in enumerate(requests):
+            pending.put((index, request))
+        responses = [None] * len(requests)
+
+        def work():
+            try:
+                while True:
+                    try:
+                        index, (posting, key) = pending.get_nowait()
+                    except queue.Empty:
+                        return
+                    responses[index] = record_payment(company, posting, key)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=work) for _ in range(workers)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return responses, time.perf_counter() - started
+
+    def _check(self, company, loans, installment_count, requests, responses):
+        """(installments posted, double posts, replays differing from the original, balance mismatches)"""
+        if any(response is None for response in responses):
+            raise CommandError('A worker thread failed; see the traceback above.')
+
+        # Keys that got a successful post, per installment; a replay answers under the same key
+        posts = {}
+        by_key = {}
+        for (posting, key), (status_code, response) in zip(requests, responses):
+            if response['success']:
+                posts.setdefault(posting['payment_id'], set()).add(key)
+            by_key.setdefault(key, set()).add((status_code, tuple(sorted(response.items()))))
+
+        double_posts = sum(len(keys) - 1 for keys in posts.values())
+        bad_replays = sum(1 for answers in by_key.values() if len(answers) > 1)
+        paid = Payment.objects.filter(loan_application__in=loans, status='paid').count()
+        if paid != installment_count or len(posts) != installment_count:
+            raise CommandError(f'{paid} of {installment_count} installments paid, {len(posts)} posted.')
+        return len(posts), double_posts, bad_replays, len(reconcile_balances(company=company))
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('Row locks are only meaningful on PostgreSQL; point DATABASE_URL at a Postgres database.')
+        try:
+            rounds = [int(workers) for workers in options['workers'].split(',')]
+        except ValueError:
+            raise CommandError('--workers takes comma-separated thread counts, e.g. 1,2,4,8')
+
+        rng = random.Random(options['seed'])
+        company = _company(f'payment-benchmark-{uuid.uuid4().hex[:12]}')
+        try:
+            self.stdout.write(
+                f'{"workers":>7} {"requests":>9} {"posted":>7} {"double":>7} {"replays":>8} '
+                f'{"mismatch":>8} {"seconds":>8} {"req/s":>8}'
+            )
+            failed = False
+            for workers in rounds:
+                loans = _loans(company, options['loans'], options['term'])
+                installment_count, requests = self._requests(
+                    loans, options['cashiers'], options['retries'], rng
+                )
+                responses, elapsed = self._run(company, requests, workers)
+                posted, double_posts, bad_replays, mismatched = self._check(
+                    company, loans, installment_count, requests, responses
+                )
+                failed = failed or double_posts or bad_replays or mismatched
+                self.stdout.write(
+                    f'{workers:>7} {len(requests):>9,} {posted:>7,} {double_posts:>7} {bad_replays:>8} '
+                    f'{mismatched:>8} {elapsed:>8.2f} {len(requests) / elapsed:>8,.0f}'
+                )
+        finally:
+            # Loans first: their delete signals write the company's daily stats rows
+            LoanApplication.objects.filter(company=company).delete()
+            company.user.delete()
+
+        if failed:
+            raise CommandError('Installments were posted twice or retries got a different answer.')
+        self.stdout.write(self.style.SUCCESS('No double posts; every retry got the original response.'))
@@ -0,0 +1,72 @@
+import resource
+import tempfile
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from CompanyApp.exports import LOAN_SHEET, PAYMENT_SHEET, SCHEDULE_SHEET, write_workbook
+
+
+def _peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _loans(count):
+    approved_at = timezone.now()
+    for loan_id in range(1, count + 1):
+        amount = Decimal(5_000 + loan_id % 500 * 1_000)
+        yield (
+            loan_id, f'First{loan_id}', f'Last{loan_id}', f'borrower{loan_id}@example.com', 'personal_loans',
+            amount, 12, Decimal('12.50'), amount / 11, amount * 12 / 11, Decimal('0.00'), amount * 12 / 11,
+            'approved', approved_at,
+        )
+
+
+def _installments(count):
+    start = date.today()
+    for row_id in range(1, count + 1):
+        yield (row_id // 12 + 1, row_id, start + timedelta(days=30 * (row_id % 12)), Decimal('1234.56'), 'pending')
+
+
+def _payments(count):
+    start = date.today()
+    for row_id in range(1, count + 1):
+        due = start - timedelta(days=row_id % 365)
+        yield (row_id, row_id // 12 + 1, Decimal('1234.56'), 'gcash', due, due, f'REF{row_id}')
+
+
+class Command(BaseCommand):
+    help = 'Measure XLSX export throughput and peak memory on synthetic rows (no database access)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rows',
+            type=int,
+            default=500_000,
+            help='Total rows, split across the three sheets (default: 500,000)'
+        )
+
+    def handle(self, *args, **options):
+        per_sheet = options['rows'] // 3
+        sheets = [
+            ('Loans', LOAN_SHEET, _loans(per_sheet)),
+            ('Schedule', SCHEDULE_SHEET, _installments(per_sheet)),
+            ('Payments', PAYMENT_SHEET, _payments(options['rows'] - 2 * per_sheet)),
+        ]
+
+        baseline = _peak_rss_mb()
+        started = time.perf_counter()
+        with tempfile.TemporaryFile() as spool:
+            written = write_workbook(spool, sheets)
+            size = spool.tell()
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Wrote {written:,} rows in {elapsed:.2f}s ({written / elapsed:,.0f} rows/s), '
+            f'{size / 1024 / 1024:.1f} MB'
+        ))
+        self.stdout.write(f'Peak RSS: {_peak_rss_mb():.1f} MB (baseline {baseline:.1f} MB)')
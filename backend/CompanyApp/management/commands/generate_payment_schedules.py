@@ -0,0 +1,54 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from CompanyApp.models import LoanApplication, Payment
+from CompanyApp.schedules import build_schedules
+
+
+class Command(BaseCommand):
+    help = 'Create installment schedules for open (approved, delinquent or defaulted) loans that have none'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Loans per transaction (default: 500)'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only report how many loans are missing a schedule'
+        )
+
+    def handle(self, *args, **options):
+        loans = LoanApplication.objects.filter(
+            status__in=LoanApplication.OPEN_STATUSES,
+            payments__isnull=True,
+            monthly_payment__isnull=False,
+            term__isnull=False,
+        ).order_by('id')
+
+        if options['dry_run']:
+            self.stdout.write(f'{loans.count()} open loan(s) without a payment schedule')
+            return
+
+        batch_size = options['batch_size']
+        loan_count = installment_count = 0
+        last_id = 0
+        while True:
+            batch = list(loans.filter(id__gt=last_id)[:batch_size])
+            if not batch:
+                break
+
+            installments = build_schedules(batch)
+            with transaction.atomic():
+                Payment.objects.bulk_create(installments, batch_size=1000, ignore_conflicts=True)
+
+            loan_count += len(batch)
+            installment_count += len(installments)
+            last_id = batch[-1].id
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Created {installment_count} installment(s) for {loan_count} loan(s)')
+        )
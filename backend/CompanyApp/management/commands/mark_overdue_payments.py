@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from CompanyApp.overdue import mark_overdue_payments
+
+
+class Command(BaseCommand):
+    help = 'Mark pending installments past their due date as overdue (run daily)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=5000,
+            help='Installments updated per transaction (default: 5000)'
+        )
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help='Ignore the high-water mark and sweep every open installment'
+        )
+
+    def handle(self, *args, **options):
+        updated = mark_overdue_payments(chunk_size=options['chunk_size'], full=options['full'])
+        self.stdout.write(
+            self.style.SUCCESS(f'Marked {updated} installment(s) as overdue')
+        )
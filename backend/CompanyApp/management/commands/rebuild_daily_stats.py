@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from CompanyApp.models import Company
+from CompanyApp.rollups import rebuild_daily_stats
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the CompanyDailyStats rollup from LoanApplication'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--company',
+            type=int,
+            help='Only rebuild the rollup of this company ID (default: all companies)'
+        )
+
+    def handle(self, *args, **options):
+        company = None
+        if options['company']:
+            try:
+                company = Company.objects.get(id=options['company'])
+            except Company.DoesNotExist:
+                raise CommandError(f"Company {options['company']} does not exist")
+
+        rows = rebuild_daily_stats(company)
+
+        scope = company.company_name if company else 'all companies'
+        self.stdout.write(
+            self.style.SUCCESS(f'Rebuilt {rows} daily stats row(s) for {scope}')
+        )
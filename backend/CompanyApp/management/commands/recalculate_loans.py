@@ -0,0 +1,97 @@
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+
+from CompanyApp import cache, exposure
+from CompanyApp.amortization import amortize, to_decimal
+from CompanyApp.models import LoanApplication, Payment
+
+FIELDS = ['monthly_payment', 'total_payment', 'total_interest', 'balance']
+
+
+def _cents(values):
+    return np.array([-1 if value is None else int(value * 100) for value in values], dtype=np.int64)
+
+
+class Command(BaseCommand):
+    help = (
+        'Recompute monthly payment, totals and balance with the amortization engine, for loans '
+        'with no installment schedule yet (completed loans are left alone)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=5000,
+            help='Loans amortized and updated per transaction (default: 5000)'
+        )
+        parser.add_argument(
+            '--company',
+            type=int,
+            help='Only recalculate loans of this company id'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only report how many loans would change'
+        )
+
+    def handle(self, *args, **options):
+        # A scheduled loan's installments were cut from its stored totals;
+        # new totals would no longer match the sum of its installments
+        loans = (
+            LoanApplication.objects.filter(amount__gt=0, interest_rate__gt=0, term__gt=0)
+            .exclude(status='completed')
+            .filter(~Exists(Payment.objects.filter(loan_application=OuterRef('pk'))))
+            .order_by('id')
+        )
+        if options['company']:
+            loans = loans.filter(company_id=options['company'])
+
+        chunk_size = options['chunk_size']
+        scanned = changed = 0
+        last_id = 0
+        while True:
+            rows = list(
+                loans.filter(id__gt=last_id).values_list(
+                    'id', 'company_id', 'amount', 'interest_rate', 'term',
+                    'monthly_payment', 'total_payment', 'total_interest', 'amount_paid',
+                )[:chunk_size]
+            )
+            if not rows:
+                break
+
+            ids, company_ids, amounts, rates, terms, monthly, total, interest, paid = zip(*rows)
+            totals = amortize(amounts, rates, terms)
+            balance = np.maximum(totals['total_payment'] - _cents(paid), 0)
+            stale = np.flatnonzero(
+                (totals['monthly_payment'] != _cents(monthly))
+                | (totals['total_payment'] != _cents(total))
+                | (totals['total_interest'] != _cents(interest))
+            )
+
+            if len(stale) and not options['dry_run']:
+                updates = [
+                    LoanApplication(
+                        id=ids[index],
+                        monthly_payment=to_decimal(totals['monthly_payment'][index]),
+                        total_payment=to_decimal(totals['total_payment'][index]),
+                        total_interest=to_decimal(totals['total_interest'][index]),
+                        balance=to_decimal(balance[index]),
+                    )
+                    for index in stale
+                ]
+                with transaction.atomic():
+                    LoanApplication.objects.bulk_update(updates, FIELDS, batch_size=1000)
+                    exposure.refresh_balances([loan.id for loan in updates])
+                    for company_id in {company_ids[index] for index in stale} - {None}:
+                        cache.bump_company_version(company_id)
+
+            scanned += len(rows)
+            changed += len(stale)
+            last_id = ids[-1]
+
+        verb = 'would change' if options['dry_run'] else 'updated'
+        self.stdout.write(self.style.SUCCESS(f'Scanned {scanned} loan(s), {changed} {verb}'))
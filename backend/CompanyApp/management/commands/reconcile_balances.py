@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from CompanyApp.models import Company
+from CompanyApp.payments import reconcile_balances
+
+
+class Command(BaseCommand):
+    help = 'Verify LoanApplication.amount_paid/balance against paid Payment rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--company',
+            type=int,
+            help='Only check loans of this company ID'
+        )
+        parser.add_argument(
+            '--fix',
+            action='store_true',
+            help='Overwrite mismatching totals with the values computed from Payment'
+        )
+
+    def handle(self, *args, **options):
+        company = None
+        if options['company']:
+            try:
+                company = Company.objects.get(id=options['company'])
+            except Company.DoesNotExist:
+                raise CommandError(f"Company {options['company']} does not exist")
+
+        mismatched = reconcile_balances(fix=options['fix'], company=company)
+
+        for loan_id, amount_paid, expected_paid, balance, expected_balance in mismatched:
+            self.stdout.write(
+                f'Loan #{loan_id}: amount_paid {amount_paid} (expected {expected_paid}), '
+                f'balance {balance} (expected {expected_balance})'
+            )
+
+        if not mismatched:
+            self.stdout.write(self.style.SUCCESS('All loan balances match their payments'))
+        elif options['fix']:
+            self.stdout.write(self.style.SUCCESS(f'Fixed {len(mismatched)} loan(s)'))
+        else:
+            self.stdout.write(self.style.WARNING(f'{len(mismatched)} loan(s) out of balance; rerun with --fix to correct'))
@@ -0,0 +1,47 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from CompanyApp import reports
+
+
+class Command(BaseCommand):
+    help = 'Build queued report jobs (run alongside the web process, e.g. the Procfile worker)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Drain the queue, then exit instead of polling'
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=5.0,
+            help='Seconds to wait when the queue is empty (default: 5)'
+        )
+
+    def handle(self, *args, **options):
+        built = 0
+        try:
+            while True:
+                close_old_connections()
+                job = reports.claim_next()
+                if job is not None:
+                    reports.run(job)
+                    built += 1
+                    style = self.style.SUCCESS if job.status == 'done' else self.style.ERROR
+                    self.stdout.write(style(f'{job}: {job.row_count} row(s)'))
+                    continue
+
+                purged = reports.purge_expired()
+                if purged:
+                    self.stdout.write(f'Purged {purged} expired report(s)')
+                if options['once']:
+                    break
+                time.sleep(options['poll_interval'])
+        except KeyboardInterrupt:
+            pass
+
+        self.stdout.write(self.style.SUCCESS(f'Built {built} report(s)'))
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+
+from CompanyApp.delinquency import update_delinquency
+
+
+class Command(BaseCommand):
+    help = 'Move open loans between approved, delinquent and defaulted by days past due (run daily)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=5000,
+            help='Loans read per chunk (default: 5000)'
+        )
+        parser.add_argument(
+            '--company',
+            type=int,
+            help='Only update loans of this company id'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report the transitions without saving them'
+        )
+
+    def handle(self, *args, **options):
+        transitions = update_delinquency(
+            chunk_size=options['chunk_size'],
+            company_id=options['company'],
+            dry_run=options['dry_run'],
+        )
+
+        for (from_status, to_status), count in sorted(transitions.items()):
+            self.stdout.write(f'  {from_status} -> {to_status}: {count}')
+
+        verb = 'Would move' if options['dry_run'] else 'Moved'
+        self.stdout.write(
+            self.style.SUCCESS(f'{verb} {sum(transitions.values())} loan(s)')
+        )
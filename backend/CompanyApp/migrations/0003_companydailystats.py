@@ -0,0 +1,37 @@
+# Generated by Django 5.2.7 on 2026-10-17 22:08
+
+import datetime
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('CompanyApp', '0002_alter_loanapplication_status_alter_payment_status'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CompanyDailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('business_date', models.DateField()),
+                ('product_type', models.CharField(blank=True, default='', max_length=50)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('approved', 'Approved'), ('rejected', 'Rejected'), ('review', 'Under Review'), ('delinquent', 'Delinquent'), ('completed', 'Completed')], max_length=20)),
+                ('application_count', models.IntegerField(default=0)),
+                ('amount_total', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('processed_count', models.IntegerField(default=0)),
+                ('processing_time_total', models.DurationField(default=datetime.timedelta(0))),
+                ('rated_count', models.IntegerField(default=0)),
+                ('rating_total', models.DecimalField(decimal_places=1, default=0, max_digits=12)),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='CompanyApp.company')),
+            ],
+            options={
+                'verbose_name': 'Company Daily Stats',
+                'verbose_name_plural': 'Company Daily Stats',
+                'ordering': ['-business_date'],
+                'constraints': [models.UniqueConstraint(fields=('company', 'business_date', 'product_type', 'status'), name='unique_company_daily_stats')],
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.7 on 2026-10-17 22:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('CompanyApp', '0003_companydailystats'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['company', 'is_read', '-created_at'], name='notification_feed_idx'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.7 on 2026-10-17 22:13
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def remove_duplicate_installments(apps, schema_editor):
+    """
+    Schedules created lazily by concurrent requests may hold the same due
+    date twice. Keep one installment per due date, preferring a paid one.
+    """
+    Payment = apps.get_model('CompanyApp', 'Payment')
+
+    duplicates = (
+        Payment.objects.values('loan_application_id', 'due_date')
+        .annotate(n=Count('id'))
+        .filter(n__gt=1)
+        .order_by()
+    )
+    for duplicate in duplicates.iterator():
+        installments = Payment.objects.filter(
+            loan_application_id=duplicate['loan_application_id'],
+            due_date=duplicate['due_date'],
+        ).order_by('id')
+        keep = installments.filter(status='paid').first() or installments.first()
+        installments.exclude(id=keep.id).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('CompanyApp', '0004_notification_feed_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_installments, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='payment',
+            constraint=models.UniqueConstraint(fields=('loan_application', 'due_date'), name='unique_installment_due_date'),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.7 on 2026-10-17 22:15
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Greatest
+
+
+def backfill_totals(apps, schema_editor):
+    LoanApplication = apps.get_model('CompanyApp', 'LoanApplication')
+    Payment = apps.get_model('CompanyApp', 'Payment')
+
+    zero = Value(Decimal('0.00'), output_field=models.DecimalField(max_digits=12, decimal_places=2))
+    paid = (
+        Payment.objects.filter(loan_application=OuterRef('pk'), status='paid')
+        .values('loan_application')
+        .annotate(total=Sum('amount'))
+        .values('total')
+    )
+    LoanApplication.objects.update(amount_paid=Coalesce(Subquery(paid), zero))
+    LoanApplication.objects.update(
+        balance=Greatest(
+            Coalesce(F('total_payment'), zero) - F('amount_paid'),
+            zero,
+            output_field=models.DecimalField(max_digits=12, decimal_places=2),
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('CompanyApp', '0006_overdue_sweep'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='loanapplication',
+            name='amount_paid',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='loanapplication',
+            name='balance',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.RunPython(backfill_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 5.2.7 on 2026-10-17 22:19
+
+from decimal import Decimal
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_exposure(apps, schema_editor):
+    LoanApplication = apps.get_model('CompanyApp', 'LoanApplication')
+    BorrowerExposure = apps.get_model('CompanyApp', 'BorrowerExposure')
+
+    applications = (
+        LoanApplication.objects.filter(company__isnull=False)
+        .exclude(borrower__email__isnull=True)
+        .values_list('id', 'company_id', 'status', 'total_payment', 'amount_paid', 'balance', 'borrower__email')
+    )
+    rows = []
+    for application_id, company_id, status, total_payment, amount_paid, balance, email in applications.iterator(chunk_size=2000):
+        email = email.strip().lower()
+        if not email:
+            continue
+        rows.append(BorrowerExposure(
+            application_id=application_id,
+            company_id=company_id,
+            email=email,
+            status=status,
+            total_payment=total_payment or Decimal('0'),
+            amount_paid=amount_paid or Decimal('0'),
+            balance=balance or Decimal('0'),
+        ))
+        if len(rows) >= 2000:
+            BorrowerExposure.objects.bulk_create(rows)
+            rows = []
+    BorrowerExposure.objects.bulk_create(rows)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('BorrowerApp', '0004_remove_borrower_application_status_and_more'),
+        ('CompanyApp', '0007_loanapplication_amount_paid_balance'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BorrowerExposure',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('email', models.CharField(max_length=254)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('approved', 'Approved'), ('rejected', 'Rejected'), ('review', 'Under Review'), ('delinquent', 'Delinquent'), ('completed', 'Completed')], max_length=20)),
+                ('total_payment', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('amount_paid', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('balance', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('application', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='exposure', to='CompanyApp.loanapplication')),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='borrower_exposures', to='CompanyApp.company')),
+            ],
+            options={
+                'verbose_name': 'Borrower Exposure',
+                'verbose_name_plural': 'Borrower Exposures',
+                'indexes': [models.Index(fields=['email', 'status'], name='borrower_exposure_email_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_exposure, migrations.RunPython.noop),
+    ]
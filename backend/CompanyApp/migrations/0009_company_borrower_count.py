@@ -0,0 +1,35 @@
+# Generated by Django 5.2.7 on 2026-10-17 22:21
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_borrower_count(apps, schema_editor):
+    Company = apps.get_model('CompanyApp', 'Company')
+    Borrower = apps.get_model('BorrowerApp', 'Borrower')
+
+    counts = (
+        Borrower.objects.filter(company=OuterRef('pk'))
+        .values('company')
+        .annotate(total=Count('id'))
+        .values('total')
+    )
+    Company.objects.update(borrower_count=Coalesce(Subquery(counts), Value(0)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('BorrowerApp', '0005_normalize_borrower_emails'),
+        ('CompanyApp', '0008_borrowerexposure'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='company',
+            name='borrower_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_borrower_count, migrations.RunPython.noop),
+    ]
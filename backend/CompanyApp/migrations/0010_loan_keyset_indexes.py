@@ -0,0 +1,22 @@
+# Generated by Django 5.2.7 on 2026-10-17 22:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('BorrowerApp', '0006_borrower_search'),
+        ('CompanyApp', '0009_company_borrower_count'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='loanapplication',
+            index=models.Index(fields=['company', '-created_at', '-id'], name='loan_company_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='loanapplication',
+            index=models.Index(fields=['company', 'status', '-created_at', '-id'], name='loan_company_status_idx'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.7 on 2026-10-17 22:37
+
+import CompanyApp.models
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('CompanyApp', '0010_loan_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReportJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('loan_book', 'Loan Book (Excel)'), ('active_loans', 'Active Loans (CSV)'), ('payments', 'Payment Ledger (CSV)')], max_length=50)),
+                ('params', models.JSONField(blank=True, default=dict)),
+                ('fingerprint', models.CharField(max_length=64)),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='queued', max_length=20)),
+                ('file', models.FileField(blank=True, storage=CompanyApp.models.report_storage, upload_to='%Y/%m/%d/')),
+                ('row_count', models.PositiveIntegerField(default=0)),
+                ('error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='report_jobs', to='CompanyApp.company')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(condition=models.Q(('status', 'queued')), fields=['created_at'], name='report_job_queue_idx'), models.Index(fields=['company', 'fingerprint', '-created_at'], name='report_job_dedupe_idx')],
+            },
+        ),
+    ]
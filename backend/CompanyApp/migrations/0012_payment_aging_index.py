@@ -0,0 +1,17 @@
+# Generated by Django 5.2.7 on 2026-10-17 22:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('CompanyApp', '0011_reportjob'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['loan_application', 'status', 'due_date'], name='payment_loan_status_due_idx'),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.7 on 2026-10-17 22:44
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('CompanyApp', '0012_payment_aging_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='borrowerexposure',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('approved', 'Approved'), ('rejected', 'Rejected'), ('review', 'Under Review'), ('delinquent', 'Delinquent'), ('defaulted', 'Defaulted'), ('completed', 'Completed')], max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='companydailystats',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('approved', 'Approved'), ('rejected', 'Rejected'), ('review', 'Under Review'), ('delinquent', 'Delinquent'), ('defaulted', 'Defaulted'), ('completed', 'Completed')], max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='loanapplication',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('approved', 'Approved'), ('rejected', 'Rejected'), ('review', 'Under Review'), ('delinquent', 'Delinquent'), ('defaulted', 'Defaulted'), ('completed', 'Completed')], default='pending', max_length=20),
+        ),
+        migrations.CreateModel(
+            name='LoanStatusHistory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('from_status', models.CharField(choices=[('pending', 'Pending'), ('approved', 'Approved'), ('rejected', 'Rejected'), ('review', 'Under Review'), ('delinquent', 'Delinquent'), ('defaulted', 'Defaulted'), ('completed', 'Completed')], max_length=20)),
+                ('to_status', models.CharField(choices=[('pending', 'Pending'), ('approved', 'Approved'), ('rejected', 'Rejected'), ('review', 'Under Review'), ('delinquent', 'Delinquent'), ('defaulted', 'Defaulted'), ('completed', 'Completed')], max_length=20)),
+                ('days_past_due', models.PositiveIntegerField(default=0)),
+                ('source', models.CharField(max_length=50)),
+                ('changed_at', models.DateTimeField(auto_now_add=True)),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='loan_status_history', to='CompanyApp.company')),
+                ('loan_application', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='status_history', to='CompanyApp.loanapplication')),
+            ],
+            options={
+                'verbose_name': 'Loan Status History',
+                'verbose_name_plural': 'Loan Status History',
+                'indexes': [models.Index(fields=['loan_application', '-changed_at'], name='loan_status_history_loan_idx'), models.Index(fields=['company', '-changed_at'], name='loan_status_history_co_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.7 on 2026-10-17 22:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('CompanyApp', '0013_loan_status_history'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LateFee',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('assessed_on', models.DateField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(condition=models.Q(('status', 'overdue')), fields=['id'], name='payment_overdue_idx'),
+        ),
+        migrations.AddField(
+            model_name='latefee',
+            name='company',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='late_fees', to='CompanyApp.company'),
+        ),
+        migrations.AddField(
+            model_name='latefee',
+            name='loan_application',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='late_fees', to='CompanyApp.loanapplication'),
+        ),
+        migrations.AddField(
+            model_name='latefee',
+            name='payment',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='late_fees', to='CompanyApp.payment'),
+        ),
+        migrations.AddConstraint(
+            model_name='latefee',
+            constraint=models.UniqueConstraint(fields=('payment', 'assessed_on'), name='unique_late_fee_per_day'),
+        ),
+    ]
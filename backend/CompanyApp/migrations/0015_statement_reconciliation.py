@@ -0,0 +1,51 @@
+# Generated by Django 5.2.7 on 2026-10-17 22:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('CompanyApp', '0014_late_fee'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StatementImport',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('filename', models.CharField(max_length=255)),
+                ('line_count', models.PositiveIntegerField(default=0)),
+                ('posted_count', models.PositiveIntegerField(default=0)),
+                ('review_count', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='statement_imports', to='CompanyApp.company')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='StatementLine',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('line_number', models.PositiveIntegerField()),
+                ('transaction_date', models.DateField(blank=True, null=True)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('reference', models.CharField(blank=True, max_length=100)),
+                ('payer', models.CharField(blank=True, max_length=255)),
+                ('status', models.CharField(choices=[('posted', 'Posted'), ('review', 'Needs Review'), ('resolved', 'Resolved'), ('dismissed', 'Dismissed')], max_length=20)),
+                ('reason', models.CharField(blank=True, choices=[('no_match', 'No matching installment'), ('ambiguous', 'Several possible installments'), ('amount_mismatch', 'Amount differs from the installment'), ('already_paid', 'Installment already paid'), ('duplicate', 'Line already imported')], max_length=20)),
+                ('candidates', models.JSONField(blank=True, default=list)),
+                ('resolved_at', models.DateTimeField(blank=True, null=True)),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='statement_lines', to='CompanyApp.company')),
+                ('payment', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='statement_lines', to='CompanyApp.payment')),
+                ('statement', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lines', to='CompanyApp.statementimport')),
+            ],
+            options={
+                'ordering': ['statement', 'line_number'],
+                'indexes': [models.Index(condition=models.Q(('status', 'review')), fields=['company', 'id'], name='statement_line_review_idx'), models.Index(fields=['company', 'transaction_date'], name='statement_line_date_idx')],
+            },
+        ),
+    ]
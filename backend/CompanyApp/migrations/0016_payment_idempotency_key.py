@@ -0,0 +1,29 @@
+# Generated by Django 5.2.7 on 2026-10-17 23:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('CompanyApp', '0015_statement_reconciliation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PaymentIdempotencyKey',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=64)),
+                ('status_code', models.PositiveSmallIntegerField(default=200)),
+                ('response', models.JSONField(default=dict)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='payment_idempotency_keys', to='CompanyApp.company')),
+                ('payment', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='idempotency_keys', to='CompanyApp.payment')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('company', 'key'), name='unique_payment_idempotency_key')],
+            },
+        ),
+    ]
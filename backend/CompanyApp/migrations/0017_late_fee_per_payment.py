@@ -0,0 +1,31 @@
+# Generated by Django 5.2.7 on 2026-10-17 23:17
+
+from django.db import migrations, models
+from django.db.models import Min
+
+
+def remove_duplicate_fees(apps, schema_editor):
+    """Accrual runs racing on different days may have charged one installment twice; keep the first fee"""
+    LateFee = apps.get_model('CompanyApp', 'LateFee')
+
+    first_fees = LateFee.objects.values('payment_id').annotate(first=Min('id')).values('first')
+    LateFee.objects.exclude(id__in=first_fees).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('CompanyApp', '0016_payment_idempotency_key'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_fees, migrations.RunPython.noop),
+        migrations.RemoveConstraint(
+            model_name='latefee',
+            name='unique_late_fee_per_day',
+        ),
+        migrations.AddConstraint(
+            model_name='latefee',
+            constraint=models.UniqueConstraint(fields=('payment',), name='unique_late_fee_per_payment'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-17 23:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('CompanyApp', '0017_late_fee_per_payment'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='latefee',
+            name='paid_date',
+            field=models.DateField(blank=True, null=True),
+        ),
+    ]
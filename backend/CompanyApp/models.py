@@ -1,8 +1,15 @@
 from django.db import models
+from django.conf import settings
 from django.contrib.auth.models import User
+from django.core.files.storage import FileSystemStorage
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.core.exceptions import ValidationError
-from django.db import models
+from django.db import transaction
+from django.db.models.functions import Greatest
+from datetime import timedelta
+from decimal import Decimal
+
+from CompanyApp.amortization import amortize, to_decimal
 
 class Company(models.Model):
     LOAN_PRODUCT_CHOICES = [
@@ -54,6 +61,9 @@ class Company(models.Model):
     date_registered = models.DateTimeField(auto_now_add=True)
     date_updated = models.DateTimeField(auto_now=True)
     
+    # Number of Borrower rows, maintained by CompanyApp.signals
+    borrower_count = models.PositiveIntegerField(default=0, editable=False)
+    
     class Meta:
         verbose_name = "Company"
         verbose_name_plural = "Companies"
@@ -64,23 +74,36 @@ class Company(models.Model):
     
     def clean(self):
         """Custom validation for model fields"""
+        # Ranges with a deferred end were not edited and are left alone
+        deferred = self.get_deferred_fields()
+        
         # Validate loan amount ranges
-        if self.min_loan_amount and self.max_loan_amount:
+        if not {'min_loan_amount', 'max_loan_amount'} & deferred and self.min_loan_amount and self.max_loan_amount:
             if self.max_loan_amount <= self.min_loan_amount:
                 raise ValidationError("Maximum loan amount must be greater than minimum loan amount")
         
         # Validate interest rate ranges
-        if self.min_interest_rate and self.max_interest_rate:
+        if not {'min_interest_rate', 'max_interest_rate'} & deferred and self.min_interest_rate and self.max_interest_rate:
             if self.max_interest_rate <= self.min_interest_rate:
                 raise ValidationError("Maximum interest rate must be greater than minimum interest rate")
         
         # Validate loan term ranges
-        if self.min_loan_term and self.max_loan_term:
+        if not {'min_loan_term', 'max_loan_term'} & deferred and self.min_loan_term and self.max_loan_term:
             if self.max_loan_term <= self.min_loan_term:
                 raise ValidationError("Maximum loan term must be greater than minimum loan term")
     
     def save(self, *args, **kwargs):
-        self.full_clean()
+        # Validate and write only the loaded fields, so deferred ones are
+        # not loaded one query at a time
+        deferred = self.get_deferred_fields()
+        loaded = [field for field in self._meta.concrete_fields if field.attname not in deferred]
+        self.full_clean(exclude=[field.name for field in self._meta.concrete_fields if field.attname in deferred])
+        # borrower_count is changed with F() updates; never write back a stale copy
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in loaded
+                if not field.primary_key and field.name != 'borrower_count'
+            ]
         super().save(*args, **kwargs)
     
     @property
@@ -118,6 +141,10 @@ class LoanApplication(models.Model):
     total_payment = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
     total_interest = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
     
+    # Repayment totals, kept in step with paid Payment rows (see CompanyApp.payments)
+    amount_paid = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    balance = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    
     # Status tracking
     approved_date = models.DateTimeField(null=True, blank=True)
     rating = models.DecimalField(max_digits=2, decimal_places=1, null=True, blank=True)
@@ -128,26 +155,83 @@ class LoanApplication(models.Model):
         ('rejected', 'Rejected'),
         ('review', 'Under Review'),
         ('delinquent', 'Delinquent'),
+        ('defaulted', 'Defaulted'),
         ('completed', 'Completed'),
     ]
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     
+    # Disbursed loans still being repaid; the delinquency job moves loans
+    # between these (CompanyApp.delinquency)
+    OPEN_STATUSES = ['approved', 'delinquent', 'defaulted']
+    
     created_at = models.DateTimeField(auto_now_add=True)
     
+    class Meta:
+        indexes = [
+            # Keyset pagination of the company list views (CompanyApp.pagination)
+            models.Index(fields=['company', '-created_at', '-id'], name='loan_company_created_idx'),
+            models.Index(fields=['company', 'status', '-created_at', '-id'], name='loan_company_status_idx'),
+        ]
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """Remember the loaded field values so saves can tell what changed"""
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = {
+            name: value for name, value in zip(field_names, values)
+            if value is not models.DEFERRED
+        }
+        return instance
+    
+    # Changed only with F() updates (CompanyApp.payments); saves never write them back
+    REPAYMENT_FIELDS = ('amount_paid', 'balance')
+    
+    def save(self, *args, **kwargs):
+        if self._state.adding:
+            if self.total_payment:
+                self.balance = max(Decimal(self.total_payment) - Decimal(self.amount_paid or 0), Decimal('0.00'))
+            else:
+                self.balance = Decimal('0.00')
+        elif kwargs.get('update_fields') is None:
+            # Like Django's save of a deferred instance: only the loaded fields
+            deferred = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.attname not in deferred
+                and field.name not in self.REPAYMENT_FIELDS
+            ]
+        
+        loaded = getattr(self, '_loaded_values', {})
+        total_changed = (
+            not self._state.adding
+            and 'total_payment' in kwargs['update_fields']
+            and loaded.get('total_payment', models.DEFERRED) != self.total_payment
+        )
+        
+        # Rollups maintained by CompanyApp.signals commit or roll back with the save
+        with transaction.atomic():
+            if total_changed:
+                # A new total moves the balance against the stored amount_paid
+                LoanApplication.objects.filter(pk=self.pk).update(balance=Greatest(
+                    models.Value(Decimal(self.total_payment or 0)) - models.F('amount_paid'),
+                    models.Value(Decimal('0.00')),
+                    output_field=models.DecimalField(max_digits=12, decimal_places=2),
+                ))
+            super().save(*args, **kwargs)
+        if total_changed:
+            loaded['total_payment'] = self.total_payment
+    
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            return super().delete(*args, **kwargs)
+    
     def calculate_loan_payment(self):
         """Calculate monthly payment, total payment, and total interest"""
         if self.amount and self.interest_rate and self.term:
-            monthly_rate = (self.interest_rate / 100) / 12
-            
-            if monthly_rate > 0:
-                numerator = monthly_rate * (1 + monthly_rate) ** self.term
-                denominator = (1 + monthly_rate) ** self.term - 1
-                self.monthly_payment = self.amount * (numerator / denominator)
-            else:
-                self.monthly_payment = self.amount / self.term
-            
-            self.total_payment = self.monthly_payment * self.term
-            self.total_interest = self.total_payment - self.amount
+            totals = amortize([self.amount], [self.interest_rate], [self.term])
+            self.monthly_payment = to_decimal(totals['monthly_payment'][0])
+            self.total_payment = to_decimal(totals['total_payment'][0])
+            self.total_interest = to_decimal(totals['total_interest'][0])
         
         return {
             'monthly_payment': self.monthly_payment,
@@ -157,27 +241,13 @@ class LoanApplication(models.Model):
     
     @property
     def remaining_balance(self):
-        """Calculate remaining balance based on total payment and paid amounts"""
-        from decimal import Decimal
-        
-        if not self.total_payment:
-            return Decimal('0.00')
-        
-        # Get all paid payments
-        paid_payments = self.payments.filter(status='paid')
-        total_paid = sum(payment.amount for payment in paid_payments) if paid_payments.exists() else Decimal('0.00')
-        
-        # Calculate remaining balance
-        remaining = self.total_payment - total_paid
-        return max(remaining, Decimal('0.00'))  # Ensure non-negative
+        """Remaining balance, maintained on payment posting"""
+        return self.balance
     
     @property
     def total_paid(self):
-        """Calculate total amount paid so far"""
-        from decimal import Decimal
-        
-        paid_payments = self.payments.filter(status='paid')
-        return sum(payment.amount for payment in paid_payments) if paid_payments.exists() else Decimal('0.00')
+        """Total amount paid so far, maintained on payment posting"""
+        return self.amount_paid
     
     @property
     def payment_progress_percentage(self):
@@ -185,10 +255,82 @@ class LoanApplication(models.Model):
         if not self.total_payment or self.total_payment == 0:
             return 0
         
-        return (self.total_paid / self.total_payment) * 100
+        return (self.amount_paid / self.total_payment) * 100
+
+
+class CompanyDailyStats(models.Model):
+    """
+    Per-company daily rollup of loan applications, keyed by the day the
+    application was created, its product type and its current status.
+    Maintained incrementally by CompanyApp.rollups on every save.
+    """
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='daily_stats')
+    business_date = models.DateField()
+    product_type = models.CharField(max_length=50, blank=True, default='')
+    status = models.CharField(max_length=20, choices=LoanApplication.STATUS_CHOICES)
+
+    application_count = models.IntegerField(default=0)
+    amount_total = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+
+    # Approval turnaround (approved_date - created_at) of approved applications
+    processed_count = models.IntegerField(default=0)
+    processing_time_total = models.DurationField(default=timedelta(0))
+
+    rated_count = models.IntegerField(default=0)
+    rating_total = models.DecimalField(max_digits=12, decimal_places=1, default=0)
+
+    class Meta:
+        verbose_name = "Company Daily Stats"
+        verbose_name_plural = "Company Daily Stats"
+        ordering = ['-business_date']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['company', 'business_date', 'product_type', 'status'],
+                name='unique_company_daily_stats',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.company_id} {self.business_date} {self.product_type or '-'} {self.status}: {self.application_count}"
+
+
+class BorrowerExposure(models.Model):
+    """
+    One row per loan application keyed by the borrower's normalized email,
+    holding the lender, status and open balance. Lets the applicant-side
+    duplicate check read every lender's exposure with one indexed query.
+    Kept in sync by CompanyApp.exposure on status changes and payments.
+    """
+    email = models.CharField(max_length=254)
+    application = models.OneToOneField(LoanApplication, on_delete=models.CASCADE, related_name='exposure')
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='borrower_exposures')
+    status = models.CharField(max_length=20, choices=LoanApplication.STATUS_CHOICES)
+    total_payment = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    amount_paid = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    balance = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Borrower Exposure"
+        verbose_name_plural = "Borrower Exposures"
+        indexes = [
+            models.Index(fields=['email', 'status'], name='borrower_exposure_email_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.email} @ {self.company_id}: {self.status} ({self.balance})"
 
 
 class Notification(models.Model):
+    # Dashboard icon and color per notification type
+    STYLES = {
+        'new_application': ('fas fa-file-alt', 'blue'),
+        'approved': ('fas fa-check-circle', 'green'),
+        'overdue': ('fas fa-exclamation-triangle', 'red'),
+        'high_value': ('fas fa-star', 'yellow'),
+        'review': ('fas fa-search', 'orange'),
+    }
+
     company = models.ForeignKey(Company, on_delete=models.CASCADE)
     message = models.CharField(max_length=255)
     type = models.CharField(max_length=50)  # e.g., 'overdue', 'new_application', 'payment_received'
@@ -198,9 +340,20 @@ class Notification(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['company', 'is_read', '-created_at'], name='notification_feed_idx'),
+        ]
 
     def __str__(self):
         return f"{self.type.title()} - {self.message[:30]}"
+
+    @property
+    def icon(self):
+        return self.STYLES.get(self.type, ('fas fa-bell', 'gray'))[0]
+
+    @property
+    def color(self):
+        return self.STYLES.get(self.type, ('fas fa-bell', 'gray'))[1]
     
 
 class Payment(models.Model):
@@ -227,9 +380,211 @@ class Payment(models.Model):
 
     class Meta:
         ordering = ['-due_date']
+        constraints = [
+            models.UniqueConstraint(fields=['loan_application', 'due_date'], name='unique_installment_due_date'),
+        ]
+        indexes = [
+            # Open installments only, for the overdue sweep
+            models.Index(fields=['due_date'], condition=models.Q(status='pending'), name='payment_open_due_idx'),
+            # Oldest unpaid installment per loan, for the aging report
+            models.Index(fields=['loan_application', 'status', 'due_date'], name='payment_loan_status_due_idx'),
+            # Overdue installments only, for the late-fee accrual
+            models.Index(fields=['id'], condition=models.Q(status='overdue'), name='payment_overdue_idx'),
+        ]
 
     def __str__(self):
         return f"Payment {self.id} for Loan {self.loan_application.id} - {self.status}"
     
 
 
+
+
+
+class LateFee(models.Model):
+    """Ledger of late fees assessed on overdue installments"""
+    payment = models.ForeignKey(Payment, on_delete=models.CASCADE, related_name='late_fees')
+    loan_application = models.ForeignKey(LoanApplication, on_delete=models.CASCADE, related_name='late_fees')
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='late_fees')
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
+    assessed_on = models.DateField()
+    # Set once the fee is collected out of a payment; until then it is owed
+    paid_date = models.DateField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            # One fee per installment, however many runs race on whichever days
+            models.UniqueConstraint(fields=['payment'], name='unique_late_fee_per_payment'),
+        ]
+
+    def __str__(self):
+        return f"Late fee {self.amount} on Payment {self.payment_id} ({self.assessed_on})"
+
+
+class StatementImport(models.Model):
+    """An uploaded bank or e-wallet statement and its reconciliation totals"""
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='statement_imports')
+    filename = models.CharField(max_length=255)
+    line_count = models.PositiveIntegerField(default=0)
+    posted_count = models.PositiveIntegerField(default=0)
+    review_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.filename} ({self.company})"
+
+
+class StatementLine(models.Model):
+    """One credit line of an imported statement, posted or awaiting review"""
+    STATUS_CHOICES = [
+        ('posted', 'Posted'),
+        ('review', 'Needs Review'),
+        ('resolved', 'Resolved'),
+        ('dismissed', 'Dismissed'),
+    ]
+
+    REASON_CHOICES = [
+        ('no_match', 'No matching installment'),
+        ('ambiguous', 'Several possible installments'),
+        ('amount_mismatch', 'Amount differs from the installment'),
+        ('already_paid', 'Installment already paid'),
+        ('duplicate', 'Line already imported'),
+    ]
+
+    statement = models.ForeignKey(StatementImport, on_delete=models.CASCADE, related_name='lines')
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='statement_lines')
+    line_number = models.PositiveIntegerField()
+    transaction_date = models.DateField(null=True, blank=True)
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
+    reference = models.CharField(max_length=100, blank=True)
+    payer = models.CharField(max_length=255, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES)
+    reason = models.CharField(max_length=20, choices=REASON_CHOICES, blank=True)
+    payment = models.ForeignKey(Payment, on_delete=models.SET_NULL, null=True, blank=True, related_name='statement_lines')
+    # Installments the matcher considered, offered to the reviewer
+    candidates = models.JSONField(default=list, blank=True)
+    resolved_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['statement', 'line_number']
+        indexes = [
+            # The review queue
+            models.Index(fields=['company', 'id'], condition=models.Q(status='review'), name='statement_line_review_idx'),
+            # Lines already posted over a date range, for duplicate detection across uploads
+            models.Index(fields=['company', 'transaction_date'], name='statement_line_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"Line {self.line_number} of {self.statement_id} ({self.status})"
+
+
+class PaymentIdempotencyKey(models.Model):
+    """Client key of a recorded payment request and the response it got, replayed on retries"""
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='payment_idempotency_keys')
+    key = models.CharField(max_length=64)
+    payment = models.ForeignKey(Payment, on_delete=models.CASCADE, null=True, blank=True, related_name='idempotency_keys')
+    status_code = models.PositiveSmallIntegerField(default=200)
+    response = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            # Concurrent retries of one request wait on this index; only the first posts
+            models.UniqueConstraint(fields=['company', 'key'], name='unique_payment_idempotency_key'),
+        ]
+
+    def __str__(self):
+        return f"{self.key} ({self.company_id})"
+
+
+class LoanStatusHistory(models.Model):
+    """Append-only log of loan status transitions made by batch jobs"""
+    loan_application = models.ForeignKey(LoanApplication, on_delete=models.CASCADE, related_name='status_history')
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='loan_status_history')
+    from_status = models.CharField(max_length=20, choices=LoanApplication.STATUS_CHOICES)
+    to_status = models.CharField(max_length=20, choices=LoanApplication.STATUS_CHOICES)
+    days_past_due = models.PositiveIntegerField(default=0)
+    source = models.CharField(max_length=50)
+    changed_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Loan Status History"
+        verbose_name_plural = "Loan Status History"
+        indexes = [
+            models.Index(fields=['loan_application', '-changed_at'], name='loan_status_history_loan_idx'),
+            models.Index(fields=['company', '-changed_at'], name='loan_status_history_co_idx'),
+        ]
+
+    def __str__(self):
+        return f"Loan {self.loan_application_id}: {self.from_status} -> {self.to_status}"
+
+
+class JobCheckpoint(models.Model):
+    """High-water mark of a batch job, so reruns only process new work"""
+    name = models.CharField(max_length=100, unique=True)
+    last_date = models.DateField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} @ {self.last_date}"
+
+
+class CacheCounter(models.Model):
+    """Shared counter (e.g. dashboard cache hits), incremented with F() updates"""
+    name = models.CharField(max_length=50, unique=True)
+    value = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name} = {self.value}"
+
+
+def report_storage():
+    """Local storage for generated report files (settings.REPORTS_ROOT)"""
+    return FileSystemStorage(location=settings.REPORTS_ROOT)
+
+
+class ReportJob(models.Model):
+    """
+    A report generated off the request path. Web views enqueue jobs and poll
+    them; the run_report_worker command claims queued jobs with
+    SELECT ... FOR UPDATE SKIP LOCKED and writes the file to report storage.
+    """
+    KIND_CHOICES = [
+        ('loan_book', 'Loan Book (Excel)'),
+        ('active_loans', 'Active Loans (CSV)'),
+        ('payments', 'Payment Ledger (CSV)'),
+    ]
+
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='report_jobs')
+    kind = models.CharField(max_length=50, choices=KIND_CHOICES)
+    params = models.JSONField(default=dict, blank=True)
+    # Hash of kind and params; identical requests within the TTL share a job
+    fingerprint = models.CharField(max_length=64)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    file = models.FileField(upload_to='%Y/%m/%d/', storage=report_storage, blank=True)
+    row_count = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            # Queued jobs only, for the worker's claim query
+            models.Index(fields=['created_at'], condition=models.Q(status='queued'), name='report_job_queue_idx'),
+            models.Index(fields=['company', 'fingerprint', '-created_at'], name='report_job_dedupe_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} #{self.id} ({self.status})"
@@ -0,0 +1,89 @@
+"""
+Event-time writers for the company Notification feed.
+
+Alerts are stored when the event happens (application created, approved or
+sent to review, high-value intake, installment overdue) so the dashboard only
+has to read the newest unread rows.
+"""
+from decimal import Decimal
+
+from CompanyApp import cache
+from CompanyApp.models import Notification
+
+HIGH_VALUE_AMOUNT = Decimal('500000')
+
+
+def application_notifications(application, previous_status=None):
+    """Return the unsaved notifications for an application's status change"""
+    if application.company_id is None or application.status == previous_status:
+        return []
+
+    name = application.borrower.full_name
+    notifications = []
+
+    def add(type, message):
+        notifications.append(Notification(
+            company_id=application.company_id,
+            type=type,
+            message=message[:255],
+            related_application=application,
+        ))
+
+    if application.status == 'pending' and previous_status is None:
+        add('new_application', f'New loan application from {name} pending review')
+        if application.amount and application.amount >= HIGH_VALUE_AMOUNT:
+            add('high_value', f'High value loan request from {name}')
+    elif application.status == 'approved':
+        add('approved', f'Loan approved for {name}')
+    elif application.status == 'review':
+        add('review', f'Application from {name} requires additional review')
+
+    return notifications
+
+
+def record_application_events(application, previous_status=None):
+    Notification.objects.bulk_create(application_notifications(application, previous_status))
+
+
+def record_overdue_payments(payments):
+    """Store one 'overdue' notification per loan with installments that just became overdue"""
+    by_loan = {}
+    for payment in payments:
+        if payment.loan_application.company_id:
+            by_loan.setdefault(payment.loan_application_id, []).append(payment)
+
+    notifications = []
+    for installments in by_loan.values():
+        loan = installments[0].loan_application
+        oldest = min(installments, key=lambda payment: payment.due_date)
+        if len(installments) == 1:
+            message = (
+                f'Payment of ₱{oldest.amount:,.2f} from {loan.borrower.full_name} '
+                f'due {oldest.due_date:%B %d, %Y} is overdue'
+            )
+        else:
+            message = (
+                f'{len(installments)} payments from {loan.borrower.full_name} are overdue '
+                f'(oldest due {oldest.due_date:%B %d, %Y})'
+            )
+        notifications.append(Notification(
+            company_id=loan.company_id,
+            type='overdue',
+            message=message[:255],
+            related_application=loan,
+        ))
+
+    Notification.objects.bulk_create(notifications, batch_size=1000)
+    return len(notifications)
+
+
+def mark_read(company, ids=None):
+    """Mark the given (or all) unread notifications of a company as read"""
+    notifications = Notification.objects.filter(company=company, is_read=False)
+    if ids is not None:
+        notifications = notifications.filter(id__in=ids)
+
+    updated = notifications.update(is_read=True)
+    if updated:
+        cache.bump_company_version(company.id)
+    return updated
@@ -0,0 +1,55 @@
+"""
+Set-based sweep that marks past-due installments as overdue.
+
+Runs across every company in chunked UPDATEs over the partial index on open
+installments. A JobCheckpoint records the day of the last complete sweep, so
+a rerun only looks at installments that fell due since then.
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from CompanyApp import cache
+from CompanyApp.models import JobCheckpoint, Payment
+from CompanyApp.notifications import record_overdue_payments
+
+CHECKPOINT_NAME = 'mark_overdue_payments'
+
+
+def mark_overdue_payments(today=None, chunk_size=5000, full=False):
+    """
+    Flip every pending installment due before `today` to overdue.
+    Returns the number of installments updated.
+    """
+    today = today or timezone.localdate()
+    checkpoint, _ = JobCheckpoint.objects.get_or_create(name=CHECKPOINT_NAME)
+
+    open_installments = Payment.objects.filter(status='pending', due_date__lt=today)
+    if checkpoint.last_date and not full:
+        open_installments = open_installments.filter(due_date__gte=checkpoint.last_date)
+
+    updated = 0
+    while True:
+        with transaction.atomic():
+            # Wait for installments a cashier is posting rather than skip
+            # them: the checkpoint moves past their due date afterwards
+            ids = list(
+                open_installments.order_by('due_date', 'id')
+                .select_for_update()
+                .values_list('id', flat=True)[:chunk_size]
+            )
+            if not ids:
+                break
+
+            updated += Payment.objects.filter(id__in=ids, status='pending').update(status='overdue')
+
+            flipped = list(
+                Payment.objects.filter(id__in=ids, status='overdue')
+                .select_related('loan_application__borrower')
+            )
+            record_overdue_payments(flipped)
+            for company_id in {payment.loan_application.company_id for payment in flipped}:
+                cache.bump_company_version(company_id)
+
+    checkpoint.last_date = today
+    checkpoint.save()
+    return updated
@@ -0,0 +1,181 @@
+"""
+Keyset (cursor) pagination for the company list views.
+
+A page is fetched with WHERE (sort key) < (last row seen) ... LIMIT n over the
+queryset's ordering, which must end in a unique field such as `-id`. Page N
+therefore costs one index range scan, the same as page 1. A computed sort key
+such as a search rank is recomputed for every match on every page, so use one
+only on narrowed (searched) querysets, and make it exact (a decimal, not a
+float) so the boundary row compares equal to itself. Cursors are signed tokens
+carrying the boundary row's sort key and the page offset; the offset only
+feeds the "Showing X-Y" labels.
+"""
+import json
+import math
+from decimal import Decimal
+
+from django.core import signing
+from django.db import connections
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+CURSOR_SALT = 'CompanyApp.pagination'
+
+
+def estimate_count(queryset):
+    """Planner row estimate on PostgreSQL (no scan); an exact COUNT elsewhere"""
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return queryset.count()
+
+    sql, params = queryset.order_by().query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+def _encode(value):
+    if isinstance(value, Decimal):
+        return str(value)
+    return value.isoformat() if hasattr(value, 'isoformat') else value
+
+
+def _decode(value):
+    if isinstance(value, str):
+        return parse_datetime(value) or value
+    return value
+
+
+class KeysetPage:
+    def __init__(self, paginator, object_list, offset, has_next, has_previous):
+        self.paginator = paginator
+        self.object_list = object_list
+        self.offset = offset
+        self._has_next = has_next
+        self._has_previous = has_previous
+        self.number = offset // paginator.per_page + 1
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def start_index(self):
+        return self.offset + 1 if self.object_list else 0
+
+    def end_index(self):
+        return self.offset + len(self.object_list)
+
+    @property
+    def next_cursor(self):
+        if not self._has_next:
+            return None
+        return self.paginator.cursor(self.object_list[-1], 'next', self.end_index())
+
+    @property
+    def previous_cursor(self):
+        if not self._has_previous:
+            return None
+        return self.paginator.cursor(
+            self.object_list[0], 'previous', max(self.offset - self.paginator.per_page, 0)
+        )
+
+
+class KeysetPaginator:
+    """
+    Paginate an ordered queryset (model instances or values() dicts) by
+    cursor. `count` is an already known total, e.g. from a stats query;
+    without one the total is estimated on first use.
+    """
+
+    def __init__(self, queryset, per_page, count=None):
+        ordering = list(queryset.query.order_by)
+        if not ordering or not all(isinstance(field, str) for field in ordering):
+            raise ValueError('KeysetPaginator needs a queryset ordered by field names')
+        self.queryset = queryset
+        self.per_page = per_page
+        self.ordering = ordering
+        self._count = count
+
+    @property
+    def count(self):
+        if self._count is None:
+            self._count = estimate_count(self.queryset)
+        return self._count
+
+    @property
+    def num_pages(self):
+        return max(math.ceil(self.count / self.per_page), 1)
+
+    def _key(self, row):
+        fields = [field.lstrip('-') for field in self.ordering]
+        if isinstance(row, dict):
+            return [row[field] for field in fields]
+        return [getattr(row, field) for field in fields]
+
+    def cursor(self, row, direction, offset):
+        return signing.dumps(
+            {'key': [_encode(value) for value in self._key(row)], 'dir': direction, 'offset': offset},
+            salt=CURSOR_SALT,
+        )
+
+    def _beyond(self, key, forward):
+        """Rows strictly after (forward) or before `key` in the page ordering"""
+        condition = Q(pk__in=[])
+        for position, field in enumerate(self.ordering):
+            name = field.lstrip('-')
+            descending = field.startswith('-')
+            lookup = 'lt' if descending == forward else 'gt'
+            equal = {other.lstrip('-'): value for other, value in zip(self.ordering[:position], key)}
+            condition |= Q(**equal, **{f'{name}__{lookup}': key[position]})
+
+        # Redundant bound on the leading column gives the planner an index range
+        first = self.ordering[0]
+        bound = 'lte' if first.startswith('-') == forward else 'gte'
+        return Q(**{f'{first.lstrip("-")}__{bound}': key[0]}) & condition
+
+    def page(self, cursor=None):
+        try:
+            state = signing.loads(cursor, salt=CURSOR_SALT) if cursor else None
+        except signing.BadSignature:
+            state = None
+
+        if state is None:
+            rows = list(self.queryset[:self.per_page + 1])
+            return KeysetPage(self, rows[:self.per_page], 0, len(rows) > self.per_page, False)
+
+        key = [_decode(value) for value in state['key']]
+        offset = max(int(state.get('offset', 0)), 0)
+
+        if state.get('dir') == 'previous':
+            reverse = [field[1:] if field.startswith('-') else f'-{field}' for field in self.ordering]
+            rows = list(self.queryset.filter(self._beyond(key, False)).order_by(*reverse)[:self.per_page + 1])
+            has_previous = len(rows) > self.per_page
+            rows = rows[:self.per_page][::-1]
+            return KeysetPage(self, rows, offset if has_previous else 0, True, has_previous)
+
+        rows = list(self.queryset.filter(self._beyond(key, True))[:self.per_page + 1])
+        return KeysetPage(self, rows[:self.per_page], offset, len(rows) > self.per_page, True)
+
+
+def page_payload(page):
+    """Pagination fields of a JSON list response"""
+    return {
+        'count': page.paginator.count,
+        'start_index': page.start_index(),
+        'end_index': page.end_index(),
+        'has_next': page.has_next(),
+        'has_previous': page.has_previous(),
+        'next_cursor': page.next_cursor,
+        'previous_cursor': page.previous_cursor,
+    }
@@ -0,0 +1,349 @@
+"""
+Payment posting and the denormalized LoanApplication.amount_paid / balance
+columns it maintains.
+"""
+from datetime import date
+from decimal import Decimal, InvalidOperation
+
+from django.db import connection, transaction
+from django.db.models import DecimalField, F, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from CompanyApp import cache, exposure, late_fees
+from CompanyApp.aging import UNPAID_STATUSES
+from CompanyApp.delinquency import apply_transitions
+from CompanyApp.models import LoanApplication, Payment, PaymentIdempotencyKey
+
+ZERO = Value(Decimal('0.00'), output_field=DecimalField(max_digits=12, decimal_places=2))
+
+# Largest collection sheet accepted by post_payment_batch()
+MAX_BATCH_SIZE = 1000
+PAYMENT_METHODS = ('cash', 'bank_transfer', 'check', 'online', 'otc')
+MAX_IDEMPOTENCY_KEY_LENGTH = PaymentIdempotencyKey._meta.get_field('key').max_length
+
+
+def balance_update(amount):
+    """
+    update() kwargs that add `amount` to a loan's amount_paid and recompute
+    its balance in the same UPDATE (right-hand sides see the old row).
+    """
+    return {
+        'amount_paid': F('amount_paid') + amount,
+        'balance': Greatest(
+            Coalesce(F('total_payment'), ZERO) - F('amount_paid') - amount,
+            ZERO,
+            output_field=DecimalField(max_digits=12, decimal_places=2),
+        ),
+    }
+
+
+def post_payment(loan, payment, amount, paid_date, method, reference_number=''):
+    """
+    Mark an installment paid and add it to the loan's totals atomically.
+    Whatever `amount` brings in above the installment first settles owed
+    late fees. Completes the loan when nothing is left to pay, fees
+    included. Returns what is still owed: the balance plus unpaid fees.
+    """
+    with transaction.atomic():
+        collected, owed = late_fees.collect_fees([(loan.pk, payment.pk, amount - payment.amount, paid_date)])
+        amount -= collected.get(payment.pk, Decimal('0'))
+        fees_owed = owed.get(loan.pk, Decimal('0'))
+
+        payment.amount = amount
+        payment.paid_date = paid_date
+        payment.method = method
+        payment.reference_number = reference_number
+        payment.status = 'paid'
+        payment.save()
+
+        LoanApplication.objects.filter(pk=loan.pk).update(**balance_update(amount))
+        loan.refresh_from_db(fields=['amount_paid', 'balance'])
+
+        if loan.balance <= 0 and not fees_owed:
+            loan.status = 'completed'
+            loan.save()
+        else:
+            exposure.refresh_balances([loan.pk])
+
+    return loan.balance + fees_owed
+
+
+def _record_locked(company, posting):
+    """(HTTP status, response) of posting one installment, with the installment and its loan locked"""
+    # Lock order matches post_payments(): installment, then loan
+    payment = (
+        Payment.objects.select_for_update(of=('self',))
+        .filter(pk=posting['payment_id'], loan_application_id=posting['loan_id'],
+                loan_application__company=company)
+        .first()
+    )
+    if payment is None:
+        return 404, {'success': False, 'message': 'Payment record not found.'}
+    loan = (
+        LoanApplication.objects.select_for_update()
+        .filter(pk=posting['loan_id'], status__in=LoanApplication.OPEN_STATUSES)
+        .first()
+    )
+    if loan is None:
+        return 404, {'success': False, 'message': 'Loan not found or not active.'}
+    if payment.status not in UNPAID_STATUSES:
+        return 200, {'success': False, 'message': 'This payment has already been recorded.'}
+
+    remaining_balance = post_payment(
+        loan,
+        payment,
+        amount=posting['amount'],
+        paid_date=posting['paid_date'],
+        method=posting['method'],
+        reference_number=posting['reference_number'],
+    )
+    return 200, {
+        'success': True,
+        'message': 'Payment recorded successfully',
+        'remaining_balance': float(remaining_balance),
+        'is_fully_paid': remaining_balance <= 0,
+    }
+
+
+def record_payment(company, posting, idempotency_key=''):
+    """
+    Post one installment recorded by a cashier; `posting` is a clean_entry()
+    dict. The installment and its loan are locked before the 'already paid'
+    check, so concurrent posts of one installment queue up and only the first
+    posts. With an idempotency key the response is stored under (company,
+    key) in the same transaction: a retry gets the stored response back
+    without posting again, and a retry racing the original waits on the key's
+    unique index until it commits. Returns (HTTP status, response).
+    """
+    with transaction.atomic():
+        record = None
+        if idempotency_key:
+            record, created = PaymentIdempotencyKey.objects.get_or_create(company=company, key=idempotency_key)
+            if not created:
+                if record.payment_id not in (None, posting['payment_id']):
+                    return 422, {'success': False, 'message': 'This idempotency key was used for another payment.'}
+                return record.status_code, record.response
+
+        status_code, response = _record_locked(company, posting)
+
+        if record is not None:
+            if status_code != 404:
+                record.payment_id = posting['payment_id']
+            record.status_code = status_code
+            record.response = response
+            record.save(update_fields=['payment', 'status_code', 'response'])
+
+    return status_code, response
+
+
+def _update_rows(model, fields, rows):
+    """
+    Set `fields` on many rows with one executemany'd UPDATE; `rows` are
+    (*values, pk) tuples. Much cheaper than bulk_update()'s CASE expressions
+    for thousands of rows.
+    """
+    assignments = ', '.join(f'"{model._meta.get_field(field).column}" = %s' for field in fields)
+    with connection.cursor() as cursor:
+        cursor.executemany(f'UPDATE "{model._meta.db_table}" SET {assignments} WHERE "id" = %s', rows)
+
+
+def post_payments(postings, source='payment_batch'):
+    """
+    Post many installments in one transaction. `postings` are dicts with
+    payment_id, amount, paid_date, method and reference_number. Installments
+    and their loans are locked; installments already paid or not on an open
+    loan are skipped. Amounts above an installment settle owed late fees
+    first. Loan totals move with one bulk UPDATE and loans paid off, fees
+    included, are completed together. Returns {payment id: balance plus
+    unpaid fees after posting} of the installments posted.
+    """
+    postings = {posting['payment_id']: posting for posting in postings}
+    if not postings:
+        return {}
+
+    with transaction.atomic():
+        payments = list(
+            Payment.objects.select_for_update()
+            .filter(id__in=list(postings), status__in=UNPAID_STATUSES)
+            .order_by('id')
+            .only('id', 'loan_application_id', 'status', 'amount')
+        )
+        loans = {
+            loan.id: loan
+            for loan in LoanApplication.objects.select_for_update()
+            .filter(id__in={payment.loan_application_id for payment in payments},
+                    status__in=LoanApplication.OPEN_STATUSES)
+            .order_by('id')
+            .only('id', 'company_id', 'status', 'total_payment', 'amount_paid', 'balance')
+        }
+        payments = [payment for payment in payments if payment.loan_application_id in loans]
+        collected, owed = late_fees.collect_fees([
+            (payment.loan_application_id, payment.id, postings[payment.id]['amount'] - payment.amount,
+             postings[payment.id]['paid_date'])
+            for payment in payments
+        ])
+
+        for payment in payments:
+            posting = postings[payment.id]
+            payment.amount = posting['amount'] - collected.get(payment.id, Decimal('0'))
+            payment.paid_date = posting['paid_date']
+            payment.method = posting['method']
+            payment.reference_number = posting.get('reference_number', '')
+            payment.status = 'paid'
+            loan = loans[payment.loan_application_id]
+            loan.amount_paid += payment.amount
+        _update_rows(Payment, ['amount', 'paid_date', 'method', 'reference_number', 'status'], [
+            (payment.amount, payment.paid_date, payment.method, payment.reference_number, payment.status, payment.id)
+            for payment in payments
+        ])
+
+        touched = list(loans.values())
+        for loan in touched:
+            loan.balance = max((loan.total_payment or Decimal('0')) - loan.amount_paid, Decimal('0'))
+        _update_rows(LoanApplication, ['amount_paid', 'balance'], [
+            (loan.amount_paid, loan.balance, loan.id) for loan in touched
+        ])
+
+        exposure.refresh_balances(list(loans))
+        apply_transitions(
+            {loan.id: (loan.status, 'completed', 0) for loan in touched if loan.balance <= 0 and loan.id not in owed},
+            source=source,
+        )
+        for company_id in {loan.company_id for loan in loans.values()}:
+            cache.bump_company_version(company_id)
+
+    return {
+        payment.id: loans[payment.loan_application_id].balance + owed.get(payment.loan_application_id, Decimal('0'))
+        for payment in payments
+    }
+
+
+def clean_entry(entry, today):
+    """(posting, None) for a well-formed payment entry, or (None, error message)"""
+    try:
+        posting = {
+            'loan_id': int(entry['loan_id']),
+            'payment_id': int(entry['payment_id']),
+            'amount': Decimal(str(entry['amount'])),
+            'paid_date': date.fromisoformat(str(entry['paid_date'])),
+            'method': str(entry.get('method') or ''),
+            'reference_number': str(entry.get('reference') or '').strip(),
+        }
+    except (KeyError, TypeError, ValueError, AttributeError, InvalidOperation):
+        return None, 'loan_id, payment_id, amount and paid_date (YYYY-MM-DD) are required'
+
+    amount = posting['amount']
+    if not amount.is_finite() or amount <= 0 or amount != amount.quantize(Decimal('0.01')):
+        return None, 'Amount must be a positive number with at most two decimals'
+    if posting['paid_date'] > today:
+        return None, 'Paid date cannot be in the future'
+    if posting['method'] not in PAYMENT_METHODS:
+        return None, 'Unknown payment method'
+    if len(posting['reference_number']) > 100:
+        return None, 'Reference number is too long'
+    return posting, None
+
+
+def post_payment_batch(company, entries):
+    """
+    Validate and post a collection sheet: `entries` are dicts with loan_id,
+    payment_id, amount, paid_date, method and reference. Installments are
+    checked with one query, then every valid entry is posted in a single
+    post_payments() transaction. Returns one result dict per entry, in order.
+    """
+    today = timezone.localdate()
+    results = []
+    postings = {}
+    for index, entry in enumerate(entries):
+        posting, error = clean_entry(entry, today)
+        if posting and posting['payment_id'] in postings:
+            error = 'Installment appears more than once in the batch'
+        elif posting:
+            postings[posting['payment_id']] = posting
+        # Echo the ids as sent when the entry could not be read
+        sent = posting or (entry if isinstance(entry, dict) else {})
+        results.append({
+            'index': index,
+            'loan_id': sent.get('loan_id'),
+            'payment_id': sent.get('payment_id'),
+            'success': False,
+            'message': error,
+        })
+
+    installments = {
+        row['id']: row
+        for row in Payment.objects.filter(id__in=list(postings), loan_application__company=company)
+        .values('id', 'loan_application_id', 'status', 'loan_application__status')
+    }
+    for result in results:
+        if result['message']:
+            continue
+        installment = installments.get(result['payment_id'])
+        if installment is None or installment['loan_application_id'] != result['loan_id']:
+            result['message'] = 'Installment not found on this loan'
+        elif installment['loan_application__status'] not in LoanApplication.OPEN_STATUSES:
+            result['message'] = 'Loan is not active'
+        elif installment['status'] not in UNPAID_STATUSES:
+            result['message'] = 'This payment has already been recorded'
+        if result['message']:
+            del postings[result['payment_id']]
+
+    posted = post_payments(postings.values())
+    for result in results:
+        if result['message']:
+            continue
+        if result['payment_id'] in posted:
+            balance = posted[result['payment_id']]
+            result.update(success=True, message='Payment recorded', remaining_balance=str(balance),
+                          is_fully_paid=balance <= 0)
+        else:
+            # Paid or closed by someone else after validation
+            result['message'] = 'This payment has already been recorded'
+    return results
+
+
+def _expected_totals(loans):
+    paid = (
+        Payment.objects.filter(loan_application=OuterRef('pk'), status='paid')
+        .values('loan_application')
+        .annotate(total=Sum('amount'))
+        .values('total')
+    )
+    return loans.annotate(
+        expected_paid=Coalesce(Subquery(paid), ZERO),
+    ).annotate(
+        expected_balance=Greatest(
+            Coalesce(F('total_payment'), ZERO) - F('expected_paid'),
+            ZERO,
+            output_field=DecimalField(max_digits=12, decimal_places=2),
+        ),
+    )
+
+
+def reconcile_balances(fix=False, company=None):
+    """
+    Compare amount_paid/balance with the paid Payment rows. Returns the
+    mismatching loans as (id, amount_paid, expected_paid, balance,
+    expected_balance) tuples and, with fix=True, corrects them.
+    """
+    loans = LoanApplication.objects.all()
+    if company is not None:
+        loans = loans.filter(company=company)
+
+    mismatched = list(
+        _expected_totals(loans)
+        .filter(~Q(amount_paid=F('expected_paid')) | ~Q(balance=F('expected_balance')))
+        .values_list('id', 'amount_paid', 'expected_paid', 'balance', 'expected_balance')
+        .order_by('id')
+    )
+
+    if fix and mismatched:
+        for loan_id, _, expected_paid, _, expected_balance in mismatched:
+            LoanApplication.objects.filter(pk=loan_id).update(
+                amount_paid=expected_paid,
+                balance=expected_balance,
+            )
+        exposure.refresh_balances([loan_id for loan_id, *_ in mismatched])
+
+    return mismatched
@@ -0,0 +1,31 @@
+"""
+Column projections for the company list views and their JSON variants.
+
+Each tuple names the columns one kind of table row renders, so list pages
+load those instead of whole Borrower rows (~35 columns, including the
+income_source text, addresses and bank details) and LoanApplication rows.
+A template that reads a field outside its projection costs one lazy query
+per row, so keep these in step with the templates.
+"""
+
+# Borrower columns behind a name/email cell (full_name reads middle_name)
+_BORROWER_NAME = ('first_name', 'middle_name', 'last_name', 'email')
+
+APPLICATION_ROW = (
+    'id', 'product_type', 'amount', 'term', 'status', 'created_at',
+    'borrower', *(f'borrower__{field}' for field in _BORROWER_NAME),
+)
+
+ACTIVE_LOAN_ROW = APPLICATION_ROW + ('interest_rate', 'monthly_payment')
+
+BORROWER_ROW = (
+    'id', 'created_at', 'mobile_number', *_BORROWER_NAME,
+    'loan_application__id', 'loan_application__borrower', 'loan_application__product_type',
+    'loan_application__status', 'loan_application__amount', 'loan_application__term',
+)
+
+
+def project(queryset, fields):
+    """Load only `fields`, joining the relations they traverse"""
+    relations = sorted({field.rsplit('__', 1)[0] for field in fields if '__' in field})
+    return queryset.select_related(*relations).only(*fields)
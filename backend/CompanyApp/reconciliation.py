@@ -0,0 +1,352 @@
+"""
+Bank and e-wallet statement import with automatic payment reconciliation.
+
+An uploaded CSV or XLSX statement is read into credit lines, which are
+matched against the company's open installments through hash indexes built
+once per upload: by installment reference_number, by LN/LOAN-prefixed loan
+number quoted in the line's reference, and by payer name, each narrowed by
+amount. A line is posted only when exactly one loan fits; the oldest open
+installment of that amount is paid. Matched lines are posted in batches, one
+transaction each, with the lines recorded in the same transaction; everything
+else lands in the review queue with the reason and the installments
+considered.
+"""
+import csv
+import io
+import re
+from datetime import date, datetime, timedelta
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from openpyxl import load_workbook
+
+from CompanyApp.aging import UNPAID_STATUSES
+from CompanyApp.models import LoanApplication, Payment, StatementImport, StatementLine
+from CompanyApp.payments import post_payments
+
+# Matched lines posted per transaction
+POST_BATCH_SIZE = 1000
+# Installments due this long after the statement's last line can still match
+MATCH_WINDOW = timedelta(days=31)
+# Candidates stored per review line
+MAX_CANDIDATES = 10
+PAYMENT_METHOD = 'bank_transfer'
+
+# Accepted spellings of each statement column
+HEADER_ALIASES = {
+    'date': ('date', 'transaction date', 'posting date', 'value date', 'txn date'),
+    'amount': ('amount', 'credit', 'credit amount', 'deposit', 'amount credited'),
+    'reference': ('reference', 'reference number', 'reference no', 'ref', 'ref no', 'transaction id',
+                  'transaction reference'),
+    'payer': ('name', 'payer', 'sender', 'description', 'details', 'remarks', 'particulars'),
+}
+DATE_FORMATS = ('%Y-%m-%d', '%m/%d/%Y', '%b %d, %Y', '%d %b %Y', '%B %d, %Y')
+# Bare numbers are usually the bank's own reference, so the prefix is required
+LOAN_NUMBER = re.compile(r'^(?:LN|LOAN)(?:NO)?0*(\d+)$')
+
+
+def _header(value):
+    return ' '.join(re.sub(r'[^a-z ]', ' ', str(value or '').lower()).split())
+
+
+def _columns(headers):
+    """Map each known column to its index in the header row"""
+    positions = {}
+    for index, header in enumerate(_header(value) for value in headers):
+        for column, aliases in HEADER_ALIASES.items():
+            if header in aliases and column not in positions:
+                positions[column] = index
+    if 'amount' not in positions:
+        raise ValueError('The statement has no amount column.')
+    if 'reference' not in positions and 'payer' not in positions:
+        raise ValueError('The statement needs a reference or a payer name column.')
+    return positions
+
+
+def _amount(value):
+    if isinstance(value, (int, float, Decimal)):
+        return Decimal(str(value)).quantize(Decimal('0.01'))
+    text = re.sub(r'[^\d.()-]', '', str(value or ''))
+    if text.startswith('(') and text.endswith(')'):
+        text = '-' + text[1:-1]
+    try:
+        return Decimal(text).quantize(Decimal('0.01'))
+    except InvalidOperation:
+        return None
+
+
+def _date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    text = str(value or '').strip()
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(text, fmt).date()
+        except ValueError:
+            continue
+    return None
+
+
+def _text(value, length):
+    return ' '.join(str(value if value is not None else '').split())[:length]
+
+
+def _rows(upload):
+    """Raw rows of the first sheet of an .xlsx, or of a .csv file"""
+    if upload.name.lower().endswith('.xlsx'):
+        workbook = load_workbook(upload, read_only=True, data_only=True)
+        try:
+            yield from workbook.worksheets[0].iter_rows(values_only=True)
+        finally:
+            workbook.close()
+    elif upload.name.lower().endswith('.csv'):
+        text = io.TextIOWrapper(upload, encoding='utf-8-sig', newline='')
+        try:
+            yield from csv.reader(text)
+        finally:
+            text.detach()
+    else:
+        raise ValueError('Upload a .csv or .xlsx statement.')
+
+
+def parse_statement(upload):
+    """
+    Credit lines of a statement as dicts. Debits, blank and unreadable rows
+    are skipped. Returns (lines, skipped row count).
+    """
+    rows = _rows(upload)
+    positions = None
+    for headers in rows:
+        if any(value not in (None, '') for value in headers):
+            positions = _columns(headers)
+            break
+    if positions is None:
+        raise ValueError('The statement is empty.')
+
+    def cell(row, column):
+        index = positions.get(column)
+        return row[index] if index is not None and index < len(row) else None
+
+    lines, skipped = [], 0
+    for line_number, row in enumerate(rows, start=2):
+        amount = _amount(cell(row, 'amount'))
+        if amount is None or amount <= 0:
+            skipped += any(value not in (None, '') for value in row)
+            continue
+        lines.append({
+            'line_number': line_number,
+            'transaction_date': _date(cell(row, 'date')),
+            'amount': amount,
+            'reference': _text(cell(row, 'reference'), 100),
+            'payer': _text(cell(row, 'payer'), 255),
+        })
+    return lines, skipped
+
+
+def _reference_key(value):
+    return re.sub(r'[^A-Z0-9]', '', (value or '').upper())
+
+
+def _loan_number(reference):
+    match = LOAN_NUMBER.match(_reference_key(reference))
+    return int(match.group(1)) if match else None
+
+
+def _name_key(*parts):
+    """Order-insensitive name words, without initials ("DELA CRUZ, JUAN M." == "Juan Dela Cruz")"""
+    words = re.sub(r'[^a-z0-9 ]', ' ', ' '.join(part or '' for part in parts).lower()).split()
+    return tuple(sorted(word for word in words if len(word) > 1))
+
+
+def _line_key(line):
+    """Identity of a statement line, for spotting lines imported before"""
+    return (_reference_key(line['reference']), _name_key(line['payer']), line['transaction_date'], line['amount'])
+
+
+def _oldest_per_loan(installments):
+    oldest = {}
+    for payment_id, loan_id, _ in installments:
+        oldest.setdefault(loan_id, payment_id)
+    return list(oldest.values())[:MAX_CANDIDATES]
+
+
+class InstallmentIndex:
+    """Hash indexes over a company's open installments, oldest first per loan"""
+
+    def __init__(self, company, through):
+        self.by_reference = {}
+        self.by_loan = {}
+        self.by_name = {}
+        self.taken = set()
+
+        installments = (
+            Payment.objects.filter(
+                loan_application__company=company,
+                loan_application__status__in=LoanApplication.OPEN_STATUSES,
+                status__in=UNPAID_STATUSES,
+                due_date__lte=through,
+            )
+            .order_by('loan_application_id', 'due_date', 'id')
+            .values_list(
+                'id', 'loan_application_id', 'amount', 'reference_number',
+                'loan_application__borrower__first_name', 'loan_application__borrower__last_name',
+            )
+            .iterator(chunk_size=5000)
+        )
+        for payment_id, loan_id, amount, reference, first_name, last_name in installments:
+            installment = (payment_id, loan_id, amount)
+            if reference:
+                self.by_reference.setdefault(_reference_key(reference), []).append(installment)
+            if loan_id not in self.by_loan:
+                # Rows arrive grouped by loan; key the borrower's name once per loan
+                self.by_loan[loan_id] = []
+                by_name = self.by_name.setdefault(_name_key(first_name, last_name), [])
+            self.by_loan[loan_id].append(installment)
+            by_name.append(installment)
+
+    def _pick(self, installments, amount):
+        """The oldest open installment of `amount`, when only one loan has such an installment"""
+        installments = [installment for installment in installments if installment[0] not in self.taken]
+        if not installments:
+            return None, 'already_paid', []
+        exact = [installment for installment in installments if installment[2] == amount]
+        if not exact:
+            return None, 'amount_mismatch', _oldest_per_loan(installments)
+        if len({loan_id for _, loan_id, _ in exact}) > 1:
+            return None, 'ambiguous', _oldest_per_loan(exact)
+        self.taken.add(exact[0][0])
+        return exact[0][0], '', []
+
+    def match(self, line):
+        """(payment id or None, review reason, candidate payment ids) of a statement line"""
+        reference = _reference_key(line['reference'])
+        if reference in self.by_reference:
+            return self._pick(self.by_reference[reference], line['amount'])
+        loan_id = _loan_number(line['reference'])
+        if loan_id in self.by_loan:
+            return self._pick(self.by_loan[loan_id], line['amount'])
+        name = _name_key(line['payer'])
+        if name and name in self.by_name:
+            return self._pick(self.by_name[name], line['amount'])
+        return None, 'no_match', []
+
+
+def _imported_keys(company, lines):
+    """Keys of lines imported from earlier uploads over the same dates, whether posted, in review or dismissed"""
+    dates = [line['transaction_date'] for line in lines if line['transaction_date']]
+    # Review lines count too, or a re-upload queues the same credit for review twice
+    previous = StatementLine.objects.filter(company=company)
+    if dates:
+        previous = previous.filter(transaction_date__range=(min(dates), max(dates)))
+    else:
+        previous = previous.filter(transaction_date__isnull=True)
+    return {
+        _line_key({'reference': reference, 'payer': payer, 'transaction_date': transaction_date, 'amount': amount})
+        for reference, payer, transaction_date, amount
+        in previous.values_list('reference', 'payer', 'transaction_date', 'amount').iterator(chunk_size=5000)
+    }
+
+
+def _posting(line, today):
+    return {
+        'payment_id': line.payment_id,
+        'amount': line.amount,
+        'paid_date': line.transaction_date or today,
+        'method': PAYMENT_METHOD,
+        'reference_number': line.reference,
+    }
+
+
+def import_statement(company, upload):
+    """Parse, match and post a statement. Returns (StatementImport, skipped row count)"""
+    rows, skipped = parse_statement(upload)
+    if not rows:
+        raise ValueError('The statement has no credit lines.')
+
+    today = timezone.localdate()
+    statement = StatementImport.objects.create(company=company, filename=upload.name[:255])
+    dates = [row['transaction_date'] for row in rows if row['transaction_date']]
+    index = InstallmentIndex(company, max(dates, default=today) + MATCH_WINDOW)
+    seen = _imported_keys(company, rows)
+
+    matched, review = [], []
+    for row in rows:
+        key = _line_key(row)
+        if key in seen:
+            payment_id, reason, candidates = None, 'duplicate', []
+        else:
+            seen.add(key)
+            payment_id, reason, candidates = index.match(row)
+        line = StatementLine(
+            statement=statement,
+            company=company,
+            status='posted' if payment_id else 'review',
+            reason=reason,
+            payment_id=payment_id,
+            candidates=candidates,
+            **row,
+        )
+        (matched if payment_id else review).append(line)
+
+    StatementLine.objects.bulk_create(review, batch_size=2000)
+
+    # Each batch posts its installments and records its lines together
+    posted_count = 0
+    for start in range(0, len(matched), POST_BATCH_SIZE):
+        batch = matched[start:start + POST_BATCH_SIZE]
+        with transaction.atomic():
+            posted = post_payments([_posting(line, today) for line in batch], source='statement_import')
+            for line in batch:
+                if line.payment_id not in posted:
+                    # Paid since the index was built
+                    line.status, line.reason, line.candidates = 'review', 'already_paid', [line.payment_id]
+                    line.payment_id = None
+            StatementLine.objects.bulk_create(batch, batch_size=2000)
+        posted_count += len(posted)
+
+    statement.line_count = len(rows)
+    statement.posted_count = posted_count
+    statement.review_count = len(rows) - posted_count
+    statement.save(update_fields=['line_count', 'posted_count', 'review_count'])
+    return statement, skipped
+
+
+def resolve_line(line, payment_id):
+    """Post a review line against an installment picked by the reviewer. Returns True if posted"""
+    with transaction.atomic():
+        line = StatementLine.objects.select_for_update().get(pk=line.pk)
+        if line.status != 'review':
+            return False
+        payment = Payment.objects.filter(
+            pk=payment_id, loan_application__company_id=line.company_id
+        ).only('id').first()
+        if payment is None:
+            return False
+
+        line.payment_id = payment.id
+        posted = post_payments([_posting(line, timezone.localdate())], source='statement_import')
+        if payment.id not in posted:
+            return False
+
+        line.status = 'resolved'
+        line.resolved_at = timezone.now()
+        line.save(update_fields=['payment', 'status', 'resolved_at'])
+        StatementImport.objects.filter(pk=line.statement_id).update(
+            posted_count=F('posted_count') + 1,
+            review_count=F('review_count') - 1,
+        )
+    return True
+
+
+def dismiss_line(line):
+    """Drop a review line (e.g. a credit that is not a loan payment)"""
+    updated = StatementLine.objects.filter(pk=line.pk, status='review').update(
+        status='dismissed', resolved_at=timezone.now()
+    )
+    if updated:
+        StatementImport.objects.filter(pk=line.statement_id).update(review_count=F('review_count') - 1)
+    return bool(updated)
@@ -0,0 +1,202 @@
+"""
+Background report jobs: enqueueing with deduplication, claiming, and
+building the report files.
+
+Views call enqueue() and poll the job; the run_report_worker command claims
+queued jobs with SELECT ... FOR UPDATE SKIP LOCKED, so several workers can
+drain the queue without handing out a job twice. A job still running
+REPORT_TIMEOUT after it was claimed lost its worker and is failed, so it is
+neither left running forever nor reused for identical requests. Files land
+in local report storage (settings.REPORTS_ROOT) and are served by the
+download view.
+"""
+import hashlib
+import io
+import json
+import logging
+import tempfile
+from datetime import timedelta
+
+from django.core.files import File
+from django.db import transaction
+from django.db.models import Q
+from django.urls import reverse
+from django.utils import timezone
+
+from CompanyApp import filters
+from CompanyApp.exports import (
+    APPLICATION_COLUMNS, PAYMENT_COLUMNS, export_rows, loan_book_sheets, write_csv, write_workbook,
+)
+from CompanyApp.models import ReportJob
+
+logger = logging.getLogger(__name__)
+
+# Identical requests within this window reuse the queued, running or finished job
+REPORT_TTL = timedelta(minutes=15)
+# Finished jobs and their files are deleted after this long
+REPORT_RETENTION = timedelta(days=1)
+# A job still running this long after it was claimed lost its worker
+REPORT_TIMEOUT = timedelta(minutes=30)
+
+
+def _loan_book(company, params, spool):
+    loans = filters.active_loans(company, params).order_by('-created_at', '-id')
+    return write_workbook(spool, loan_book_sheets(loans))
+
+
+def _csv(spool, columns, queryset):
+    text = io.TextIOWrapper(spool, encoding='utf-8', newline='')
+    try:
+        return write_csv(text, columns, export_rows(queryset, columns))
+    finally:
+        text.flush()
+        text.detach()
+
+
+def _active_loans(company, params, spool):
+    loans = filters.active_loans(company, params).order_by('-created_at', '-id')
+    return _csv(spool, APPLICATION_COLUMNS, loans)
+
+
+def _payments(company, params, spool):
+    payments = filters.payments(company, params).order_by('due_date', 'id')
+    return _csv(spool, PAYMENT_COLUMNS, payments)
+
+
+# kind -> (accepted params, file extension, builder writing into a binary temp file)
+REPORTS = {
+    'loan_book': (filters.ACTIVE_LOAN_PARAMS, 'xlsx', _loan_book),
+    'active_loans': (filters.ACTIVE_LOAN_PARAMS, 'csv', _active_loans),
+    'payments': (filters.PAYMENT_PARAMS, 'csv', _payments),
+}
+
+
+def clean_params(kind, params):
+    """The non-empty parameters `kind` accepts, as strings"""
+    accepted = REPORTS[kind][0]
+    return {key: str(params[key]).strip() for key in accepted if str(params.get(key, '')).strip()}
+
+
+def fingerprint(kind, params):
+    return hashlib.sha256(json.dumps([kind, params], sort_keys=True).encode()).hexdigest()
+
+
+def _abandoned(now):
+    return Q(status='running', started_at__lt=now - REPORT_TIMEOUT)
+
+
+def enqueue(company, kind, params):
+    """
+    Queue a `kind` report over `params`, or return the job already covering
+    an identical request within REPORT_TTL. Returns (job, created).
+    """
+    params = clean_params(kind, params)
+    key = fingerprint(kind, params)
+
+    now = timezone.now()
+    existing = (
+        company.report_jobs
+        .filter(fingerprint=key, created_at__gte=now - REPORT_TTL)
+        .exclude(status='failed')
+        .exclude(_abandoned(now))
+        .order_by('-created_at')
+        .first()
+    )
+    if existing:
+        return existing, False
+
+    job = ReportJob.objects.create(company=company, kind=kind, params=params, fingerprint=key)
+    return job, True
+
+
+def fail_abandoned():
+    """Fail jobs whose worker died mid-build, so they can be requested again"""
+    now = timezone.now()
+    return ReportJob.objects.filter(_abandoned(now)).update(
+        status='failed',
+        error='The report worker stopped before the report was finished.',
+        finished_at=now,
+    )
+
+
+def claim_next():
+    """Mark the oldest queued job running and return it, or None"""
+    fail_abandoned()
+    with transaction.atomic():
+        job = (
+            ReportJob.objects.select_for_update(skip_locked=True)
+            .filter(status='queued')
+            .order_by('created_at')
+            .first()
+        )
+        if job is None:
+            return None
+        job.status = 'running'
+        job.started_at = timezone.now()
+        job.save(update_fields=['status', 'started_at'])
+    return job
+
+
+def run(job):
+    """Build the job's file into report storage and record the outcome"""
+    _, extension, build = REPORTS[job.kind]
+    try:
+        with tempfile.TemporaryFile() as spool:
+            job.row_count = build(job.company, job.params, spool)
+            spool.seek(0)
+            job.file.save(f'{job.kind}-{job.id}.{extension}', File(spool), save=False)
+        job.status = 'done'
+    except Exception as exc:
+        logger.exception('Report job %s failed', job.id)
+        job.status = 'failed'
+        job.error = str(exc)[:1000]
+    job.finished_at = timezone.now()
+
+    # Only while still running: fail_abandoned() may have failed the job
+    # meanwhile, and a request since then may have queued a replacement
+    finished = ReportJob.objects.filter(id=job.id, status='running').update(
+        file=job.file.name or '',
+        row_count=job.row_count,
+        status=job.status,
+        error=job.error,
+        finished_at=job.finished_at,
+    )
+    if not finished:
+        if job.file:
+            job.file.delete(save=False)
+        job.refresh_from_db()
+    return job
+
+
+def purge_expired():
+    """Delete jobs (and files) that finished more than REPORT_RETENTION ago"""
+    expired = ReportJob.objects.filter(finished_at__lt=timezone.now() - REPORT_RETENTION)
+    purged = 0
+    for job in expired.iterator():
+        if job.file:
+            job.file.delete(save=False)
+        job.delete()
+        purged += 1
+    return purged
+
+
+def download_name(job):
+    extension = REPORTS[job.kind][1]
+    stamp = timezone.localtime(job.finished_at or job.created_at).date().isoformat()
+    return f"{job.kind.replace('_', '-')}-{stamp}.{extension}"
+
+
+def job_payload(job):
+    """JSON fields of a job for the enqueue and status views"""
+    return {
+        'id': job.id,
+        'kind': job.kind,
+        'kind_display': job.get_kind_display(),
+        'status': job.status,
+        'row_count': job.row_count,
+        'error': job.error,
+        'created_at': job.created_at.isoformat(),
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+        'status_url': reverse('report-status', args=[job.id]),
+        'download_url': reverse('download-report', args=[job.id]) if job.status == 'done' else None,
+    }
@@ -0,0 +1,183 @@
+"""
+Incremental maintenance of CompanyDailyStats.
+
+Every LoanApplication contributes one row's worth of measures to exactly one
+rollup bucket (company, business_date, product_type, status). When an
+application is saved its previous contribution is subtracted and its new one
+added, inside the same transaction as the save.
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.db.models import Count, DurationField, ExpressionWrapper, F, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from CompanyApp.models import CompanyDailyStats, LoanApplication
+
+# LoanApplication fields that determine its rollup bucket and measures
+ROLLUP_FIELDS = ('company_id', 'created_at', 'product_type', 'status', 'amount', 'approved_date', 'rating')
+
+
+def snapshot(application, stored=None):
+    """
+    Return the rollup-relevant field values of an application. Fields still
+    deferred on the instance were not saved and are taken from `stored`.
+    """
+    deferred = application.get_deferred_fields() if stored else set()
+    return {
+        field: stored[field] if field in deferred else getattr(application, field)
+        for field in ROLLUP_FIELDS
+    }
+
+
+def _contribution(values):
+    """Return (bucket key, measures) for an application snapshot, or None"""
+    if not values or not values.get('company_id') or not values.get('created_at'):
+        return None
+
+    key = {
+        'company_id': values['company_id'],
+        'business_date': timezone.localtime(values['created_at']).date(),
+        'product_type': values['product_type'] or '',
+        'status': values['status'],
+    }
+
+    processed = values['status'] == 'approved' and values['approved_date'] is not None
+    rated = values['rating'] is not None
+    measures = {
+        'application_count': 1,
+        'amount_total': values['amount'] or Decimal('0'),
+        'processed_count': 1 if processed else 0,
+        'processing_time_total': (values['approved_date'] - values['created_at']) if processed else timedelta(0),
+        'rated_count': 1 if rated else 0,
+        'rating_total': values['rating'] if rated else Decimal('0'),
+    }
+    return key, measures
+
+
+def _apply(key, measures, sign):
+    """Add (sign=1) or subtract (sign=-1) measures from one bucket"""
+    stats, _ = CompanyDailyStats.objects.get_or_create(**key)
+    CompanyDailyStats.objects.filter(pk=stats.pk).update(**{
+        field: F(field) + value * sign for field, value in measures.items()
+    })
+
+
+def record_application_change(previous, current):
+    """
+    Move an application's contribution from its previous snapshot to its
+    current one. Either side may be None (creation / deletion).
+    """
+    old = _contribution(previous)
+    new = _contribution(current)
+    if old == new:
+        return
+
+    with transaction.atomic():
+        if old:
+            _apply(*old, sign=-1)
+        if new:
+            _apply(*new, sign=1)
+
+
+def record_application_changes(changes):
+    """
+    Batched record_application_change for bulk updates that bypass save()
+    signals: `changes` is an iterable of (previous, current) snapshots. Deltas
+    are summed per bucket first, so each touched bucket is updated once.
+    """
+    deltas = {}
+    for previous, current in changes:
+        for contribution, sign in ((_contribution(previous), -1), (_contribution(current), 1)):
+            if not contribution:
+                continue
+            key, measures = contribution
+            bucket = deltas.setdefault(tuple(sorted(key.items())), {})
+            for field, value in measures.items():
+                bucket[field] = bucket.get(field, 0 * value) + value * sign
+
+    with transaction.atomic():
+        for key, measures in deltas.items():
+            if any(measures.values()):
+                _apply(dict(key), measures, sign=1)
+
+
+def rebuild_daily_stats(company=None):
+    """
+    Recompute CompanyDailyStats from LoanApplication with one grouped query.
+    Returns the number of rollup rows written.
+
+    Runs in one transaction that, on PostgreSQL, first takes a SHARE lock on
+    the application table: saves (and their signal deltas) wait until the
+    rebuilt rows are committed instead of landing between the read and the
+    delete-and-reinsert, where they would be lost.
+    """
+    with transaction.atomic():
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'LOCK TABLE {connection.ops.quote_name(LoanApplication._meta.db_table)} IN SHARE MODE'
+                )
+        return _rebuild(company)
+
+
+def _rebuild(company):
+    applications = LoanApplication.objects.filter(company__isnull=False)
+    stats = CompanyDailyStats.objects.all()
+    if company is not None:
+        applications = applications.filter(company=company)
+        stats = stats.filter(company=company)
+
+    processed = Q(status='approved', approved_date__isnull=False)
+    rows = (
+        applications
+        .annotate(
+            business_date=TruncDate('created_at'),
+            processing_time=ExpressionWrapper(F('approved_date') - F('created_at'), output_field=DurationField()),
+        )
+        .values('company_id', 'business_date', 'product_type', 'status')
+        .annotate(
+            application_count=Count('id'),
+            amount_total=Sum('amount'),
+            processed_count=Count('id', filter=processed),
+            processing_time_total=Sum('processing_time', filter=processed),
+            rated_count=Count('rating'),
+            rating_total=Sum('rating'),
+        )
+        .order_by()
+    )
+
+    # Null and blank product types share a bucket
+    merged = {}
+    for row in rows:
+        key = (row['company_id'], row['business_date'], row['product_type'] or '', row['status'])
+        bucket = merged.setdefault(key, {
+            'application_count': 0,
+            'amount_total': Decimal('0'),
+            'processed_count': 0,
+            'processing_time_total': timedelta(0),
+            'rated_count': 0,
+            'rating_total': Decimal('0'),
+        })
+        for field in bucket:
+            if row[field]:
+                bucket[field] += row[field]
+
+    stats.delete()
+    CompanyDailyStats.objects.bulk_create(
+        [
+            CompanyDailyStats(
+                company_id=company_id,
+                business_date=business_date,
+                product_type=product_type,
+                status=status,
+                **measures,
+            )
+            for (company_id, business_date, product_type, status), measures in merged.items()
+        ],
+        batch_size=1000,
+    )
+
+    return len(merged)
@@ -0,0 +1,74 @@
+from decimal import Decimal, ROUND_HALF_UP
+
+from dateutil.relativedelta import relativedelta
+from django.utils import timezone
+
+from CompanyApp.amortization import schedules, to_decimal
+from CompanyApp.models import Payment
+
+CENT = Decimal('0.01')
+
+
+def installment_amounts(loans):
+    """
+    Per-period amounts of each loan's schedule, amortized in one vectorized
+    pass (the last installment absorbs the rounding remainder). Loans missing
+    an amount or rate repeat their stored monthly payment.
+    """
+    amounts = [
+        [Decimal(loan.monthly_payment).quantize(CENT, rounding=ROUND_HALF_UP)] * loan.term
+        for loan in loans
+    ]
+    amortized = [index for index, loan in enumerate(loans) if loan.amount and loan.interest_rate]
+    if amortized:
+        table = schedules(
+            [loans[index].amount for index in amortized],
+            [loans[index].interest_rate for index in amortized],
+            [loans[index].term for index in amortized],
+        )['payment']
+        for row, index in zip(table, amortized):
+            amounts[index] = [to_decimal(cents) for cents in row[:loans[index].term]]
+    return amounts
+
+
+def build_schedules(loans):
+    """
+    Return the unsaved monthly installments of approved loans. Installments
+    already past due (backfilled schedules) start out overdue, since the
+    overdue sweep only revisits due dates after its last run.
+    """
+    loans = [loan for loan in loans if loan.monthly_payment and loan.term]
+    today = timezone.localdate()
+
+    installments = []
+    for loan, amounts in zip(loans, installment_amounts(loans)):
+        approved_on = timezone.localtime(loan.approved_date).date() if loan.approved_date else today
+        for period, amount in enumerate(amounts, start=1):
+            due_date = approved_on + relativedelta(months=period)
+            installments.append(Payment(
+                loan_application=loan,
+                amount=amount,
+                method='',
+                due_date=due_date,
+                status='overdue' if due_date < today else 'pending',
+            ))
+    return installments
+
+
+def build_schedule(loan):
+    return build_schedules([loan])
+
+
+def generate_payment_schedule(loan):
+    """
+    Insert the loan's installment schedule with one bulk INSERT. Meant to run
+    inside the approval transaction; the (loan_application, due_date)
+    constraint makes concurrent or repeated calls insert nothing twice.
+    Returns the number of installments built.
+    """
+    if loan.payments.exists():
+        return 0
+
+    installments = build_schedule(loan)
+    Payment.objects.bulk_create(installments, batch_size=500, ignore_conflicts=True)
+    return len(installments)
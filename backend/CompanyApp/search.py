@@ -0,0 +1,82 @@
+"""
+Free-text search over borrowers, shared by the company list views.
+
+On PostgreSQL, names match by word prefix against the trigger-maintained
+Borrower.search_vector (GIN index), and names and emails also match by
+substring over trigram GIN indexes. Results are ranked by relevance. Numeric
+input (a loan id or amount) takes an exact-match fast path. Other databases
+fall back to icontains.
+"""
+import re
+from decimal import Decimal
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, TrigramSimilarity
+from django.db import connection
+from django.db.models import DecimalField, F, Q
+from django.db.models.functions import Cast
+
+SEARCH_CONFIG = 'simple'
+NUMBER = re.compile(r'^\d[\d,]*(\.\d+)?$')
+
+
+def _numeric(term):
+    return Decimal(term.replace(',', '')) if NUMBER.match(term) else None
+
+
+def _text_query(term):
+    # Every word must match as a prefix; only word characters reach to_tsquery
+    words = re.findall(r'\w+', term)
+    if not words:
+        return None
+    return SearchQuery(' & '.join(f'{word}:*' for word in words), search_type='raw', config=SEARCH_CONFIG)
+
+
+def search_q(term, borrower_path='', id_field=None, amount_field=None):
+    """
+    Q object for a search `term`. `borrower_path` is the lookup prefix to the
+    Borrower ('' for Borrower querysets, 'borrower__' for LoanApplications);
+    `id_field`/`amount_field` enable the numeric fast path.
+    """
+    term = term.strip()
+    number = _numeric(term)
+    if number is not None and (id_field or amount_field):
+        condition = Q(pk__in=[])
+        if amount_field:
+            condition |= Q(**{amount_field: number})
+        if id_field and number == number.to_integral_value():
+            condition |= Q(**{id_field: int(number)})
+        return condition
+
+    if connection.vendor != 'postgresql':
+        return (
+            Q(**{f'{borrower_path}first_name__icontains': term})
+            | Q(**{f'{borrower_path}last_name__icontains': term})
+            | Q(**{f'{borrower_path}email__icontains': term})
+        )
+
+    # icontains compiles to UPPER(name) LIKE UPPER(term), which the
+    # UPPER(name) trigram indexes serve
+    condition = (
+        Q(**{f'{borrower_path}email__contains': term.lower()})
+        | Q(**{f'{borrower_path}first_name__icontains': term})
+        | Q(**{f'{borrower_path}last_name__icontains': term})
+    )
+    query = _text_query(term)
+    if query is not None:
+        condition |= Q(**{f'{borrower_path}search_vector': query})
+    return condition
+
+
+def order_by_relevance(queryset, term, *ordering, borrower_path=''):
+    """
+    Order text-search results by rank, then by `ordering`. The rank is a
+    fixed-precision decimal, so keyset cursors can compare it exactly.
+    """
+    term = term.strip()
+    query = _text_query(term)
+    if connection.vendor != 'postgresql' or query is None or _numeric(term) is not None:
+        return queryset.order_by(*ordering)
+
+    rank = SearchRank(F(f'{borrower_path}search_vector'), query) + TrigramSimilarity(f'{borrower_path}email', term.lower())
+    rank = Cast(rank, DecimalField(max_digits=12, decimal_places=6))
+    return queryset.annotate(search_rank=rank).order_by('-search_rank', *ordering)
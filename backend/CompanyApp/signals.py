@@ -0,0 +1,111 @@
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from BorrowerApp.models import Borrower
+from CompanyApp import cache, exposure, notifications, rollups
+from CompanyApp.models import Company, LoanApplication, Payment
+
+
+@receiver(pre_save, sender=LoanApplication)
+def remember_previous_application(sender, instance, raw=False, **kwargs):
+    """Capture the application's stored values before it is overwritten"""
+    if raw or instance._state.adding:
+        instance._previous_values = None
+        return
+
+    loaded = getattr(instance, '_loaded_values', {})
+    if all(field in loaded for field in rollups.ROLLUP_FIELDS):
+        instance._previous_values = {field: loaded[field] for field in rollups.ROLLUP_FIELDS}
+    else:
+        # Instance was built by hand or loaded with deferred fields
+        instance._previous_values = (
+            LoanApplication.objects.filter(pk=instance.pk).values(*rollups.ROLLUP_FIELDS).first()
+        )
+
+
+@receiver(post_save, sender=LoanApplication)
+def update_daily_stats_on_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+
+    previous = getattr(instance, '_previous_values', None)
+    current = rollups.snapshot(instance, previous)
+    rollups.record_application_change(previous, current)
+
+    # Later saves of the same instance compare against what is now stored
+    instance._loaded_values = {**getattr(instance, '_loaded_values', {}), **current}
+
+
+@receiver(post_save, sender=LoanApplication)
+def notify_application_events(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+
+    previous = getattr(instance, '_previous_values', None)
+    notifications.record_application_events(instance, previous['status'] if previous else None)
+
+
+@receiver(post_save, sender=LoanApplication)
+def sync_borrower_exposure(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    exposure.sync_application(instance)
+
+
+@receiver(post_save, sender=Borrower)
+def rekey_borrower_exposure(sender, instance, created, raw=False, **kwargs):
+    if raw or created:
+        return
+    exposure.rename_borrower(instance)
+
+
+@receiver(post_delete, sender=LoanApplication)
+def update_daily_stats_on_delete(sender, instance, **kwargs):
+    rollups.record_application_change(rollups.snapshot(instance), None)
+
+
+@receiver(post_save, sender=LoanApplication)
+@receiver(post_delete, sender=LoanApplication)
+def invalidate_company_cache_on_application_change(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    cache.bump_company_version(instance.company_id)
+
+
+@receiver(post_save, sender=Payment)
+@receiver(post_delete, sender=Payment)
+def invalidate_company_cache_on_payment_change(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    if Payment.loan_application.is_cached(instance):
+        company_id = instance.loan_application.company_id
+    else:
+        company_id = LoanApplication.objects.filter(
+            pk=instance.loan_application_id
+        ).values_list('company_id', flat=True).first()
+    cache.bump_company_version(company_id)
+
+
+@receiver(post_save, sender=Borrower)
+def count_borrower_on_create(sender, instance, created, raw=False, **kwargs):
+    if raw or not created or instance.company_id is None:
+        return
+    Company.objects.filter(pk=instance.company_id).update(borrower_count=F('borrower_count') + 1)
+
+
+@receiver(post_delete, sender=Borrower)
+def count_borrower_on_delete(sender, instance, **kwargs):
+    if instance.company_id is None:
+        return
+    Company.objects.filter(pk=instance.company_id, borrower_count__gt=0).update(
+        borrower_count=F('borrower_count') - 1
+    )
+
+
+@receiver(post_save, sender=Company)
+@receiver(post_delete, sender=Company)
+def invalidate_company_directory(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    cache.invalidate_company_directory()
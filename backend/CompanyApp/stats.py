@@ -0,0 +1,138 @@
+from decimal import Decimal
+
+from django.db.models import Count, Q, Sum
+
+from CompanyApp.models import CompanyDailyStats, LoanApplication
+
+
+def _percent(part, whole, digits=2):
+    return round(part / whole * 100, digits) if whole else 0
+
+
+class PortfolioStats:
+    """
+    Per-status application counts and amount sums of one company, computed
+    with a single conditional-aggregation query.
+    """
+
+    STATUSES = [status for status, _ in LoanApplication.STATUS_CHOICES]
+
+    def __init__(self, row):
+        self.total_count = row['total_count'] or 0
+        self.total_amount = row['total_amount'] or Decimal('0')
+        self.counts = {status: row[f'{status}_count'] or 0 for status in self.STATUSES}
+        self.amounts = {status: row[f'{status}_amount'] or Decimal('0') for status in self.STATUSES}
+
+    @classmethod
+    def _aggregate(cls, queryset, count, amount):
+        aggregates = {'total_count': count(None), 'total_amount': amount(None)}
+        for status in cls.STATUSES:
+            aggregates[f'{status}_count'] = count(Q(status=status))
+            aggregates[f'{status}_amount'] = amount(Q(status=status))
+        return cls(queryset.aggregate(**aggregates))
+
+    @classmethod
+    def for_queryset(cls, applications):
+        """Stats over an already filtered LoanApplication queryset"""
+        return cls._aggregate(
+            applications,
+            count=lambda condition: Count('id', filter=condition),
+            amount=lambda condition: Sum('amount', filter=condition),
+        )
+
+    @classmethod
+    def from_groups(cls, groups):
+        """Build stats from rows of a GROUP BY status query with `count` and `amount`"""
+        row = {'total_count': 0, 'total_amount': Decimal('0')}
+        for status in cls.STATUSES:
+            row[f'{status}_count'] = 0
+            row[f'{status}_amount'] = Decimal('0')
+        for group in groups:
+            if group['status'] not in cls.STATUSES:
+                continue
+            row['total_count'] += group['count']
+            row['total_amount'] += group['amount'] or Decimal('0')
+            row[f"{group['status']}_count"] += group['count']
+            row[f"{group['status']}_amount"] += group['amount'] or Decimal('0')
+        return cls(row)
+
+    @classmethod
+    def for_company(cls, company, *predicates, **filters):
+        """
+        Stats over the company's LoanApplication rows, narrowed by optional
+        search/filter predicates (Q objects or field lookups).
+        """
+        return cls.for_queryset(LoanApplication.objects.filter(company=company).filter(*predicates, **filters))
+
+    @classmethod
+    def from_daily_stats(cls, company, **filters):
+        """Same stats read from the CompanyDailyStats rollup (O(days) rows)"""
+        rows = CompanyDailyStats.objects.filter(company=company, **filters)
+        return cls._aggregate(
+            rows,
+            count=lambda condition: Sum('application_count', filter=condition),
+            amount=lambda condition: Sum('amount_total', filter=condition),
+        )
+
+    def count(self, *statuses):
+        return sum(self.counts.get(status, 0) for status in statuses)
+
+    def amount(self, *statuses):
+        return sum((self.amounts.get(status, Decimal('0')) for status in statuses), Decimal('0'))
+
+    @property
+    def approval_rate(self):
+        return _percent(self.count('approved'), self.total_count)
+
+    @property
+    def rejection_rate(self):
+        return _percent(self.count('rejected'), self.total_count)
+
+    @property
+    def delinquency_rate(self):
+        return _percent(self.count('delinquent'), self.count(*LoanApplication.OPEN_STATUSES))
+
+    @property
+    def default_rate(self):
+        return _percent(self.count('defaulted'), self.count(*LoanApplication.OPEN_STATUSES))
+
+    def performance_split(self):
+        """On-time / late / missed percentages of the loan book"""
+        on_time, late, missed = self.count('approved'), self.count('delinquent'), self.count('defaulted')
+        total = on_time + late + missed
+        return _percent(on_time, total, 1), _percent(late, total, 1), _percent(missed, total, 1)
+
+
+def product_status_groups(applications):
+    """Counts and amount sums per (product_type, status) in one GROUP BY query"""
+    return list(
+        applications
+        .values('product_type', 'status')
+        .annotate(count=Count('id'), amount=Sum('amount'))
+        .order_by()
+    )
+
+
+def product_distribution(groups, products, labels=None):
+    """
+    Merge (product_type, status) groups into one entry per offered product,
+    in the order of `products`. Products without loans get zero rows.
+    """
+    labels = labels or {}
+    totals = {}
+    for group in groups:
+        count, amount = totals.get(group['product_type'], (0, Decimal('0')))
+        totals[group['product_type']] = (count + group['count'], amount + (group['amount'] or Decimal('0')))
+
+    total_count = sum(count for count, _ in totals.values())
+    distribution = []
+    for product in products:
+        count, amount = totals.get(product, (0, 0))
+        distribution.append({
+            'key': product,
+            'label': labels.get(product, product),
+            'count': count,
+            'amount': amount,
+            'percent': _percent(count, total_count, 1),
+        })
+    return distribution
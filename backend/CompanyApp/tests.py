@@ -1,3 +1,1029 @@
-from django.test import TestCase
+import io
+import os
+import threading
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest import skipUnless
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import IntegrityError, connection
+from django.db.models import Count
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from BorrowerApp.models import Borrower
+from CompanyApp import cache as dashboard_cache, exposure, reports
+from CompanyApp.aging import PortfolioAging
+from CompanyApp.amortization import amortize, loan_terms
+from CompanyApp.late_fees import accrue_late_fees
+from CompanyApp.models import (
+    BorrowerExposure, Company, CompanyDailyStats, LateFee, LoanApplication, LoanStatusHistory, Notification, Payment,
+    ReportJob, StatementLine,
+)
+from CompanyApp.overdue import mark_overdue_payments
+from CompanyApp.pagination import KeysetPaginator
+from CompanyApp.payments import MAX_BATCH_SIZE, post_payment, post_payments, record_payment
+from CompanyApp.reconciliation import import_statement
+from CompanyApp.schedules import generate_payment_schedule
+from CompanyApp.search import order_by_relevance, search_q
+from CompanyApp.stats import PortfolioStats, product_distribution, product_status_groups
+
+
+def make_company(username='lender', **fields):
+    user = User.objects.create_user(username, password='password')
+    return Company.objects.create(
+        user=user, company_name=f'{username.title()} Lending', registration_number='REG-1', tax_id='TAX-1',
+        street_address='1 Main St', city='Manila', state='NCR', postal_code='1000', contact_person='Ana Cruz',
+        contact_title='Manager', company_phone='+639170000000', business_email=f'{username}@example.com',
+        loan_products=['personal_loans'], min_loan_amount=Decimal('1000'), max_loan_amount=Decimal('1000000'),
+        min_interest_rate=Decimal('1'), max_interest_rate=Decimal('36'), min_loan_term=1, max_loan_term=60,
+        lending_policies='Standard', **fields,
+    )
+
+
+def make_loan(company, number, status='approved', amount=Decimal('12000'), term=12, email=None):
+    borrower = Borrower.objects.create(
+        company=company, first_name=f'Juan{number}', last_name='Dela Cruz', date_of_birth=date(1990, 1, 1),
+        email=email or f'juan{number}@example.com', gender='male', marital_status='single',
+        mobile_number='+639171234567', current_street_address='1 Rizal St', current_city='Manila',
+        current_state='NCR', current_postal_code='1000', employment_status='employed',
+        monthly_income=Decimal('50000'), income_source='Salary', bank_name='BDO', account_number='123',
+    )
+    loan = LoanApplication(
+        borrower=borrower, company=company, product_type='personal_loans', amount=amount, term=term,
+        interest_rate=Decimal('12'), status=status,
+        approved_date=timezone.now() if status in LoanApplication.OPEN_STATUSES else None,
+    )
+    loan.calculate_loan_payment()
+    loan.save()
+    if status in LoanApplication.OPEN_STATUSES:
+        generate_payment_schedule(loan)
+    return loan
+
+
+class AmortizationTests(SimpleTestCase):
+    def test_schedule_sums_to_total_payment(self):
+        for amount, rate, term in [(100000, 36, 60), (12000, 12, 12), (10000, Decimal('7.5'), 7), (999.99, 24, 18)]:
+            with self.subTest(amount=amount, rate=rate, term=term):
+                terms = loan_terms(amount, rate, term)
+                schedule = terms['schedule']
+                self.assertEqual(len(schedule), term)
+                self.assertEqual(sum(row['payment'] for row in schedule), terms['total_payment'])
+                self.assertEqual(sum(row['interest'] for row in schedule), terms['total_interest'])
+                self.assertEqual(sum(row['principal'] for row in schedule), Decimal(str(amount)))
+                self.assertEqual(schedule[-1]['balance'], Decimal('0.00'))
+
+    def test_vectorized_totals_match_single_loan(self):
+        totals = amortize([100000, 12000], [36, 12], [60, 12])
+        self.assertEqual(list(totals['total_payment']), [21679734, 1279423])
+        self.assertEqual(loan_terms(100000, 36, 60)['total_payment'], Decimal('216797.34'))
+
+    def test_last_period_absorbs_rounding(self):
+        schedule = loan_terms(100000, 36, 60)['schedule']
+        self.assertEqual({row['payment'] for row in schedule[:-1]}, {Decimal('3613.30')})
+        self.assertEqual(schedule[-1]['payment'], Decimal('3612.64'))
+
+    def test_zero_rate_splits_principal_evenly(self):
+        terms = loan_terms(1000, 0, 3)
+        self.assertEqual([row['payment'] for row in terms['schedule']],
+                         [Decimal('333.33'), Decimal('333.33'), Decimal('333.34')])
+        self.assertEqual((terms['total_payment'], terms['total_interest']), (Decimal('1000.00'), Decimal('0.00')))
+
+    def test_single_period(self):
+        terms = loan_terms(1000, 12, 1)
+        self.assertEqual(
+            (terms['monthly_payment'], terms['total_payment'], terms['total_interest']),
+            (Decimal('1010.00'), Decimal('1010.00'), Decimal('10.00')),
+        )
+        self.assertEqual(terms['schedule'][0]['balance'], Decimal('0.00'))
+
+
+class RecalculateLoansTests(TestCase):
+    def test_only_unscheduled_loans_are_recalculated(self):
+        company = make_company()
+        pending = make_loan(company, 1, status='pending')
+        approved = make_loan(company, 2)
+        completed = make_loan(company, 3, status='completed')
+        LoanApplication.objects.update(total_payment=Decimal('1.00'))
+
+        call_command('recalculate_loans', stdout=io.StringIO())
+
+        totals = dict(LoanApplication.objects.values_list('id', 'total_payment'))
+        self.assertEqual(totals[pending.id], Decimal('12794.23'))
+        self.assertEqual(totals[approved.id], Decimal('1.00'))
+        self.assertEqual(totals[completed.id], Decimal('1.00'))
+
+
+class GeneratePaymentSchedulesTests(TestCase):
+    def test_open_loans_without_schedule_are_backfilled_once(self):
+        company = make_company()
+        for number, status in enumerate(LoanApplication.OPEN_STATUSES):
+            make_loan(company, number, status=status).payments.all().delete()
+        make_loan(company, 9, status='pending')
+
+        call_command('generate_payment_schedules', stdout=io.StringIO())
+        call_command('generate_payment_schedules', stdout=io.StringIO())
+
+        counts = dict(
+            LoanApplication.objects.annotate(installments=Count('payments')).values_list('status', 'installments')
+        )
+        self.assertEqual(counts, {'approved': 12, 'delinquent': 12, 'defaulted': 12, 'pending': 0})
+
+
+class LoanApplicationSaveTests(TestCase):
+    def setUp(self):
+        self.company = make_company()
+        self.loan = make_loan(self.company, 1)
+
+    def test_new_loan_balance_is_total_payment(self):
+        self.assertEqual(self.loan.balance, self.loan.total_payment)
+        self.assertEqual(self.loan.amount_paid, Decimal('0'))
+
+    def test_stale_instance_keeps_posted_totals(self):
+        stale = LoanApplication.objects.get(pk=self.loan.pk)
+        installment = self.loan.payments.order_by('due_date').first()
+        post_payment(self.loan, installment, installment.amount, date.today(), 'cash')
+
+        stale.rating = Decimal('4.5')
+        stale.save()
+
+        stale.refresh_from_db()
+        self.assertEqual(stale.amount_paid, installment.amount)
+        self.assertEqual(stale.balance, stale.total_payment - installment.amount)
+
+    def test_new_total_moves_balance_against_stored_amount_paid(self):
+        installment = self.loan.payments.order_by('due_date').first()
+        post_payment(self.loan, installment, installment.amount, date.today(), 'cash')
+
+        stale = LoanApplication.objects.get(pk=self.loan.pk)
+        LoanApplication.objects.filter(pk=self.loan.pk).update(amount_paid=installment.amount * 2)
+        stale.total_payment += Decimal('100.00')
+        stale.save()
+
+        stale.refresh_from_db()
+        self.assertEqual(stale.amount_paid, installment.amount * 2)
+        self.assertEqual(stale.balance, stale.total_payment - installment.amount * 2)
+
+
+    def loan_writes(self, instance):
+        with CaptureQueriesContext(connection) as queries:
+            instance.save()
+        return [query['sql'] for query in queries if query['sql'].startswith('UPDATE "CompanyApp_loanapplication"')]
+
+    def test_deferred_instance_writes_only_loaded_fields(self):
+        loan = LoanApplication.objects.only('id', 'status').get(pk=self.loan.pk)
+        loan.status = 'delinquent'
+
+        writes = self.loan_writes(loan)
+
+        self.assertEqual(len(writes), 1)
+        self.assertIn('"status"', writes[0])
+        self.assertNotIn('"term"', writes[0])
+        self.assertNotIn('"amount_paid"', writes[0])
+        # Nothing was loaded lazily on the way
+        self.assertTrue({'amount', 'approved_date', 'term', 'balance'} <= loan.get_deferred_fields())
+        self.assertEqual(BorrowerExposure.objects.get(application=self.loan).status, 'delinquent')
+
+    def test_unchanged_total_costs_no_balance_update(self):
+        loan = LoanApplication.objects.get(pk=self.loan.pk)
+        loan.rating = Decimal('4.0')
+
+        writes = self.loan_writes(loan)
+
+        self.assertEqual(len(writes), 1)
+        self.assertNotIn('"balance"', writes[0])
+
+class DashboardCacheStatsTests(TestCase):
+    def test_flushes_add_up_and_survive_cache_eviction(self):
+        dashboard_cache.flush_cache_stats({'hits': 3, 'misses': 1})
+        cache.clear()
+        dashboard_cache.flush_cache_stats({'hits': 2})
+
+        self.assertEqual(dashboard_cache.cache_stats(), {'hits': 5, 'misses': 1, 'hit_rate': 83.33})
+
+        dashboard_cache.reset_cache_stats()
+        self.assertEqual(dashboard_cache.cache_stats()['hits'], 0)
+
+
+class DailyStatsRollupTests(TestCase):
+    def rollup_rows(self):
+        return sorted(
+            CompanyDailyStats.objects.filter(application_count__gt=0)
+            .values_list('company_id', 'business_date', 'product_type', 'status', 'application_count',
+                         'amount_total', 'processed_count', 'processing_time_total', 'rated_count', 'rating_total')
+        )
+
+    def test_signal_maintained_rows_match_rebuild(self):
+        company = make_company()
+        other = make_company('other')
+
+        loan = make_loan(company, 1, status='pending')
+        for status in ('review', 'approved', 'delinquent', 'approved', 'completed'):
+            loan.status = status
+            loan.approved_date = loan.approved_date or (timezone.now() if status == 'approved' else None)
+            loan.save()
+
+        rated = make_loan(company, 2, status='pending', amount=Decimal('5000'))
+        rated.product_type = None
+        rated.rating = Decimal('4.5')
+        rated.save()
+        rated.status = 'rejected'
+        rated.save()
+
+        make_loan(company, 3).delete()
+        make_loan(other, 4)
+        make_loan(other, 5, status='approved')
+
+        maintained = self.rollup_rows()
+        self.assertEqual(
+            sorted((row[3], row[4]) for row in maintained if row[0] == company.id),
+            [('completed', 1), ('rejected', 1)],
+        )
+
+        call_command('rebuild_daily_stats', stdout=io.StringIO())
+        self.assertEqual(self.rollup_rows(), maintained)
+
+    def test_rebuild_of_one_company_leaves_the_others(self):
+        company = make_company()
+        other = make_company('other')
+        make_loan(company, 1)
+        make_loan(other, 2)
+        CompanyDailyStats.objects.update(application_count=7)
+
+        call_command('rebuild_daily_stats', company=company.id, stdout=io.StringIO())
+
+        self.assertEqual(CompanyDailyStats.objects.get(company=company).application_count, 1)
+        self.assertEqual(CompanyDailyStats.objects.get(company=other).application_count, 7)
+
+
+class PortfolioStatsTests(TestCase):
+    def setUp(self):
+        self.company = make_company()
+        loans = [
+            ('approved', '12000'), ('approved', '8000'), ('approved', '5000'), ('delinquent', '3000'),
+            ('defaulted', '2000'), ('rejected', '1000'), ('pending', '500'),
+        ]
+        for number, (status, amount) in enumerate(loans):
+            make_loan(self.company, number, status=status, amount=Decimal(amount))
+        make_loan(make_company('other'), 99, amount=Decimal('70000'))
+
+    def test_counts_amounts_and_rates_per_status(self):
+        stats = PortfolioStats.for_company(self.company)
+
+        self.assertEqual((stats.total_count, stats.total_amount), (7, Decimal('31500')))
+        self.assertEqual(stats.counts['approved'], 3)
+        self.assertEqual(stats.amounts['approved'], Decimal('25000'))
+        self.assertEqual((stats.counts['review'], stats.amounts['review']), (0, Decimal('0')))
+        self.assertEqual(stats.count(*LoanApplication.OPEN_STATUSES), 5)
+        self.assertEqual(stats.amount('rejected', 'pending'), Decimal('1500'))
+
+        self.assertEqual((stats.approval_rate, stats.rejection_rate), (42.86, 14.29))
+        self.assertEqual((stats.delinquency_rate, stats.default_rate), (20.0, 20.0))
+        self.assertEqual(stats.performance_split(), (60.0, 20.0, 20.0))
+
+    def test_every_source_gives_the_same_stats(self):
+        applications = LoanApplication.objects.filter(company=self.company)
+        expected = vars(PortfolioStats.for_queryset(applications))
+
+        self.assertEqual(vars(PortfolioStats.from_groups(product_status_groups(applications))), expected)
+        self.assertEqual(vars(PortfolioStats.from_daily_stats(self.company)), expected)
+
+    def test_predicates_narrow_the_applications(self):
+        stats = PortfolioStats.for_company(self.company, amount__gte=Decimal('5000'))
+
+        self.assertEqual((stats.total_count, stats.count('approved')), (3, 3))
+        self.assertEqual(stats.rejection_rate, 0.0)
+
+    def test_company_without_applications_has_zero_rates(self):
+        stats = PortfolioStats.for_company(make_company('empty'))
+
+        self.assertEqual((stats.total_count, stats.total_amount), (0, Decimal('0')))
+        self.assertEqual((stats.approval_rate, stats.delinquency_rate), (0, 0))
+        self.assertEqual(stats.performance_split(), (0, 0, 0))
+
+    def test_product_distribution_lists_every_offered_product(self):
+        groups = product_status_groups(LoanApplication.objects.filter(company=self.company))
+
+        distribution = product_distribution(groups, ['business_loans', 'personal_loans'], {'personal_loans': 'Personal'})
+
+        self.assertEqual(
+            [(row['key'], row['label'], row['count'], row['percent']) for row in distribution],
+            [('business_loans', 'business_loans', 0, 0.0), ('personal_loans', 'Personal', 7, 100.0)],
+        )
+        self.assertEqual(distribution[1]['amount'], Decimal('31500'))
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        self.company = make_company()
+        # Created oldest first, so newest-first order would list Mariano first
+        self.maria = self.loan(1, 'Maria', 'Cruz', 'maria@example.com')
+        self.mariano = self.loan(2, 'Mariano', 'Reyes', 'mreyes@example.com', amount=Decimal('25000'))
+        self.jose = self.loan(3, 'Jose', 'Santos', 'jsantos@mail.ph')
+        self.loan(4, 'Maria', 'Lopez', 'mlopez@example.com', company=make_company('other'))
+
+    def loan(self, number, first_name, last_name, email, amount=Decimal('12000'), company=None):
+        loan = make_loan(company or self.company, number, amount=amount)
+        borrower = loan.borrower
+        borrower.first_name, borrower.last_name, borrower.email = first_name, last_name, email
+        borrower.save()
+        return loan
+
+    def search(self, term, ordered=False):
+        applications = LoanApplication.objects.filter(company=self.company).filter(
+            search_q(term, borrower_path='borrower__', id_field='id', amount_field='amount')
+        )
+        if ordered:
+            applications = order_by_relevance(applications, term, '-created_at', '-id', borrower_path='borrower__')
+        else:
+            applications = applications.order_by('id')
+        return list(applications)
+
+    def test_names_and_emails_match(self):
+        self.assertEqual(self.search('mari'), [self.maria, self.mariano])
+        self.assertEqual(self.search('SANTOS'), [self.jose])
+        self.assertEqual(self.search('@mail.ph'), [self.jose])
+        self.assertEqual(self.search('nobody'), [])
+
+    def test_numbers_match_loan_id_or_exact_amount(self):
+        self.assertEqual(self.search(str(self.jose.id)), [self.jose])
+        self.assertEqual(self.search('25,000'), [self.mariano])
+        self.assertEqual(self.search('25000.50'), [])
+
+    @skipUnless(connection.vendor == 'postgresql', 'Word matching and ranking are PostgreSQL-only')
+    def test_every_word_must_match(self):
+        self.assertEqual(self.search('maria cruz'), [self.maria])
+        self.assertEqual(self.search('mari reyes'), [self.mariano])
+
+    @skipUnless(connection.vendor == 'postgresql', 'Word matching and ranking are PostgreSQL-only')
+    def test_better_matches_rank_first(self):
+        self.assertEqual(self.search('maria', ordered=True), [self.maria, self.mariano])
+
+    def test_numeric_and_blank_terms_keep_the_given_order(self):
+        self.assertEqual(self.search('12000', ordered=True), [self.jose, self.maria])
+        self.assertEqual(
+            list(order_by_relevance(LoanApplication.objects.filter(company=self.company), ' ', '-created_at', '-id')),
+            [self.jose, self.mariano, self.maria],
+        )
+
+    def test_borrower_list_search(self):
+        self.client.force_login(self.company.user)
+
+        response = self.client.get('/Company/Borrower-Lists/', {'search': 'maria'})
+
+        names = [borrower.first_name for borrower in response.context['borrowers']]
+        self.assertEqual(sorted(names), ['Maria', 'Mariano'])
+
+    def test_name_substrings_match(self):
+        self.assertEqual(self.search('rian'), [self.mariano])
+        self.assertEqual(self.search('RUZ'), [self.maria])
+        self.assertEqual(self.search('anto'), [self.jose])
+
+    def test_ranked_results_page_by_cursor(self):
+        ranked = order_by_relevance(
+            LoanApplication.objects.filter(company=self.company).filter(search_q('mari', borrower_path='borrower__')),
+            'mari', '-created_at', '-id', borrower_path='borrower__',
+        )
+        paginator = KeysetPaginator(ranked, 1)
+
+        first = paginator.page()
+        second = paginator.page(first.next_cursor)
+        self.assertEqual(list(first) + list(second), list(ranked))
+        self.assertFalse(second.has_next())
+        self.assertEqual(list(paginator.page(second.previous_cursor)), list(first))
+
+    @skipUnless(connection.vendor == 'postgresql', 'Word matching and ranking are PostgreSQL-only')
+    def test_keyset_lists_rank_searches(self):
+        self.client.force_login(self.company.user)
+
+        for url, key in (('/Company/Application-History/', 'applications'), ('/Company/Active-Loans/', 'loans')):
+            with self.subTest(url=url):
+                response = self.client.get(url, {'search': 'maria', 'format': 'json'}).json()
+                self.assertEqual([row['id'] for row in response[key]], [self.maria.id, self.mariano.id])
+
+
+class CompanySaveTests(TestCase):
+    def setUp(self):
+        self.company = make_company()
+        make_loan(self.company, 1)
+
+    def test_save_keeps_borrower_count(self):
+        stale = Company.objects.get(pk=self.company.pk)
+        make_loan(self.company, 2)
+
+        stale.company_name = 'Renamed Lending'
+        stale.save()
+
+        stale.refresh_from_db()
+        self.assertEqual((stale.company_name, stale.borrower_count), ('Renamed Lending', 2))
+
+    def test_deferred_instance_writes_only_loaded_fields(self):
+        company = Company.objects.only('id', 'is_approved').get(pk=self.company.pk)
+        company.is_approved = False
+
+        with CaptureQueriesContext(connection) as queries:
+            company.save()
+
+        self.assertEqual(len(queries), 1)
+        self.assertRegex(queries[0]['sql'], r'^UPDATE "CompanyApp_company" SET "is_approved" = \w+ WHERE')
+        self.assertTrue({'company_name', 'min_loan_amount', 'borrower_count'} <= company.get_deferred_fields())
+
+
+class ProjectedListQueryTests(TestCase):
+    """
+    List pages load only their projected columns; a template reading a
+    deferred field costs a query per row, so doubling the rows must not
+    change the query count.
+    """
+    PAGES = [
+        '/Company/Dashboard/',
+        '/Company/Loan-Applications/',
+        '/Company/Borrower-Lists/',
+        '/Company/Active-Loans/',
+        '/Company/Active-Loans/?format=json',
+        '/Company/Active-Loans/?search=juan&format=json',
+        '/Company/Application-History/',
+        '/Company/Application-History/?format=json',
+        '/Company/company-active-borrowers/',
+    ]
+
+    def setUp(self):
+        self.company = make_company()
+        self.client.force_login(self.company.user)
+        self.loans = 0
+
+    def add_rows(self, count):
+        for status in ('pending', 'approved', 'delinquent', 'rejected'):
+            for _ in range(count):
+                self.loans += 1
+                make_loan(self.company, self.loans, status=status)
+
+    def get(self, url):
+        # Version bumps run on commit, which never comes inside a TestCase
+        cache.clear()
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, url)
+        return response
+
+    def test_query_count_does_not_grow_with_rows(self):
+        self.add_rows(2)
+        expected = {}
+        for url in self.PAGES:
+            with CaptureQueriesContext(connection) as queries:
+                self.get(url)
+            expected[url] = len(queries)
+
+        self.add_rows(2)
+        for url in self.PAGES:
+            with self.subTest(url=url), self.assertNumQueries(expected[url]):
+                self.get(url)
+
+
+class ReportJobTests(TestCase):
+    def setUp(self):
+        self.company = make_company()
+        self.client.force_login(self.company.user)
+        make_loan(self.company, 1)
+
+    def test_xlsx_export_is_queued_for_the_worker(self):
+        response = self.client.get('/Company/Active-Loans/?export=xlsx&loanType=personal_loans')
+
+        job = ReportJob.objects.get(company=self.company)
+        self.assertEqual((job.kind, job.status, job.params), ('loan_book', 'queued', {'loanType': 'personal_loans'}))
+        self.assertRedirects(response, f'/Company/Reports/{job.id}/')
+
+    def test_abandoned_running_job_is_failed_and_not_reused(self):
+        job, _ = reports.enqueue(self.company, 'active_loans', {})
+        self.assertEqual(reports.claim_next(), job)
+        ReportJob.objects.filter(pk=job.pk).update(started_at=timezone.now() - reports.REPORT_TIMEOUT - timedelta(minutes=1))
+
+        again, created = reports.enqueue(self.company, 'active_loans', {})
+        self.assertTrue(created)
+        self.assertEqual(reports.claim_next(), again)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'failed')
+        self.assertIsNotNone(job.finished_at)
+
+    def stored_files(self):
+        root = ReportJob._meta.get_field('file').storage.location
+        return {os.path.join(path, name) for path, _, names in os.walk(root) for name in names}
+
+    def test_reaped_job_stays_failed(self):
+        reports.enqueue(self.company, 'active_loans', {})
+        job = reports.claim_next()
+        ReportJob.objects.filter(pk=job.pk).update(started_at=timezone.now() - reports.REPORT_TIMEOUT - timedelta(minutes=1))
+        reports.fail_abandoned()
+        files = self.stored_files()
+
+        job = reports.run(job)
+
+        self.assertEqual((job.status, job.file.name), ('failed', ''))
+        self.assertEqual(self.stored_files(), files)
+
+    def test_finished_job_is_done(self):
+        reports.enqueue(self.company, 'active_loans', {})
+        job = reports.run(reports.claim_next())
+        self.addCleanup(job.file.delete, save=False)
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.row_count), ('done', 1))
+        self.assertTrue(job.file.name.endswith('.csv'))
+
+    def test_recent_running_job_is_reused(self):
+        job, _ = reports.enqueue(self.company, 'active_loans', {})
+        reports.claim_next()
+
+        self.assertEqual(reports.enqueue(self.company, 'active_loans', {}), (job, False))
+        self.assertIsNone(reports.claim_next())
+
+
+class ApproveLoanApplicationTests(TestCase):
+    def setUp(self):
+        self.company = make_company()
+        self.client.force_login(self.company.user)
+
+    def test_open_loans_are_not_approved_again(self):
+        for number, status in enumerate(LoanApplication.OPEN_STATUSES):
+            loan = make_loan(self.company, number, status=status)
+            approved_date = loan.approved_date
+
+            self.client.post(f'/Company/Loan-Applications/{loan.id}/approve/')
+
+            loan.refresh_from_db()
+            self.assertEqual((loan.status, loan.approved_date), (status, approved_date))
+
+    def test_pending_application_is_approved(self):
+        loan = make_loan(self.company, 1, status='pending')
+
+        self.client.post(f'/Company/Loan-Applications/{loan.id}/approve/')
+
+        loan.refresh_from_db()
+        self.assertEqual(loan.status, 'approved')
+        self.assertEqual(loan.payments.count(), loan.term)
+
+
+class BorrowerExposureTests(TestCase):
+    def setUp(self):
+        self.company = make_company()
+        self.client.force_login(self.company.user)
+        self.loan = make_loan(self.company, 1, status='pending')
+
+    def exposure(self):
+        row = BorrowerExposure.objects.get(application=self.loan)
+        return row.status, row.amount_paid, row.balance
+
+    def test_status_and_balance_follow_the_loan(self):
+        total = self.loan.total_payment
+        self.assertEqual(self.exposure(), ('pending', Decimal('0.00'), total))
+
+        self.client.post(f'/Company/Loan-Applications/{self.loan.id}/approve/')
+        self.assertEqual(self.exposure(), ('approved', Decimal('0.00'), total))
+
+        installments = list(self.loan.payments.order_by('due_date'))
+        post_payment(self.loan, installments[0], installments[0].amount, date.today(), 'cash')
+        paid = installments[0].amount
+        self.assertEqual(self.exposure(), ('approved', paid, total - paid))
+
+        post_payments([
+            {'payment_id': payment.id, 'amount': payment.amount, 'paid_date': date.today(), 'method': 'cash'}
+            for payment in installments[1:]
+        ])
+        self.assertEqual(self.exposure(), ('completed', total, Decimal('0.00')))
+
+    def test_lookup_shows_open_loans_everywhere_and_applications_to_their_lender(self):
+        lender, declined_by = make_company('other'), make_company('third')
+        make_loan(lender, 2, email='JUAN1@example.com')
+        rejected = make_loan(declined_by, 3, status='rejected', email='juan1@example.com')
+
+        self.assertEqual(BorrowerExposure.objects.get(application=rejected).status, 'rejected')
+        self.assertEqual(
+            {(row['company_id'], row['status']) for row in exposure.lookup('Juan1@Example.com', self.company.id)},
+            {(lender.id, 'approved'), (self.company.id, 'pending')},
+        )
+        self.assertEqual(
+            {(row['company_id'], row['status']) for row in exposure.lookup('juan1@example.com', declined_by.id)},
+            {(lender.id, 'approved'), (declined_by.id, 'rejected')},
+        )
+
+    def test_rows_follow_email_changes_and_deletes(self):
+        borrower = self.loan.borrower
+        borrower.email = 'New.Address@Example.com'
+        borrower.save()
+        self.assertEqual(BorrowerExposure.objects.get(application=self.loan).email, 'new.address@example.com')
+
+        self.loan.delete()
+        self.assertFalse(BorrowerExposure.objects.exists())
+
+
+class NotificationTests(TestCase):
+    def setUp(self):
+        self.company = make_company()
+        self.client.force_login(self.company.user)
+
+    def types(self, company=None):
+        return list(
+            Notification.objects.filter(company=company or self.company)
+            .order_by('id').values_list('type', flat=True)
+        )
+
+    def test_application_events_are_stored(self):
+        loan = make_loan(self.company, 1, status='pending')
+        make_loan(self.company, 2, status='pending', amount=Decimal('600000'))
+        self.assertEqual(self.types(), ['new_application', 'new_application', 'high_value'])
+
+        for status in ('review', 'review', 'approved', 'rejected'):
+            loan.status = status
+            loan.save()
+
+        self.assertEqual(self.types()[3:], ['review', 'approved'])
+        self.assertEqual(
+            Notification.objects.filter(related_application=loan).order_by('id').values_list('message', flat=True).last(),
+            'Loan approved for Juan1 Dela Cruz',
+        )
+
+    def test_mark_read_marks_the_posted_ids(self):
+        for number in range(3):
+            make_loan(self.company, number, status='pending')
+        make_loan(make_company('other'), 9, status='pending')
+        first, second, third = Notification.objects.filter(company=self.company).order_by('id')
+        foreign = Notification.objects.exclude(company=self.company).get()
+
+        response = self.client.post('/Company/Notifications/mark-read/', {'ids': [first.id, second.id, foreign.id]})
+        self.assertEqual(response.json(), {'success': True, 'updated': 2})
+
+        unread = self.client.get('/Company/Notifications/', {'unread': '1'}).json()
+        self.assertEqual([row['id'] for row in unread['notifications']], [third.id])
+        self.assertEqual(unread['unread_count'], 1)
+        self.assertFalse(Notification.objects.get(pk=foreign.pk).is_read)
+
+    def test_mark_read_without_ids_marks_everything(self):
+        make_loan(self.company, 1, status='pending')
+        make_loan(self.company, 2, status='pending')
+
+        self.assertEqual(self.client.post('/Company/Notifications/mark-read/').json()['updated'], 2)
+        self.assertEqual(self.client.post('/Company/Notifications/mark-read/').json()['updated'], 0)
+        self.assertFalse(Notification.objects.filter(is_read=False).exists())
+
+    def test_mark_read_rejects_bad_ids(self):
+        response = self.client.post('/Company/Notifications/mark-read/', {'ids': ['x']})
+        self.assertEqual(response.status_code, 400)
+
+
+class MarkOverduePaymentsTests(TestCase):
+    def setUp(self):
+        self.company = make_company()
+        self.loan = make_loan(self.company, 1)
+        self.installments = list(self.loan.payments.order_by('due_date'))
+        # Paid before it fell due; the due date has passed but nothing is owed
+        Payment.objects.filter(pk=self.installments[0].pk).update(status='paid')
+        self.today = self.installments[2].due_date
+
+    def statuses(self):
+        return list(self.loan.payments.order_by('due_date').values_list('status', flat=True))
+
+    def test_only_past_due_pending_installments_are_flagged(self):
+        self.assertEqual(mark_overdue_payments(self.today, chunk_size=1), 1)
+
+        self.assertEqual(self.statuses()[:4], ['paid', 'overdue', 'pending', 'pending'])
+        self.assertEqual(self.statuses().count('overdue'), 1)
+        self.assertEqual(Notification.objects.filter(company=self.company, type='overdue').count(), 1)
+
+    def test_second_run_changes_nothing(self):
+        mark_overdue_payments(self.today)
+        statuses = self.statuses()
+        notifications = Notification.objects.count()
+
+        self.assertEqual(mark_overdue_payments(self.today), 0)
+        self.assertEqual(mark_overdue_payments(self.today, full=True), 0)
+
+        self.assertEqual(self.statuses(), statuses)
+        self.assertEqual(Notification.objects.count(), notifications)
+
+    def test_later_run_flags_installments_that_fell_due_since(self):
+        mark_overdue_payments(self.today)
+
+        self.assertEqual(mark_overdue_payments(self.installments[4].due_date), 2)
+        self.assertEqual(self.statuses()[:6], ['paid', 'overdue', 'overdue', 'overdue', 'pending', 'pending'])
+
+
+class PortfolioAgingTests(TestCase):
+    def setUp(self):
+        self.company = make_company()
+        self.today = timezone.localdate()
+
+    def loan_past_due(self, number, *days_past_due, balance=Decimal('1000.00'), status='overdue'):
+        """An open loan whose first installments fell due the given numbers of days ago"""
+        loan = make_loan(self.company, number)
+        for installment, days in zip(loan.payments.order_by('due_date'), days_past_due):
+            Payment.objects.filter(pk=installment.pk).update(
+                status=status, due_date=self.today - timedelta(days=days),
+            )
+        LoanApplication.objects.filter(pk=loan.pk).update(balance=balance)
+        return loan
+
+    def counts(self, aging):
+        return {bucket['key']: bucket['count'] for bucket in aging.buckets}
+
+    def test_days_past_due_fall_into_buckets_at_their_edges(self):
+        cases = {0: 'current', 1: '1-30', 30: '1-30', 31: '31-60', 60: '31-60', 61: '61-90', 90: '61-90', 91: '90+'}
+        for number, days in enumerate(cases):
+            self.loan_past_due(number, days)
+        make_loan(self.company, 99)
+
+        aging = PortfolioAging.for_company(self.company, self.today)
+
+        self.assertEqual(self.counts(aging), {'current': 2, '1-30': 2, '31-60': 2, '61-90': 2, '90+': 1})
+        self.assertEqual(aging.total_count, 9)
+
+    def test_oldest_unpaid_installment_decides_the_bucket(self):
+        loan = self.loan_past_due(1, 100, 45, 10)
+        loan.payments.filter(due_date=self.today - timedelta(days=100)).update(status='paid')
+
+        aging = PortfolioAging.for_company(self.company, self.today)
+
+        self.assertEqual(self.counts(aging)['31-60'], 1)
+        self.assertEqual(aging.total_count, 1)
+
+    def test_only_open_loans_are_aged(self):
+        self.loan_past_due(1, 10)
+        make_loan(self.company, 2, status='pending')
+        closed = self.loan_past_due(3, 10)
+        LoanApplication.objects.filter(pk=closed.pk).update(status='completed')
+        make_loan(make_company('other'), 4)
+
+        aging = PortfolioAging.for_company(self.company, self.today)
+
+        self.assertEqual((aging.total_count, self.counts(aging)['1-30']), (1, 1))
+
+    def test_par_ratios_weigh_outstanding_balances(self):
+        self.loan_past_due(1, 0, balance=Decimal('5000.00'))
+        self.loan_past_due(2, 20, balance=Decimal('2000.00'))
+        self.loan_past_due(3, 45, balance=Decimal('1500.00'))
+        self.loan_past_due(4, 120, balance=Decimal('1500.00'))
+
+        aging = PortfolioAging.for_company(self.company, self.today)
+
+        self.assertEqual(aging.total_outstanding, Decimal('10000.00'))
+        self.assertEqual((aging.par30, aging.par60, aging.par90), (30.0, 15.0, 15.0))
+        self.assertEqual(aging.buckets[0]['outstanding_percent'], 50.0)
+        self.assertEqual(aging.buckets[0]['count_percent'], 25.0)
+        self.assertEqual(Decimal(aging.payload()['total_outstanding']), Decimal('10000'))
+
+
+class LateFeeTests(TestCase):
+    def setUp(self):
+        self.company = make_company(late_payment_fee=Decimal('50.00'))
+        self.client.force_login(self.company.user)
+        self.loan = make_loan(self.company, 1)
+        self.first, self.second = self.loan.payments.order_by('due_date')[:2]
+        today = timezone.localdate()
+        Payment.objects.filter(pk=self.first.pk).update(status='overdue', due_date=today - timedelta(days=40))
+        Payment.objects.filter(pk=self.second.pk).update(status='overdue', due_date=today - timedelta(days=10))
+
+    def test_one_fee_per_installment_across_days(self):
+        today = timezone.localdate()
+        self.assertEqual(accrue_late_fees(today), 2)
+        self.assertEqual(accrue_late_fees(today + timedelta(days=1)), 0)
+
+        with self.assertRaises(IntegrityError):
+            LateFee.objects.create(
+                payment=self.first, loan_application=self.loan, company=self.company,
+                amount=Decimal('50.00'), assessed_on=today + timedelta(days=2),
+            )
+
+    def schedule(self):
+        return self.client.get(f'/Company/Borrower-Lists/loan/{self.loan.id}/payments/').json()
+
+    def test_fee_on_paid_installment_is_still_owed(self):
+        accrue_late_fees()
+        post_payment(self.loan, self.first, self.first.amount, date.today(), 'cash')
+
+        data = self.schedule()
+        self.loan.refresh_from_db()
+        self.assertFalse(LateFee.objects.filter(paid_date__isnull=False).exists())
+        self.assertEqual(data['late_fees'], 100.0)
+        self.assertEqual(Decimal(str(data['remaining_balance'])), self.loan.balance + Decimal('100.00'))
+        self.assertEqual(Decimal(data['payments'][1]['amount_due']), self.second.amount + Decimal('100.00'))
+
+    def test_amount_above_installment_collects_fee(self):
+        accrue_late_fees()
+        scheduled = self.first.amount
+        post_payment(self.loan, self.first, scheduled + Decimal('50.00'), date.today(), 'cash')
+
+        self.first.refresh_from_db()
+        self.loan.refresh_from_db()
+        self.assertEqual(self.first.amount, scheduled)
+        self.assertEqual(self.loan.amount_paid, scheduled)
+        self.assertEqual(LateFee.objects.get(payment=self.first).paid_date, date.today())
+        self.assertEqual(self.schedule()['late_fees'], 50.0)
+
+    def test_loan_owing_fees_is_not_completed(self):
+        accrue_late_fees()
+        installments = list(self.loan.payments.order_by('due_date'))
+        postings = [
+            {'payment_id': payment.id, 'amount': payment.amount, 'paid_date': date.today(), 'method': 'cash'}
+            for payment in installments
+        ]
+
+        posted = post_payments(postings[:-1])
+        self.loan.refresh_from_db()
+        self.assertEqual(self.loan.status, 'approved')
+        self.assertEqual(posted[installments[0].id], self.loan.balance + Decimal('100.00'))
+
+        postings[-1]['amount'] += Decimal('100.00')
+        posted = post_payments(postings[-1:])
+        self.loan.refresh_from_db()
+        self.assertEqual((self.loan.status, self.loan.balance), ('completed', Decimal('0.00')))
+        self.assertEqual(posted[installments[-1].id], Decimal('0.00'))
+        self.assertFalse(LateFee.objects.filter(paid_date__isnull=True).exists())
+
+
+class StatementImportTests(TestCase):
+    def setUp(self):
+        self.company = make_company()
+        self.loan = make_loan(self.company, 1)
+        self.installment = self.loan.payments.order_by('due_date').first()
+
+    def upload(self, reference, payer='Maria Santos'):
+        content = f'date,amount,reference,payer\n{date.today()},{self.installment.amount},{reference},{payer}\n'
+        return import_statement(self.company, SimpleUploadedFile('statement.csv', content.encode()))[0]
+
+    def test_bare_number_is_not_read_as_a_loan(self):
+        statement = self.upload(str(self.loan.id))
+
+        line = statement.lines.get()
+        self.assertEqual((line.status, line.reason), ('review', 'no_match'))
+
+    def test_prefixed_loan_number_is_posted(self):
+        statement = self.upload(f'LN-{self.loan.id:05d}')
+
+        self.assertEqual(statement.lines.get().payment_id, self.installment.id)
+
+    def test_reupload_does_not_queue_review_lines_again(self):
+        self.upload('BANK-REF-1')
+        self.upload('BANK-REF-1')
+
+        reasons = list(StatementLine.objects.order_by('id').values_list('reason', flat=True))
+        self.assertEqual(reasons, ['no_match', 'duplicate'])
+
+
+class RecordPaymentTests(TransactionTestCase):
+    """record_payment() commits its posts, so these run outside a test transaction"""
+
+    def setUp(self):
+        self.company = make_company()
+        self.loan = make_loan(self.company, 1)
+        installment = self.loan.payments.order_by('due_date').first()
+        self.posting = {
+            'loan_id': self.loan.id,
+            'payment_id': installment.id,
+            'amount': installment.amount,
+            'paid_date': timezone.localdate(),
+            'method': 'cash',
+            'reference_number': '',
+        }
+
+    def assertPostedOnce(self):
+        self.loan.refresh_from_db()
+        self.assertEqual(self.loan.amount_paid, self.posting['amount'])
+        self.assertEqual(self.loan.balance, self.loan.total_payment - self.posting['amount'])
+        self.assertEqual(Payment.objects.filter(loan_application=self.loan, status='paid').count(), 1)
+
+    def test_replayed_key_returns_stored_response(self):
+        first = record_payment(self.company, self.posting, 'key-1')
+        replay = record_payment(self.company, self.posting, 'key-1')
+
+        self.assertTrue(first[1]['success'])
+        self.assertEqual(replay, first)
+        self.assertPostedOnce()
+
+    def test_second_post_of_installment_is_rejected(self):
+        record_payment(self.company, self.posting, 'key-1')
+        status_code, response = record_payment(self.company, self.posting, 'key-2')
+
+        self.assertFalse(response['success'])
+        self.assertEqual(response['message'], 'This payment has already been recorded.')
+        self.assertPostedOnce()
+
+    @skipUnless(connection.vendor == 'postgresql', 'Row locks need PostgreSQL; SQLite serializes writers')
+    def test_concurrent_posts_of_installment_post_once(self):
+        # Eight cashiers with their own keys, each retried once with the same key
+        keys = [f'key-{number}' for number in range(8)] * 2
+        start = threading.Barrier(len(keys))
+        responses = [None] * len(keys)
+
+        def post(index):
+            try:
+                start.wait()
+                responses[index] = record_payment(self.company, self.posting, keys[index])
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=post, args=(index,)) for index in range(len(keys))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertNotIn(None, responses)
+        posted = {key for key, (_, response) in zip(keys, responses) if response['success']}
+        self.assertEqual(len(posted), 1)
+        by_key = {}
+        for key, answer in zip(keys, responses):
+            by_key.setdefault(key, []).append(answer)
+        for key, answers in by_key.items():
+            self.assertEqual(answers[0], answers[1], key)
+        self.assertPostedOnce()
+
+
+class PaymentBatchTests(TestCase):
+    def setUp(self):
+        self.company = make_company()
+        self.client.force_login(self.company.user)
+        self.loan = make_loan(self.company, 1)
+        self.installments = list(self.loan.payments.order_by('due_date'))
+
+    def entry(self, installment, **fields):
+        return {
+            'loan_id': installment.loan_application_id, 'payment_id': installment.id,
+            'amount': str(installment.amount), 'paid_date': str(date.today()), 'method': 'cash',
+            'reference': f'OR-{installment.id}', **fields,
+        }
+
+    def post(self, entries):
+        response = self.client.post('/Company/Payments/batch/', {'payments': entries}, content_type='application/json')
+        return response.status_code, response.json()
+
+    def test_results_follow_entries(self):
+        other = make_loan(make_company('other'), 2).payments.first()
+        first, second = self.installments[:2]
+
+        status_code, data = self.post([
+            self.entry(first),
+            self.entry(second, amount='-5'),
+            self.entry(second, method='barter'),
+            self.entry(other),
+            {'payment_id': 'x'},
+            self.entry(second),
+        ])
+
+        self.assertEqual(status_code, 200)
+        self.assertEqual((data['posted'], data['failed']), (2, 4))
+        self.assertEqual([result['index'] for result in data['results']], list(range(6)))
+        self.assertEqual([result['success'] for result in data['results']], [True, False, False, False, False, True])
+        self.assertEqual(data['results'][1]['message'], 'Amount must be a positive number with at most two decimals')
+        self.assertEqual(data['results'][2]['message'], 'Unknown payment method')
+        self.assertEqual(data['results'][3]['message'], 'Installment not found on this loan')
+        self.assertEqual(data['results'][4]['payment_id'], 'x')
+
+        self.loan.refresh_from_db()
+        self.assertEqual(self.loan.amount_paid, first.amount + second.amount)
+        self.assertEqual(Decimal(data['results'][5]['remaining_balance']), self.loan.balance)
+        self.assertEqual(Payment.objects.get(pk=first.pk).reference_number, f'OR-{first.id}')
+
+    def test_installment_twice_in_batch_posts_once(self):
+        first = self.installments[0]
+
+        _, data = self.post([self.entry(first), self.entry(first)])
+
+        self.assertEqual([result['success'] for result in data['results']], [True, False])
+        self.assertEqual(data['results'][1]['message'], 'Installment appears more than once in the batch')
+        self.loan.refresh_from_db()
+        self.assertEqual(self.loan.amount_paid, first.amount)
+
+    def test_paid_installment_is_rejected(self):
+        first = self.installments[0]
+        self.post([self.entry(first)])
+
+        _, data = self.post([self.entry(first)])
+
+        self.assertEqual(data['results'][0]['message'], 'This payment has already been recorded')
+        self.loan.refresh_from_db()
+        self.assertEqual(self.loan.amount_paid, first.amount)
+
+    def test_loans_paid_off_are_completed_together(self):
+        other = make_loan(self.company, 2, term=3)
+        entries = [self.entry(installment) for installment in self.installments + list(other.payments.all())]
+
+        _, data = self.post(entries)
+
+        self.assertEqual(data['posted'], len(entries))
+        self.assertTrue(all(result['is_fully_paid'] for result in data['results'][-3:]))
+        self.assertEqual(
+            set(LoanApplication.objects.filter(pk__in=[self.loan.pk, other.pk]).values_list('status', 'balance')),
+            {('completed', Decimal('0.00'))},
+        )
+        self.assertEqual(
+            LoanStatusHistory.objects.filter(to_status='completed', source='payment_batch').count(), 2
+        )
+
+    def test_malformed_or_oversized_batch_is_refused(self):
+        for body in ['not json', {'payments': []}, {'payments': [{}] * (MAX_BATCH_SIZE + 1)}]:
+            with self.subTest(body=str(body)[:20]):
+                response = self.client.post('/Company/Payments/batch/', body, content_type='application/json')
+                self.assertEqual(response.status_code, 400)
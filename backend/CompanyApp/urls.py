@@ -7,6 +7,10 @@ urlpatterns = [
     #Url of Company Dashboard
     path('Dashboard/', views.companyDashboard, name='company-dashboard'),
 
+    # Notifications
+    path('Notifications/', views.notificationList, name='company-notifications'),
+    path('Notifications/mark-read/', views.markNotificationsRead, name='mark-notifications-read'),
+
     #Url of Company Loan Application
     path('Loan-Applications/', views.loanApplication, name='company-loan-applications'),
     # Loan Application URLs
@@ -18,6 +22,17 @@ urlpatterns = [
     # Payment management
     path('Borrower-Lists/loan/<int:loan_id>/payments/', views.viewLoanPayments, name='view-loan-payments'),
     path('Borrower-Lists/loan/<int:loan_id>/record-payment/', views.recordPayment, name='record-payment'),
+    path('Payments/batch/', views.recordPaymentBatch, name='record-payment-batch'),
+    path('Payments/export/', views.exportPayments, name='export-payments'),
+
+    # Statement import and reconciliation review
+    path('Reconciliation/', views.statementReconciliation, name='company-reconciliation'),
+    path('Reconciliation/lines/<int:line_id>/resolve/', views.resolveStatementLine, name='resolve-statement-line'),
+
+    # Background reports
+    path('Reports/enqueue/', views.enqueueReport, name='enqueue-report'),
+    path('Reports/<int:job_id>/', views.reportStatus, name='report-status'),
+    path('Reports/<int:job_id>/download/', views.downloadReport, name='download-report'),
 
     # Replace the archived borrowers URLs with:
     path('Application-History/', views.applicationHistory, name='company-application-history'),
@@ -29,6 +44,9 @@ urlpatterns = [
     path('Active-Loans/', views.activeLoans, name='company-active-loans'),
     path('Active-Loans/<int:loan_id>/view-borrower/', views.viewBorrowerDetailsFromLoan, name='view-borrower-from-loan'),
 
+    #Url of Company Portfolio Aging
+    path('Portfolio-Aging/', views.portfolioAging, name='company-portfolio-aging'),
+
     #Url of Company Settings
     path('Settings/', views.settings, name='company-settings'),
 
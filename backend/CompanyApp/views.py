@@ -5,13 +5,13 @@ from django.contrib.auth import login, logout
 from django.contrib import messages
 from django.db import transaction, IntegrityError
 from django.core.exceptions import ValidationError
-from django.http import JsonResponse
+from django.http import FileResponse, Http404, JsonResponse
 import json
 from BorrowerApp.models import Borrower
-from CompanyApp.models import Company, LoanApplication, Notification
+from CompanyApp.models import Company, CompanyDailyStats, LoanApplication, Notification, ReportJob, StatementLine
 from django.utils import timezone
-from django.db.models import Count, Avg, Q, Sum
-from datetime import datetime, timedelta, date
+from django.db.models import Q, Sum
+from datetime import datetime, date
 from django.db import models
 from django.core.paginator import Paginator, PageNotAnInteger, EmptyPage
 from django.shortcuts import get_object_or_404
@@ -23,7 +23,18 @@ from django.views.decorators.http import require_http_methods
 from django.contrib.humanize.templatetags.humanize import intcomma, naturaltime
 from collections import defaultdict
 from CompanyApp.models import Payment
-from dateutil.relativedelta import relativedelta
+from CompanyApp.charts import chart_series
+from CompanyApp.aging import PortfolioAging
+from CompanyApp.stats import PortfolioStats, product_distribution, product_status_groups
+from CompanyApp import cache as dashboard_cache
+from CompanyApp.notifications import mark_read
+from CompanyApp.schedules import generate_payment_schedule
+from CompanyApp.payments import MAX_BATCH_SIZE, MAX_IDEMPOTENCY_KEY_LENGTH, clean_entry, post_payment_batch, record_payment
+from CompanyApp.search import order_by_relevance, search_q
+from CompanyApp.pagination import KeysetPaginator, page_payload
+from CompanyApp import filters, late_fees, reconciliation, reports
+from CompanyApp.projections import ACTIVE_LOAN_ROW, APPLICATION_ROW, BORROWER_ROW, project
+from CompanyApp.exports import APPLICATION_COLUMNS, BORROWER_COLUMNS, PAYMENT_COLUMNS, export_csv
 
 
 
@@ -31,196 +42,65 @@ from dateutil.relativedelta import relativedelta
 @company_required
 def companyDashboard(request):
     company = request.user.company_profile
-    
-    # Basic Statistics - Remove is_active filters
-    total_applications = LoanApplication.objects.filter(
-        company=company
-    ).count()
-    
-    active_loans = LoanApplication.objects.filter(
-        company=company,
-        status='approved'
-    ).count()
-    
-    total_disbursed = LoanApplication.objects.filter(
-        company=company,
-        status='approved'
-    ).aggregate(total=Sum('amount'))['total'] or 0
-    
-    # Calculate default rate
-    total_loans_count = LoanApplication.objects.filter(
-        company=company,
-        status__in=['approved', 'defaulted']
-    ).count()
-    
-    defaulted_count = LoanApplication.objects.filter(
-        company=company,
-        status='defaulted'
-    ).count()
-    
-    default_rate = round((defaulted_count / total_loans_count * 100), 2) if total_loans_count else 0
+    context = dashboard_cache.get_dashboard_context(company, build_dashboard_context)
+    return render(request, 'CompanyPages/companyDashboard.html', context)
+
+
+def build_dashboard_context(company):
+    """Compute the dashboard KPIs, charts, notifications and monthly summary"""
+    today = timezone.localdate()
+    month_start = today.replace(day=1)
+
+    # Basic Statistics - read from the daily rollup
+    stats = PortfolioStats.from_daily_stats(company)
+
+    total_applications = stats.total_count
+    active_loans = stats.count(*LoanApplication.OPEN_STATUSES)
+    total_disbursed = stats.amount(*LoanApplication.OPEN_STATUSES)
+    default_rate = stats.default_rate
 
     # Fetch recent applications for this company (last 5)
-    recent_applications = LoanApplication.objects.filter(
-        company=company
-    ).select_related('borrower').order_by('-created_at')[:5]
+    recent_applications = list(project(
+        LoanApplication.objects.filter(company=company), APPLICATION_ROW
+    ).order_by('-created_at')[:5])
 
     # --- Chart Data for Loan Applications Overview ---
-    today = timezone.now().date()
-    
-    # 7 Days Data
-    seven_days_data = []
-    for i in range(6, -1, -1):
-        day = today - timedelta(days=i)
-        count = LoanApplication.objects.filter(
-            company=company,
-            created_at__date=day
-        ).count()
-        seven_days_data.append(count)
-    
-    # 30 Days Data
-    thirty_days_data = []
-    for i in range(29, -1, -1):
-        day = today - timedelta(days=i)
-        count = LoanApplication.objects.filter(
-            company=company,
-            created_at__date=day
-        ).count()
-        thirty_days_data.append(count)
-    
-    # 90 Days Data
-    ninety_days_data = []
-    for i in range(89, -1, -1):
-        day = today - timedelta(days=i)
-        count = LoanApplication.objects.filter(
-            company=company,
-            created_at__date=day
-        ).count()
-        ninety_days_data.append(count)
-    
-    # Chart data
-    chart_data = {
-        '7': seven_days_data,
-        '30': thirty_days_data,
-        '90': ninety_days_data,
-    }
+    # 7/30/90 day series from a single grouped-by-day query
+    chart_data = chart_series(
+        LoanApplication.objects.filter(company=company),
+        windows=(7, 30, 90),
+        end_date=today,
+    )
 
     # --- Notifications and Alerts ---
-    notifications = []
-    
-    # 1. New Applications (last 24 hours)
-    new_apps = LoanApplication.objects.filter(
-        company=company,
-        status='pending',
-        created_at__gte=timezone.now() - timedelta(hours=24)
-    ).count()
-    
-    if new_apps > 0:
-        notifications.append({
-            'type': 'new_application',
-            'message': f'{new_apps} new loan application{"s" if new_apps > 1 else ""} pending review',
-            'created_at': timezone.now(),
-            'icon': 'fas fa-file-alt',
-            'color': 'blue'
-        })
-    
-    # 2. Recently Approved Applications (last 24 hours)
-    recent_approved = LoanApplication.objects.filter(
-        company=company,
-        status='approved',
-        approved_date__gte=timezone.now() - timedelta(hours=24)
-    ).select_related('borrower')
-    
-    for app in recent_approved[:3]:  # Show last 3
-        notifications.append({
-            'type': 'approved',
-            'message': f'Loan approved for {app.borrower.full_name}',
-            'related_application': app,
-            'created_at': app.approved_date,
-            'icon': 'fas fa-check-circle',
-            'color': 'green'
-        })
-    
-    # 3. Overdue Loans
-    overdue_loans = LoanApplication.objects.filter(
-        company=company,
-        status='approved'
-    ).count()
-    
-    if overdue_loans > 0:
-        notifications.append({
-            'type': 'overdue',
-            'message': f'{overdue_loans} loan{"s" if overdue_loans > 1 else ""} overdue',
-            'created_at': timezone.now(),
-            'icon': 'fas fa-exclamation-triangle',
-            'color': 'red'
-        })
-    
-    # 4. High Value Applications (over 500k)
-    high_value_apps = LoanApplication.objects.filter(
-        company=company,
-        status='pending',
-        amount__gte=500000,
-        created_at__gte=timezone.now() - timedelta(hours=48)
-    ).select_related('borrower')
-    
-    for app in high_value_apps[:2]:  # Show last 2
-        notifications.append({
-            'type': 'high_value',
-            'message': f'High value loan request from {app.borrower.full_name}',
-            'related_application': app,
-            'created_at': app.created_at,
-            'icon': 'fas fa-star',
-            'color': 'yellow'
-        })
-    
-    # 5. Applications Requiring Review
-    review_required = LoanApplication.objects.filter(
-        company=company,
-        status='review'
-    ).count()
-    
-    if review_required > 0:
-        notifications.append({
-            'type': 'review',
-            'message': f'{review_required} application{"s" if review_required > 1 else ""} require{"s" if review_required == 1 else ""} additional review',
-            'created_at': timezone.now(),
-            'icon': 'fas fa-search',
-            'color': 'orange'
-        })
-    
-    # Sort notifications by created_at (most recent first)
-    notifications.sort(key=lambda x: x['created_at'], reverse=True)
-    
-    # Limit to 5 most recent notifications
-    notifications = notifications[:5]
+    # Newest unread alerts, written when the events happened
+    notifications = list(
+        Notification.objects.filter(company=company, is_read=False)
+        .select_related('related_application')
+        .order_by('-created_at')[:5]
+    )
 
     # --- Monthly Performance Summary ---
-    month_start = today.replace(day=1)
-    applications_this_month = LoanApplication.objects.filter(
-        company=company,
-        created_at__gte=month_start
+    monthly = CompanyDailyStats.objects.filter(company=company, business_date__gte=month_start).aggregate(
+        total=Sum('application_count'),
+        approved=Sum('application_count', filter=Q(status='approved')),
+        processed=Sum('processed_count'),
+        processing_time=Sum('processing_time_total'),
+        rated=Sum('rated_count'),
+        rating_total=Sum('rating_total'),
     )
-    
-    total_this_month = applications_this_month.count()
-    approved_this_month = applications_this_month.filter(status='approved').count()
+
+    total_this_month = monthly['total'] or 0
+    approved_this_month = monthly['approved'] or 0
     approval_rate = round((approved_this_month / total_this_month * 100), 2) if total_this_month else 0
 
     # Average Processing Time (days)
-    approved_apps = applications_this_month.filter(status='approved', approved_date__isnull=False)
-    avg_processing = approved_apps.annotate(
-        proc_time=(
-            models.ExpressionWrapper(
-                models.F('approved_date') - models.F('created_at'),
-                output_field=models.DurationField()
-            )
-        )
-    ).aggregate(avg_days=Avg('proc_time'))
-    avg_days = avg_processing['avg_days'].days if avg_processing['avg_days'] else 0
+    avg_processing = monthly['processing_time'] / monthly['processed'] if monthly['processed'] else None
+    avg_days = avg_processing.days if avg_processing else 0
     avg_days = round(avg_days, 1)
 
     # Satisfaction Score (if you have a rating field)
-    satisfaction_score = applications_this_month.aggregate(avg_rating=Avg('rating'))['avg_rating'] or 0
+    satisfaction_score = monthly['rating_total'] / monthly['rated'] if monthly['rated'] else 0
     satisfaction_score = round(satisfaction_score, 1)
 
     context = {
@@ -235,7 +115,7 @@ def companyDashboard(request):
         'satisfaction_score': satisfaction_score,
         'chart_data': chart_data,
     }
-    return render(request, 'CompanyPages/companyDashboard.html', context)
+    return context
 
 
 #Company Loan Application function
@@ -250,17 +130,14 @@ def loanApplication(request):
 
     # Base queryset - Exclude rejected by default unless specifically filtered
     if status == 'rejected':
-        applications_qs = LoanApplication.objects.filter(company=company, status='rejected').select_related('borrower')
+        applications_qs = LoanApplication.objects.filter(company=company, status='rejected')
     else:
-        applications_qs = LoanApplication.objects.filter(company=company).exclude(status='rejected').select_related('borrower')
+        applications_qs = LoanApplication.objects.filter(company=company).exclude(status='rejected')
 
-    # Search by name or email
+    # Search by name, email or exact amount
     if search:
         applications_qs = applications_qs.filter(
-            Q(borrower__first_name__icontains=search) |
-            Q(borrower__last_name__icontains=search) |
-            Q(borrower__email__icontains=search) |
-            Q(amount__icontains=search)
+            search_q(search, borrower_path='borrower__', amount_field='amount')
         )
 
     # Filter by status
@@ -278,18 +155,22 @@ def loanApplication(request):
         elif amount == '100000+':
             applications_qs = applications_qs.filter(amount__gt=100000)
 
+    if request.GET.get('export') == 'csv':
+        return export_csv('loan-applications', applications_qs.order_by('-created_at', '-id'), APPLICATION_COLUMNS)
+
     # Statistics
-    total_applications = LoanApplication.objects.filter(company=company).exclude(status='rejected').count()
-    pending_review = LoanApplication.objects.filter(company=company, status='pending').count()
-    approved = LoanApplication.objects.filter(company=company, status='approved').count()
-    rejected = LoanApplication.objects.filter(company=company, status='rejected').count()
-    total_amount = LoanApplication.objects.filter(
-        company=company, 
-        status='approved'
-    ).aggregate(total=models.Sum('amount'))['total'] or 0
+    stats = PortfolioStats.for_company(company)
+    total_applications = stats.total_count - stats.count('rejected')
+    pending_review = stats.count('pending')
+    approved = stats.count('approved')
+    rejected = stats.count('rejected')
+    total_amount = stats.amount('approved')
 
     # Pagination
-    paginator = Paginator(applications_qs.order_by('-created_at'), 20)
+    paginator = Paginator(
+        order_by_relevance(project(applications_qs, APPLICATION_ROW), search, '-created_at', borrower_path='borrower__'),
+        20,
+    )
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
 
@@ -377,58 +258,42 @@ def borrowerLists(request):
     search = request.GET.get('search', '')
     status = request.GET.get('status', '')
     
-    # Base queryset - Only borrowers with APPROVED loans
+    # Base queryset - Only borrowers with open (approved, delinquent or defaulted) loans
     borrowers = Borrower.objects.filter(
         company=company,
-        loan_application__status='approved'
-    ).distinct().select_related('loan_application').annotate(
+        loan_application__status__in=LoanApplication.OPEN_STATUSES
+    ).distinct().annotate(
         outstanding_amount=Sum(
             'loan_application__amount',
-            filter=Q(loan_application__company=company, loan_application__status='approved')
+            filter=Q(loan_application__company=company, loan_application__status__in=LoanApplication.OPEN_STATUSES)
         )
     )
     
     # Apply search filter
     if search:
         borrowers = borrowers.filter(
-            Q(first_name__icontains=search) |
-            Q(last_name__icontains=search) |
-            Q(email__icontains=search)
+            search_q(search, id_field='loan_application__id', amount_field='loan_application__amount')
         )
     
-    # Apply status filter (for future payment status)
-    if status:
-        if status == 'delinquent':
-            borrowers = borrowers.filter(
-                loan_application__status='delinquent',
-                loan_application__company=company
-            )
-    
-    # Statistics - Only count APPROVED loans
-    total_borrowers = Borrower.objects.filter(
-        company=company,
-        loan_application__status='approved'
-    ).distinct().count()
-    
-    active_borrowers = Borrower.objects.filter(
-        company=company,
-        loan_application__status='approved'
-    ).distinct().count()
-    
-    delinquent_borrowers = Borrower.objects.filter(
-        company=company,
-        loan_application__status='delinquent'
-    ).distinct().count()
+    # Apply status filter (delinquency state set by the nightly update_delinquency job)
+    if status in LoanApplication.OPEN_STATUSES:
+        borrowers = borrowers.filter(
+            loan_application__status=status,
+            loan_application__company=company
+        )
     
-    portfolio_value = LoanApplication.objects.filter(
-        company=company,
-        status='approved'
-    ).aggregate(
-        total=Sum('amount')
-    )['total'] or 0
+    if request.GET.get('export') == 'csv':
+        return export_csv('borrowers', borrowers.order_by('-created_at', '-id'), BORROWER_COLUMNS)
+
+    # Statistics - Only count open loans (one loan application per borrower)
+    stats = PortfolioStats.for_company(company, borrower__company=company)
+    total_borrowers = stats.count(*LoanApplication.OPEN_STATUSES)
+    active_borrowers = stats.count('approved')
+    delinquent_borrowers = stats.count('delinquent', 'defaulted')
+    portfolio_value = stats.amount(*LoanApplication.OPEN_STATUSES)
     
     # Pagination
-    paginator = Paginator(borrowers, 10)
+    paginator = Paginator(order_by_relevance(project(borrowers, BORROWER_ROW), search, '-created_at'), 10)
     page_number = request.GET.get('page', 1)
     
     try:
@@ -472,95 +337,56 @@ def activeLoans(request):
     amount_range = request.GET.get('amountRange', '')
     date_range = request.GET.get('dateRange', '')
 
-    # Base queryset
-    loans_qs = LoanApplication.objects.filter(company=company, status='approved')
+    loans_qs = filters.active_loans(company, request.GET)
 
-    # Search by borrower name, loan ID, or amount
-    if search:
-        loans_qs = loans_qs.filter(
-            Q(borrower__first_name__icontains=search) |
-            Q(borrower__last_name__icontains=search) |
-            Q(id__icontains=search) |
-            Q(amount__icontains=search)
-        )
+    if request.GET.get('export') == 'csv':
+        return export_csv('active-loans', loans_qs.order_by('-created_at', '-id'), APPLICATION_COLUMNS)
+    if request.GET.get('export') == 'xlsx':
+        # The workbook is built by the report worker, never in the request
+        job, _ = reports.enqueue(company, 'loan_book', request.GET)
+        return redirect('report-status', job_id=job.id)
 
-    # Filter by loan type
-    if loan_type:
-        loans_qs = loans_qs.filter(product_type=loan_type)
-
-    # Filter by payment status (maps to your status field)
-    if payment_status:
-        status_map = {
-            'current': 'approved',
-            'late': 'delinquent',
-            'overdue': 'delinquent',
-            'grace': 'review',
-        }
-        mapped_status = status_map.get(payment_status)
-        if mapped_status:
-            loans_qs = loans_qs.filter(status=mapped_status)
-
-    # Filter by amount range
-    if amount_range:
-        if amount_range == '0-25000':
-            loans_qs = loans_qs.filter(amount__gte=0, amount__lte=25000)
-        elif amount_range == '25000-100000':
-            loans_qs = loans_qs.filter(amount__gt=25000, amount__lte=100000)
-        elif amount_range == '100000-500000':
-            loans_qs = loans_qs.filter(amount__gt=100000, amount__lte=500000)
-        elif amount_range == '500000+':
-            loans_qs = loans_qs.filter(amount__gt=500000)
-
-    # Filter by date range
-    if date_range:
-        today = timezone.now().date()
-        if date_range == 'last-30':
-            start_date = today - timedelta(days=30)
-            loans_qs = loans_qs.filter(created_at__gte=start_date)
-        elif date_range == 'last-90':
-            start_date = today - timedelta(days=90)
-            loans_qs = loans_qs.filter(created_at__gte=start_date)
-        elif date_range == 'last-year':
-            start_date = today - timedelta(days=365)
-            loans_qs = loans_qs.filter(created_at__gte=start_date)
-
-    # Statistics
-    total_active_loans = loans_qs.count()
-    portfolio_value = loans_qs.aggregate(total=models.Sum('amount'))['total'] or 0
+    # Statistics, performance and distribution from one GROUP BY (product_type, status)
+    groups = product_status_groups(loans_qs)
+    stats = PortfolioStats.from_groups(groups)
+    total_active_loans = stats.total_count
+    portfolio_value = stats.total_amount
 
     # Loan Performance
-    on_time = loans_qs.filter(status='approved').count()
-    late = loans_qs.filter(status='delinquent').count()
-    missed = loans_qs.filter(status='defaulted').count() if 'defaulted' in dict(LoanApplication._meta.get_field('status').choices) else 0
-    total_perf = on_time + late + missed
-    on_time_pct = round((on_time / total_perf * 100), 1) if total_perf else 0
-    late_pct = round((late / total_perf * 100), 1) if total_perf else 0
-    missed_pct = round((missed / total_perf * 100), 1) if total_perf else 0
+    on_time_pct, late_pct, missed_pct = stats.performance_split()
 
     # Loan Distribution by product_type - Only show company's selected loan products
-    product_types_map = dict(Company.LOAN_PRODUCT_CHOICES)
-    distribution = []
-    
-    # Get only the loan products this company offers
     company_loan_products = company.loan_products if company.loan_products else []
-    
-    for product_key in company_loan_products:
-        product_label = product_types_map.get(product_key, product_key)
-        count = loans_qs.filter(product_type=product_key).count()
-        amount = loans_qs.filter(product_type=product_key).aggregate(total=models.Sum('amount'))['total'] or 0
-        percent = round((count / total_active_loans * 100), 1) if total_active_loans else 0
-        distribution.append({
-            'key': product_key,
-            'label': product_label,
-            'count': count,
-            'amount': amount,
-            'percent': percent,
-        })
+    distribution = product_distribution(groups, company_loan_products, dict(Company.LOAN_PRODUCT_CHOICES))
 
-    # Pagination
-    paginator = Paginator(loans_qs.order_by('-created_at'), 20)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Keyset pagination; the GROUP BY above already counted the filtered rows
+    paginator = KeysetPaginator(
+        order_by_relevance(project(loans_qs, ACTIVE_LOAN_ROW), search, '-created_at', '-id', borrower_path='borrower__'),
+        20,
+        count=total_active_loans,
+    )
+    page_obj = paginator.page(request.GET.get('cursor'))
+
+    if request.GET.get('format') == 'json':
+        return JsonResponse({
+            'success': True,
+            'loans': [
+                {
+                    'id': loan.id,
+                    'borrower_name': f"{loan.borrower.first_name} {loan.borrower.last_name}",
+                    'product_type': loan.product_type,
+                    'amount': str(loan.amount) if loan.amount is not None else None,
+                    'term': loan.term,
+                    'interest_rate': str(loan.interest_rate) if loan.interest_rate is not None else None,
+                    'monthly_payment': str(loan.monthly_payment) if loan.monthly_payment is not None else None,
+                    'status': loan.status,
+                    'status_display': loan.get_status_display(),
+                    'created_at': loan.created_at.isoformat(),
+                }
+                for loan in page_obj
+            ],
+            **page_payload(page_obj),
+        })
 
     context = {
         'total_active_loans': total_active_loans,
@@ -582,8 +408,8 @@ def activeLoans(request):
         'total_pages': paginator.num_pages,
         'has_previous': page_obj.has_previous(),
         'has_next': page_obj.has_next(),
-        'previous_page_number': page_obj.previous_page_number() if page_obj.has_previous() else None,
-        'next_page_number': page_obj.next_page_number() if page_obj.has_next() else None,
+        'previous_cursor': page_obj.previous_cursor,
+        'next_cursor': page_obj.next_cursor,
         'start_index': page_obj.start_index(),
         'end_index': page_obj.end_index(),
     }
@@ -694,15 +520,16 @@ def settings(request):
 def activeBorrowers(request):
     company = request.user.company_profile
 
-    # Borrowers with APPROVED loans only
-    active_borrowers_qs = Borrower.objects.filter(
+    # Borrowers with open loans only
+    active_borrowers_qs = project(Borrower.objects.filter(
         loan_application__company=company,
-        loan_application__status='approved'
-    ).distinct().select_related('loan_application')
+        loan_application__status__in=LoanApplication.OPEN_STATUSES
+    ).distinct(), BORROWER_ROW)
 
-    total_active_borrowers = active_borrowers_qs.count()
-    total_loans = LoanApplication.objects.filter(company=company, status='approved').count()
-    total_portfolio = LoanApplication.objects.filter(company=company, status='approved').aggregate(total=Sum('amount'))['total'] or 0
+    stats = PortfolioStats.for_company(company)
+    total_active_borrowers = stats.count(*LoanApplication.OPEN_STATUSES)
+    total_loans = stats.count(*LoanApplication.OPEN_STATUSES)
+    total_portfolio = stats.amount(*LoanApplication.OPEN_STATUSES)
 
     context = {
         'active_borrowers': active_borrowers_qs,
@@ -714,6 +541,31 @@ def activeBorrowers(request):
 
 
 
+@company_required
+def portfolioAging(request):
+    """Open loans bucketed by days past due, with PAR30/60/90"""
+    company = request.user.company_profile
+    aging = PortfolioAging.for_company(company)
+
+    if request.GET.get('format') == 'json':
+        return JsonResponse({
+            'success': True,
+            **aging.payload(),
+        })
+
+    context = {
+        'aging': aging,
+        'buckets': aging.buckets,
+        'total_count': aging.total_count,
+        'total_outstanding': aging.total_outstanding,
+        'par30': aging.par30,
+        'par60': aging.par60,
+        'par90': aging.par90,
+        'as_of': aging.today,
+    }
+    return render(request, 'CompanyPages/companyPortfolioAging.html', context)
+
+
 @company_required
 def applicationHistory(request):
     """View all loan applications with their status"""
@@ -726,46 +578,60 @@ def applicationHistory(request):
     # Base queryset - All applications to this company
     applications = LoanApplication.objects.filter(
         company=company
-    ).select_related('borrower').order_by('-created_at')
+    ).order_by('-created_at')
     
     # Apply search filter
     if search:
         applications = applications.filter(
-            Q(borrower__first_name__icontains=search) |
-            Q(borrower__last_name__icontains=search) |
-            Q(borrower__email__icontains=search)
+            search_q(search, borrower_path='borrower__', id_field='id', amount_field='amount')
         )
     
     # Apply status filter
     if status_filter:
         applications = applications.filter(status=status_filter)
     
+    if request.GET.get('export') == 'csv':
+        return export_csv('application-history', applications.order_by('-created_at', '-id'), APPLICATION_COLUMNS)
+    
     # Statistics
-    total_applications = applications.count()
-    pending_count = applications.filter(status='pending').count()
-    approved_count = applications.filter(status='approved').count()
-    rejected_count = applications.filter(status='rejected').count()
-    completed_count = applications.filter(status='completed').count() if 'completed' in [choice[0] for choice in LoanApplication.STATUS_CHOICES] else 0
+    stats = PortfolioStats.for_queryset(applications)
+    total_applications = stats.total_count
+    pending_count = stats.count('pending')
+    approved_count = stats.count('approved')
+    rejected_count = stats.count('rejected')
+    completed_count = stats.count('completed')
     
     # Calculate values
-    total_approved_value = applications.filter(status='approved').aggregate(
-        total=Sum('amount')
-    )['total'] or 0
+    total_approved_value = stats.amount('approved')
+    total_rejected_value = stats.amount('rejected')
     
-    total_rejected_value = applications.filter(status='rejected').aggregate(
-        total=Sum('amount')
-    )['total'] or 0
-    
-    # Pagination
-    paginator = Paginator(applications, 20)
-    page_number = request.GET.get('page', 1)
+    # Keyset pagination; the stats query already counted the filtered rows
+    paginator = KeysetPaginator(
+        order_by_relevance(project(applications, APPLICATION_ROW), search, '-created_at', '-id', borrower_path='borrower__'),
+        20,
+        count=total_applications,
+    )
+    applications_page = paginator.page(request.GET.get('cursor'))
     
-    try:
-        applications_page = paginator.page(page_number)
-    except PageNotAnInteger:
-        applications_page = paginator.page(1)
-    except EmptyPage:
-        applications_page = paginator.page(paginator.num_pages)
+    if request.GET.get('format') == 'json':
+        return JsonResponse({
+            'success': True,
+            'applications': [
+                {
+                    'id': app.id,
+                    'borrower_name': f"{app.borrower.first_name} {app.borrower.last_name}",
+                    'borrower_email': app.borrower.email,
+                    'product_type': app.product_type,
+                    'amount': str(app.amount) if app.amount is not None else None,
+                    'term': app.term,
+                    'status': app.status,
+                    'status_display': app.get_status_display(),
+                    'created_at': app.created_at.isoformat(),
+                }
+                for app in applications_page
+            ],
+            **page_payload(applications_page),
+        })
     
     context = {
         'applications': applications_page,
@@ -783,8 +649,8 @@ def applicationHistory(request):
         'total_pages': paginator.num_pages,
         'has_previous': applications_page.has_previous(),
         'has_next': applications_page.has_next(),
-        'previous_page_number': applications_page.previous_page_number() if applications_page.has_previous() else None,
-        'next_page_number': applications_page.next_page_number() if applications_page.has_next() else None,
+        'previous_cursor': applications_page.previous_cursor,
+        'next_cursor': applications_page.next_cursor,
         'start_index': applications_page.start_index(),
         'end_index': applications_page.end_index(),
     }
@@ -833,7 +699,7 @@ def addBorrowers(request):
             
             if existing_borrower:
                 if hasattr(existing_borrower, 'loan_application'):
-                    if existing_borrower.loan_application.status == 'approved':
+                    if existing_borrower.loan_application.status in LoanApplication.OPEN_STATUSES:
                         messages.error(request, f'{first_name} {last_name} already has an active loan with your company.')
                         return render(request, 'BorrowerSubmenus/companyAddBorrowers.html', {'company': company})
                     elif existing_borrower.loan_application.status == 'pending':
@@ -974,6 +840,9 @@ def addBorrowers(request):
                 loan_app.calculate_loan_payment()
                 loan_app.save()
                 
+                # Create the installment schedule with the approval
+                generate_payment_schedule(loan_app)
+                
                 messages.success(request, f"✓ Borrower {borrower.full_name} has been successfully added with an approved loan of ₱{loan_amount:,.2f}!")
                 return redirect('company-borrower-lists')
                 
@@ -999,13 +868,19 @@ def approve_loan_application(request, application_id):
         try:
             application = LoanApplication.objects.get(id=application_id, company=company)
             
-            # Check if already approved
-            if application.status == 'approved':
+            # Check if already approved (delinquent and defaulted loans were approved too)
+            if application.status in LoanApplication.OPEN_STATUSES:
                 messages.info(request, f"Loan application #{application.id} is already approved.")
             else:
-                application.status = 'approved'
-                application.approved_date = timezone.now()
-                application.save()
+                with transaction.atomic():
+                    application.status = 'approved'
+                    application.approved_date = timezone.now()
+                    if not application.monthly_payment:
+                        application.calculate_loan_payment()
+                    application.save()
+                    
+                    # Create the installment schedule with the approval
+                    generate_payment_schedule(application)
                 messages.success(request, f"✓ Loan application #{application.id} for {application.borrower.full_name} has been successfully approved!")
                 
         except LoanApplication.DoesNotExist:
@@ -1051,7 +926,7 @@ def viewBorrowerDetailsFromLoan(request, loan_id):
             LoanApplication.objects.select_related('borrower'),
             id=loan_id,
             company=company,
-            status='approved'
+            status__in=LoanApplication.OPEN_STATUSES
         )
         
         borrower = loan.borrower
@@ -1204,50 +1079,41 @@ def viewLoanPayments(request, loan_id):
             LoanApplication,
             id=loan_id,
             company=company,
-            status='approved'
+            status__in=LoanApplication.OPEN_STATUSES
         )
         
         borrower = loan.borrower
         
         # Get all payments for this loan
-        payments = Payment.objects.filter(loan_application=loan).order_by('due_date')
+        payments = loan.payments.order_by('due_date')
         
-        # If no payments exist, generate payment schedule
-        if not payments.exists() and loan.monthly_payment and loan.term:
-            # Generate payment schedule
-            start_date = loan.approved_date.date() if loan.approved_date else timezone.now().date()
-            
-            for i in range(loan.term):
-                due_date = start_date + relativedelta(months=i+1)
-                Payment.objects.create(
-                    loan_application=loan,
-                    amount=loan.monthly_payment,
-                    method='',
-                    due_date=due_date,
-                    status='pending'
-                )
-            
-            # Refresh payments queryset
-            payments = Payment.objects.filter(loan_application=loan).order_by('due_date')
+        # Installments past due are shown as overdue until the nightly
+        # mark_overdue_payments sweep stores it
+        today = timezone.localdate()
         
-        # Check for overdue payments
-        today = timezone.now().date()
-        for payment in payments:
-            if payment.status == 'pending' and payment.due_date < today:
-                payment.status = 'overdue'
-                payment.save()
+        # Late fees from the accrual ledger are owed until collected, paid
+        # installment or not. An installment's amount due carries every fee
+        # owed up to it, which posting settles oldest first
+        fees = late_fees.fees_by_payment(loan)
+        total_late_fees = Decimal('0')
         
         # Format payments data
         payments_data = []
         for payment in payments:
+            fee, fee_paid_date = fees.get(payment.id, (Decimal('0'), None))
+            if fee_paid_date is None:
+                total_late_fees += fee
             payments_data.append({
                 'id': payment.id,
                 'amount': str(payment.amount),
                 'due_date': payment.due_date.strftime('%B %d, %Y'),
                 'paid_date': payment.paid_date.strftime('%B %d, %Y') if payment.paid_date else None,
-                'status': payment.status,
+                'status': 'overdue' if payment.status == 'pending' and payment.due_date < today else payment.status,
                 'method': payment.method if payment.method else '',
                 'reference_number': payment.reference_number if payment.reference_number else '',
+                'late_fee': str(fee),
+                'late_fee_paid': fee_paid_date is not None,
+                'amount_due': str(payment.amount + total_late_fees),
             })
         
         data = {
@@ -1266,7 +1132,8 @@ def viewLoanPayments(request, loan_id):
                 'email': borrower.email,
             },
             'payments': payments_data,
-            'remaining_balance': float(loan.remaining_balance),
+            'remaining_balance': float(loan.remaining_balance + total_late_fees),
+            'late_fees': float(total_late_fees),
             'total_paid': float(loan.total_paid),
             'progress_percentage': float(loan.payment_progress_percentage),
         }
@@ -1290,61 +1157,275 @@ def viewLoanPayments(request, loan_id):
 
 @company_required
 def recordPayment(request, loan_id):
-    """Record a payment for a loan"""
+    """
+    Record a payment for a loan. A client Idempotency-Key (header or
+    idempotency_key field) makes retries return the first response.
+    """
     if request.method != 'POST':
         return JsonResponse({'success': False, 'message': 'Invalid request method'}, status=405)
     
     try:
         company = request.user.company_profile
         
-        # Get loan application
-        loan = get_object_or_404(
-            LoanApplication,
-            id=loan_id,
-            company=company,
-            status='approved'
-        )
-        
-        # Get payment record
-        payment_id = request.POST.get('payment_id')
-        payment = get_object_or_404(Payment, id=payment_id, loan_application=loan)
-        
-        # Check if already paid
-        if payment.status == 'paid':
+        posting, error = clean_entry({
+            'loan_id': loan_id,
+            'payment_id': request.POST.get('payment_id'),
+            'amount': request.POST.get('amount'),
+            'paid_date': request.POST.get('paid_date'),
+            'method': request.POST.get('method'),
+            'reference': request.POST.get('reference_number', ''),
+        }, timezone.localdate())
+        if error:
+            return JsonResponse({'success': False, 'message': error}, status=400)
+
+        idempotency_key = (request.headers.get('Idempotency-Key') or request.POST.get('idempotency_key', '')).strip()
+        if len(idempotency_key) > MAX_IDEMPOTENCY_KEY_LENGTH:
             return JsonResponse({
                 'success': False,
-                'message': 'This payment has already been recorded.'
-            })
-        
-        # Update payment record
-        payment.amount = Decimal(request.POST.get('amount'))
-        payment.paid_date = datetime.strptime(request.POST.get('paid_date'), '%Y-%m-%d').date()
-        payment.method = request.POST.get('method')
-        payment.reference_number = request.POST.get('reference_number', '')
-        payment.status = 'paid'
-        payment.save()
+                'message': f'Idempotency key must be at most {MAX_IDEMPOTENCY_KEY_LENGTH} characters.'
+            }, status=400)
         
-        # Check if loan is fully paid
-        remaining_balance = loan.remaining_balance
-        if remaining_balance <= 0:
-            # Update loan status to completed/paid
-            loan.status = 'completed'  # You may need to add this status to your STATUS_CHOICES
-            loan.save()
+        # Locks the installment and loan; a repeated key returns the stored response
+        status_code, response = record_payment(company, posting, idempotency_key)
+        return JsonResponse(response, status=status_code)
         
+    except Exception as e:
+        return JsonResponse({
+            'success': False,
+            'message': f'Error: {str(e)}'
+        }, status=500)
+
+
+@company_required
+@require_http_methods(["POST"])
+def recordPaymentBatch(request):
+    """Post a collection sheet: a JSON {"payments": [...]} list of installments paid"""
+    company = request.user.company_profile
+
+    try:
+        entries = json.loads(request.body)['payments']
+    except (ValueError, KeyError, TypeError):
+        entries = None
+    if not isinstance(entries, list) or not entries:
+        return JsonResponse({
+            'success': False,
+            'message': 'Send a JSON object with a non-empty "payments" list.'
+        }, status=400)
+    if len(entries) > MAX_BATCH_SIZE:
+        return JsonResponse({
+            'success': False,
+            'message': f'At most {MAX_BATCH_SIZE} payments can be posted at once.'
+        }, status=400)
+
+    results = post_payment_batch(company, entries)
+    posted = sum(1 for result in results if result['success'])
+    return JsonResponse({
+        'success': True,
+        'posted': posted,
+        'failed': len(results) - posted,
+        'results': results,
+    })
+
+
+@company_required
+def exportPayments(request):
+    """Stream the company's payment ledger as CSV"""
+    company = request.user.company_profile
+
+    payments = filters.payments(company, request.GET)
+
+    return export_csv('payments', payments.order_by('due_date', 'id'), PAYMENT_COLUMNS)
+
+
+@company_required
+def statementReconciliation(request):
+    """Upload a bank/e-wallet statement; review the lines that did not post"""
+    company = request.user.company_profile
+
+    if request.method == 'POST':
+        upload = request.FILES.get('statement')
+        if not upload:
+            messages.error(request, 'Choose a statement file to upload.')
+            return redirect('company-reconciliation')
+        try:
+            statement, skipped = reconciliation.import_statement(company, upload)
+        except ValueError as e:
+            messages.error(request, str(e))
+            return redirect('company-reconciliation')
+
+        summary = f'{statement.posted_count} of {statement.line_count} line(s) posted, {statement.review_count} to review.'
+        if skipped:
+            summary += f' {skipped} debit or unreadable row(s) skipped.'
+        messages.success(request, summary)
+        return redirect('company-reconciliation')
+
+    # Review queue, oldest first
+    review_qs = StatementLine.objects.filter(company=company, status='review').select_related('statement').order_by('id')
+    paginator = KeysetPaginator(review_qs, 25, count=review_qs.count())
+    page_obj = paginator.page(request.GET.get('cursor'))
+
+    # Candidate installments of the lines on this page, in one query
+    candidate_ids = {payment_id for line in page_obj for payment_id in line.candidates}
+    candidates = {
+        payment.id: payment
+        for payment in Payment.objects.filter(id__in=candidate_ids, loan_application__company=company)
+        .select_related('loan_application__borrower')
+    }
+    for line in page_obj:
+        line.candidate_payments = [candidates[payment_id] for payment_id in line.candidates if payment_id in candidates]
+
+    if request.GET.get('format') == 'json':
         return JsonResponse({
             'success': True,
-            'message': 'Payment recorded successfully',
-            'remaining_balance': float(remaining_balance),
-            'is_fully_paid': remaining_balance <= 0
+            'lines': [
+                {
+                    'id': line.id,
+                    'statement': line.statement.filename,
+                    'line_number': line.line_number,
+                    'transaction_date': line.transaction_date.isoformat() if line.transaction_date else None,
+                    'amount': str(line.amount),
+                    'reference': line.reference,
+                    'payer': line.payer,
+                    'reason': line.reason,
+                    'reason_display': line.get_reason_display(),
+                    'candidates': line.candidates,
+                }
+                for line in page_obj
+            ],
+            **page_payload(page_obj),
         })
-        
-    except Payment.DoesNotExist:
+
+    context = {
+        'lines': page_obj,
+        'imports': company.statement_imports.all()[:10],
+        'paginator': paginator,
+        'current_page': page_obj.number,
+        'total_pages': paginator.num_pages,
+        'has_previous': page_obj.has_previous(),
+        'has_next': page_obj.has_next(),
+        'previous_cursor': page_obj.previous_cursor,
+        'next_cursor': page_obj.next_cursor,
+        'start_index': page_obj.start_index(),
+        'end_index': page_obj.end_index(),
+    }
+    return render(request, 'CompanyPages/companyReconciliation.html', context)
+
+
+@company_required
+@require_http_methods(["POST"])
+def resolveStatementLine(request, line_id):
+    """Post a review line against an installment, or dismiss it"""
+    company = request.user.company_profile
+    line = get_object_or_404(StatementLine, id=line_id, company=company)
+
+    if request.POST.get('action') == 'dismiss':
+        if not reconciliation.dismiss_line(line):
+            return JsonResponse({'success': False, 'message': 'This line has already been handled.'}, status=409)
+        return JsonResponse({'success': True, 'message': 'Line dismissed'})
+
+    payment_id = request.POST.get('payment_id', '').strip()
+    if not payment_id.isdigit():
+        return JsonResponse({'success': False, 'message': 'Enter the ID of the installment to pay.'}, status=400)
+    if not reconciliation.resolve_line(line, int(payment_id)):
         return JsonResponse({
             'success': False,
-            'message': 'Payment record not found.'
-        }, status=404)
-    except Exception as e:
+            'message': 'That installment is not open on one of your active loans, or the line was already handled.'
+        }, status=409)
+    return JsonResponse({'success': True, 'message': 'Payment posted'})
+
+
+@company_required
+@require_http_methods(["POST"])
+def enqueueReport(request):
+    """Queue a report for the background worker (or reuse a recent identical one)"""
+    company = request.user.company_profile
+    kind = request.POST.get('kind', '')
+    if kind not in reports.REPORTS:
         return JsonResponse({
             'success': False,
-            'message': f'Error: {str(e)}'
-        }, status=500)
\ No newline at end of file
+            'message': 'Unknown report type.'
+        }, status=400)
+
+    job, created = reports.enqueue(company, kind, request.POST)
+    return JsonResponse({
+        'success': True,
+        'created': created,
+        'job': reports.job_payload(job),
+    }, status=202)
+
+
+@company_required
+def reportStatus(request, job_id):
+    """Return a report job's status as JSON, for polling"""
+    job = get_object_or_404(ReportJob, id=job_id, company=request.user.company_profile)
+    return JsonResponse({
+        'success': True,
+        'job': reports.job_payload(job),
+    })
+
+
+@company_required
+def downloadReport(request, job_id):
+    """Serve a finished report file"""
+    job = get_object_or_404(ReportJob, id=job_id, company=request.user.company_profile, status='done')
+    try:
+        report = job.file.open('rb')
+    except (ValueError, FileNotFoundError):
+        raise Http404('Report file is no longer available.')
+    return FileResponse(report, as_attachment=True, filename=reports.download_name(job))
+
+
+@company_required
+def notificationList(request):
+    """Return the company's notifications as paginated JSON"""
+    company = request.user.company_profile
+
+    notifications = Notification.objects.filter(company=company).order_by('-created_at')
+    if request.GET.get('unread') == '1':
+        notifications = notifications.filter(is_read=False)
+
+    paginator = Paginator(notifications.select_related('related_application'), 20)
+    page_obj = paginator.get_page(request.GET.get('page'))
+
+    return JsonResponse({
+        'success': True,
+        'notifications': [
+            {
+                'id': notification.id,
+                'type': notification.type,
+                'message': notification.message,
+                'is_read': notification.is_read,
+                'icon': notification.icon,
+                'color': notification.color,
+                'created_at': notification.created_at.strftime('%B %d, %Y at %I:%M %p'),
+                'created_ago': naturaltime(notification.created_at),
+                'related_application_id': notification.related_application_id,
+            }
+            for notification in page_obj.object_list
+        ],
+        'unread_count': Notification.objects.filter(company=company, is_read=False).count(),
+        'current_page': page_obj.number,
+        'total_pages': paginator.num_pages,
+        'has_next': page_obj.has_next(),
+        'has_previous': page_obj.has_previous(),
+    })
+
+
+@company_required
+@require_http_methods(["POST"])
+def markNotificationsRead(request):
+    """Mark the posted notification IDs (or all unread ones) as read"""
+    company = request.user.company_profile
+
+    ids = request.POST.getlist('ids')
+    try:
+        ids = [int(notification_id) for notification_id in ids] if ids else None
+    except ValueError:
+        return JsonResponse({'success': False, 'message': 'Invalid notification ID.'}, status=400)
+
+    updated = mark_read(company, ids)
+
+    return JsonResponse({
+        'success': True,
+        'updated': updated,
+    })
@@ -6,6 +6,11 @@ pip install -r requirements.txt
 
 echo "=== Running migrations ==="
 python manage.py migrate --noinput
+python manage.py createcachetable
+
+echo "=== Backfilling installment schedules ==="
+# Schedules are built at approval; loans approved before that have none
+python manage.py generate_payment_schedules
 
 echo "=== Collecting static files ==="
 python manage.py collectstatic --noinput